@@ -0,0 +1,136 @@
+"""Adaptive sizing of worker pools, based on the measured throughput, latency and
+failure rate of their tasks.
+
+Concurrency is reevaluated after every window of completed tasks. It is increased
+by one while tasks are waiting for a worker, kept if that doesn't improve
+throughput, reduced by one if latency rises without a gain in throughput, and
+halved if too many tasks fail (additive increase, multiplicative decrease).
+"""
+
+from __future__ import annotations
+
+import time
+
+import attrs
+
+# number of completed tasks after which concurrency is reevaluated
+_WINDOW_TASKS = 8
+# halve concurrency if a larger share of tasks fails
+_MAX_FAILURE_RATE = 0.25
+# an increase is reverted unless throughput grows by this factor
+_MIN_THROUGHPUT_GAIN = 1.05
+# concurrency is reduced if latency grows by this factor without more throughput
+_MAX_LATENCY_GROWTH = 1.5
+# number of windows to wait before increasing again after a reduction
+_HOLD_WINDOWS = 4
+
+
+@attrs.define
+class WindowStats:
+    """Measurements of the tasks completed in a window."""
+
+    started: float = attrs.field(factory=time.monotonic)
+    tasks: int = 0
+    failures: int = 0
+    # sum of the durations of all tasks in seconds
+    busy_secs: float = 0.0
+    # tasks had to wait for a worker
+    backlog: bool = False
+
+    def throughput(self, now: float) -> float:
+        """Completed tasks per second."""
+        return self.tasks / max(now - self.started, 0.001)
+
+    def latency(self) -> float:
+        """Average task duration in seconds."""
+        return self.busy_secs / self.tasks if self.tasks else 0.0
+
+    def failure_rate(self) -> float:
+        return self.failures / self.tasks if self.tasks else 0.0
+
+
+@attrs.define
+class Adjustment:
+    """A change of concurrency and the reason for it."""
+
+    old: int
+    new: int
+    reason: str
+
+    def __str__(self) -> str:
+        return f"{self.old} -> {self.new} ({self.reason})"
+
+
+@attrs.define
+class AdaptiveConcurrency:
+    """Controller for the concurrency of a single worker pool. Not thread-safe."""
+
+    minimum: int
+    maximum: int
+    limit: int
+    _window: WindowStats = attrs.field(factory=WindowStats)
+    _last_throughput: float | None = None
+    _last_latency: float | None = None
+    _increased: bool = False
+    _hold: int = 0
+
+    @classmethod
+    def new(cls, minimum: int, maximum: int) -> AdaptiveConcurrency:
+        """Start with the maximum, which is where the pool was sized statically."""
+        maximum = max(minimum, maximum)
+        return cls(minimum=minimum, maximum=maximum, limit=maximum)
+
+    def record(self, duration: float, failed: bool, backlog: bool) -> Adjustment | None:
+        """Record a completed task and return the adjustment of concurrency, if the
+        window is complete and one is necessary.
+
+        Parameters:
+            duration: seconds the task took
+            failed: the task failed transiently, e.g. because a request timed out
+            backlog: other tasks are waiting for a worker
+        """
+        window = self._window
+        window.tasks += 1
+        window.failures += failed
+        window.busy_secs += duration
+        window.backlog |= backlog
+        if window.tasks < _WINDOW_TASKS:
+            return None
+        return self._evaluate(time.monotonic())
+
+    def _evaluate(self, now: float) -> Adjustment | None:
+        window = self._window
+        throughput = window.throughput(now)
+        latency = window.latency()
+        stats = f"{throughput:.2f} tasks/s, {latency:.1f}s avg"
+        new, reason = self.limit, ""
+        if (rate := window.failure_rate()) > _MAX_FAILURE_RATE:
+            new, reason = self.limit // 2, f"{rate:.0%} failed"
+        elif (
+            self._increased
+            and self._last_throughput is not None
+            and throughput < self._last_throughput * _MIN_THROUGHPUT_GAIN
+        ):
+            new, reason = self.limit - 1, "no throughput gain"
+        elif (
+            self._last_latency
+            and self._last_throughput is not None
+            and latency > self._last_latency * _MAX_LATENCY_GROWTH
+            and throughput <= self._last_throughput
+        ):
+            new, reason = self.limit - 1, "latency rising"
+        elif window.backlog and not self._hold:
+            new, reason = self.limit + 1, "tasks waiting"
+        new = min(max(new, self.minimum), self.maximum)
+        self._hold = max(0, self._hold - 1)
+        if new < self.limit:
+            self._hold = _HOLD_WINDOWS
+        self._increased = new > self.limit
+        self._last_throughput = throughput
+        self._last_latency = latency
+        self._window = WindowStats(started=now)
+        if new == self.limit:
+            return None
+        adjustment = Adjustment(self.limit, new, f"{reason}; {stats}")
+        self.limit = new
+        return adjustment
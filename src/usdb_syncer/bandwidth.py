@@ -0,0 +1,99 @@
+"""Global limit of the download rate of media.
+
+All media stages share a single budget. yt-dlp is passed the budget as its own
+rate limit, so a single download never exceeds it, and both yt-dlp and image
+downloads take the bytes they receive from a shared token bucket, which keeps
+concurrent downloads within the budget in total. The limit may be restricted to
+certain hours of the day, so bulk syncs run at full speed off-hours.
+"""
+
+from __future__ import annotations
+
+import datetime
+import threading
+from typing import Any
+
+from usdb_syncer.host_limiter import TokenBucket
+from usdb_syncer.logger import logger
+
+
+class BandwidthLimiter:
+    """Singleton holding the shared download budget."""
+
+    # bytes per second, 0 if unlimited
+    _rate = 0
+    # hours of the day from and until which the limit applies
+    _hours = (0, 0)
+    _bucket: TokenBucket | None = None
+    _local = threading.local()
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, kbytes_per_sec: int, hours: tuple[int, int]) -> None:
+        """Set the limit in KB/s, applying from `hours[0]` until `hours[1]`, or all
+        day if they are equal. 0 disables the limit.
+        """
+        rate = max(kbytes_per_sec, 0) * 1024
+        with cls._lock:
+            if (rate, hours) == (cls._rate, cls._hours):
+                return
+            cls._rate = rate
+            cls._hours = hours
+            # bursts of up to one second
+            cls._bucket = TokenBucket(rate, rate) if rate else None
+        if rate:
+            start, end = hours
+            window = f" from {start}:00 until {end}:00" if start != end else ""
+            logger.debug(f"Downloads are limited to {kbytes_per_sec} KB/s{window}.")
+
+    @classmethod
+    def current_rate(cls) -> int | None:
+        """The limit in bytes per second applying now, or None if unlimited."""
+        with cls._lock:
+            return cls._rate if cls._applies() else None
+
+    @classmethod
+    def consume(cls, byte_count: int) -> None:
+        """Take `byte_count` received bytes from the budget, sleeping until they
+        are available if the limit currently applies.
+        """
+        with cls._lock:
+            if (bucket := cls._bucket) is None or not cls._applies():
+                return
+        bucket.acquire(byte_count)
+
+    @classmethod
+    def ytdl_hook(cls, progress: dict[str, Any]) -> None:
+        """Progress hook for yt-dlp."""
+        if (status := progress.get("status")) not in ("downloading", "finished"):
+            return
+        # bytes received per file on this thread
+        received: dict[str, int] = cls._local.__dict__.setdefault("received", {})
+        key = progress.get("filename") or ""
+        done = progress.get("downloaded_bytes") or 0
+        previous = received.pop(key, 0)
+        if status == "downloading":
+            received[key] = done
+        if done > previous:
+            cls.consume(done - previous)
+
+    @classmethod
+    def ytdl_options(cls) -> dict[str, Any]:
+        """Options limiting a yt-dlp download to the current budget."""
+        if rate := cls.current_rate():
+            return {"ratelimit": rate}
+        return {}
+
+    @classmethod
+    def _applies(cls) -> bool:
+        return bool(cls._rate) and _in_window(cls._hours, datetime.datetime.now().hour)
+
+
+def _in_window(hours: tuple[int, int], hour: int) -> bool:
+    start, end = hours
+    if start == end:
+        return True
+    if start < end:
+        return start <= hour < end
+    # e.g. from 22:00 until 6:00
+    return hour >= start or hour < end
@@ -0,0 +1,363 @@
+"""Headless command-line interface for synchronizing songs without the GUI."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+import attrs
+from PySide6 import QtCore
+
+from usdb_syncer import (
+    SongId,
+    db,
+    download_options,
+    errors,
+    events,
+    settings,
+    song_routines,
+    sync_meta,
+    sync_plan,
+    usdb_id_file,
+    utils,
+)
+from usdb_syncer.download_manager import DownloadManager
+from usdb_syncer.logger import configure_logging, logger
+from usdb_syncer.usdb_song import DownloadStatus, UsdbSong
+from usdb_syncer.ytdl_pool import YtdlPool
+
+EXIT_OK = 0
+# at least one download failed
+EXIT_FAILED = 1
+# invalid arguments or environment
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+# seconds to block at once while waiting for downloads, so interrupts are handled
+_WAIT_INTERVAL_SECS = 1.0
+
+
+class _UsageError(Exception):
+    """Raised if the arguments cannot be processed."""
+
+
+class _Progress:
+    """Prints download progress as JSON lines to stdout."""
+
+    def __init__(self) -> None:
+        self.total = 0
+        self.finished = 0
+        self.failed = 0
+        self.deleted = 0
+        self._lock = threading.Lock()
+        events.DownloadsRequested.subscribe(self._on_downloads_requested)
+        events.DownloadFinished.subscribe(self._on_download_finished)
+
+    def _on_downloads_requested(self, event: events.DownloadsRequested) -> None:
+        with self._lock:
+            self.total += event.count
+            _print(event="queued", count=event.count, total=self.total)
+
+    def _on_download_finished(self, event: events.DownloadFinished) -> None:
+        song = UsdbSong.get(event.song_id)
+        if song is None:
+            status = "deleted"
+        elif song.status == DownloadStatus.FAILED:
+            status = "failed"
+        else:
+            status = "done"
+        with self._lock:
+            self.finished += 1
+            self.failed += status == "failed"
+            self.deleted += status == "deleted"
+            _print(
+                event="finished",
+                song_id=int(event.song_id),
+                status=status,
+                finished=self.finished,
+                total=self.total,
+            )
+
+    def print_summary(self) -> None:
+        with self._lock:
+            _print(
+                event="summary",
+                total=self.total,
+                finished=self.finished,
+                failed=self.failed,
+                deleted=self.deleted,
+            )
+
+
+def _print(**data: Any) -> None:
+    print(json.dumps(data), flush=True)
+
+
+def main(args: argparse.Namespace) -> int:
+    utils.AppPaths.make_dirs()
+    # must match the GUI, so the same settings are used
+    QtCore.QCoreApplication.setOrganizationName("bohning")
+    QtCore.QCoreApplication.setApplicationName("usdb_syncer")
+    configure_logging(
+        logging.FileHandler(utils.AppPaths.log, encoding="utf-8"),
+        logging.StreamHandler(sys.stderr),
+    )
+    progress = _Progress()
+    try:
+        db.connect(utils.AppPaths.db)
+    except errors.UnknownSchemaError:
+        logger.error(f"The database at '{utils.AppPaths.db}' is not supported.")
+        return EXIT_USAGE
+    try:
+        if args.list_dead or args.purge_dead:
+            _dead_resources(args)
+            return EXIT_OK
+        if not settings.ffmpeg_is_available():
+            raise _UsageError("ffmpeg is required for downloading songs.")
+        return _sync(args, progress)
+    except _UsageError as error:
+        logger.error(str(error))
+        return EXIT_USAGE
+    except KeyboardInterrupt:
+        logger.info("Interrupted; unfinished downloads are resumed next time.")
+        return EXIT_INTERRUPTED
+    finally:
+        DownloadManager.quit()
+        db.close()
+
+
+def _sync(args: argparse.Namespace, progress: _Progress) -> int:
+    if args.workers:
+        DownloadManager.set_workers(args.workers)
+    if args.bandwidth_limit is not None or args.bandwidth_hours:
+        DownloadManager.set_bandwidth_limit(
+            (
+                settings.get_bandwidth_limit()
+                if args.bandwidth_limit is None
+                else args.bandwidth_limit
+            ),
+            args.bandwidth_hours or settings.get_bandwidth_limit_hours(),
+        )
+    YtdlPool.warm_up()
+    folder = settings.get_song_dir()
+    new_songs: list[UsdbSong] = []
+    if args.refresh:
+        with db.transaction():
+            max_skip_id = song_routines.max_known_song_id()
+        # fetched outside of a transaction, so the database isn't locked meanwhile
+        new_songs = song_routines.fetch_new_songs(max_skip_id)
+    with db.transaction():
+        song_routines.store_new_songs(new_songs)
+        song_routines.synchronize_sync_meta_folder(folder)
+        sync_meta.SyncMeta.reset_active(folder)
+    song_ids = _song_ids(args)
+    if args.dry_run:
+        _print_plan(song_ids)
+        return EXIT_OK
+    if args.only_changed:
+        options = download_options.download_options()
+        song_ids = [
+            plan.song_id
+            for plan in sync_plan.plan_songs(song_ids, options)
+            if not plan.is_noop()
+        ]
+    DownloadManager.restore()
+    song_routines.download_songs(song_ids)
+    while not DownloadManager.wait(_WAIT_INTERVAL_SECS):
+        pass
+    progress.print_summary()
+    return EXIT_FAILED if progress.failed else EXIT_OK
+
+
+def _dead_resources(args: argparse.Namespace) -> None:
+    if args.purge_dead:
+        expired_before = time.time() if args.purge_dead == "expired" else None
+        with db.transaction():
+            count = db.delete_dead_resources(expired_before)
+        _print(event="purged", count=count)
+    if args.list_dead:
+        for dead in db.all_dead_resources():
+            _print(event="dead_resource", **attrs.asdict(dead))
+
+
+def _print_plan(song_ids: list[SongId]) -> None:
+    options = download_options.download_options()
+    counts: Counter[str] = Counter()
+    for plan in sync_plan.plan_songs(song_ids, options):
+        counts["total"] += 1
+        if plan.is_noop():
+            counts["pinned" if plan.pinned else "unchanged"] += 1
+            continue
+        counts.update(str(reason) for reason in plan.reasons)
+        counts.update(f"fetch_{kind.value}" for kind in plan.fetched)
+        counts.update(f"cached_{kind.value}" for kind in plan.cached)
+        _print(
+            event="planned",
+            song_id=int(plan.song_id),
+            reasons=sorted(str(reason) for reason in plan.reasons),
+            fetch=[kind.value for kind in plan.fetched],
+            reuse=[kind.value for kind in plan.reused],
+            cached=[kind.value for kind in plan.cached],
+            target=str(plan.target),
+        )
+    _print(event="plan_summary", **counts)
+
+
+def _song_ids(args: argparse.Namespace) -> list[SongId]:
+    song_ids = [SongId(i) for i in args.ids]
+    if args.local:
+        song_ids.extend(db.all_local_usdb_songs())
+    for path in args.id_files:
+        try:
+            song_ids.extend(usdb_id_file.parse_usdb_id_file(str(path)))
+        except usdb_id_file.UsdbIdFileError as error:
+            raise _UsageError(f"Failed to read '{path}': {error}") from error
+    if args.search is not None:
+        if not (search := db.SavedSearch.get(args.search)):
+            raise _UsageError(f"There is no saved search named '{args.search}'.")
+        song_ids.extend(db.search_usdb_songs(search.search))
+    return list(dict.fromkeys(song_ids))
+
+
+def _song_id(value: str) -> int:
+    try:
+        return int(SongId.parse(value))
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(f"invalid song id: '{value}'") from error
+
+
+def _positive_int(value: str) -> int:
+    if not value.isdigit() or int(value) < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer: '{value}'")
+    return int(value)
+
+
+def _non_negative_int(value: str) -> int:
+    if not value.isdigit():
+        raise argparse.ArgumentTypeError(f"must be a non-negative integer: '{value}'")
+    return int(value)
+
+
+def _hours(value: str) -> tuple[int, int]:
+    start, _, end = value.partition("-")
+    if not (start.isdigit() and end.isdigit() and int(start) < 24 and int(end) < 24):
+        raise argparse.ArgumentTypeError(f"must be two hours like '22-6': '{value}'")
+    return int(start), int(end)
+
+
+def cli_entry() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Synchronizes songs from USDB without the GUI, using the settings and "
+            "database of the app. Progress is printed to stdout as JSON lines; logs "
+            "go to stderr. Downloads that were queued but not finished are resumed."
+        ),
+        epilog=(
+            f"exit codes: {EXIT_OK} if all downloads succeeded, {EXIT_FAILED} if some "
+            f"failed, {EXIT_USAGE} on invalid arguments or setup, {EXIT_INTERRUPTED} "
+            "if interrupted"
+        ),
+    )
+    parser.add_argument(
+        "--refresh", action="store_true", help="fetch new songs from USDB first"
+    )
+    parser.add_argument(
+        "--search", "-s", metavar="NAME", help="download the songs of a saved search"
+    )
+    parser.add_argument(
+        "--ids",
+        "-i",
+        nargs="+",
+        type=_song_id,
+        default=[],
+        metavar="ID",
+        help="download the songs with these USDB ids",
+    )
+    parser.add_argument(
+        "--id-file",
+        "-f",
+        action="append",
+        type=Path,
+        default=[],
+        dest="id_files",
+        metavar="PATH",
+        help="download the songs listed in a USDB id file (may be repeated)",
+    )
+    parser.add_argument(
+        "--local",
+        "-l",
+        action="store_true",
+        help="download all songs which have been downloaded before",
+    )
+    parser.add_argument(
+        "--dry-run",
+        "-n",
+        action="store_true",
+        help=(
+            "only print which songs would be downloaded and why, based on the "
+            "database and the song folder"
+        ),
+    )
+    parser.add_argument(
+        "--only-changed",
+        action="store_true",
+        help=(
+            "skip songs whose local copy is complete; changes on USDB are not "
+            "detected for these"
+        ),
+    )
+    parser.add_argument(
+        "--list-dead",
+        action="store_true",
+        help=(
+            "print the resources which are skipped because they failed permanently, "
+            "then exit"
+        ),
+    )
+    parser.add_argument(
+        "--purge-dead",
+        nargs="?",
+        const="all",
+        choices=["all", "expired"],
+        help=(
+            "forget all or only expired resources which failed permanently, so they "
+            "are tried again, then exit"
+        ),
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=_positive_int,
+        metavar="N",
+        help="number of workers per download stage instead of the configured ones",
+    )
+    parser.add_argument(
+        "--bandwidth-limit",
+        type=_non_negative_int,
+        metavar="KBPS",
+        help=(
+            "download rate in KB/s all media downloads share instead of the "
+            "configured one; 0 means unlimited"
+        ),
+    )
+    parser.add_argument(
+        "--bandwidth-hours",
+        type=_hours,
+        metavar="START-END",
+        help=(
+            "hours of the day from and until which the bandwidth limit applies "
+            "instead of the configured ones, e.g. 8-22; all day if equal"
+        ),
+    )
+    sys.exit(main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    cli_entry()
@@ -0,0 +1,149 @@
+"""Cache of the cookies of the user's browser.
+
+Reading a browser's cookie store means decrypting it, which can take seconds and
+may even prompt for the keychain. The cookies are therefore read once and shared
+by the USDB session and all yt-dlp instances, which get them as a cookie file,
+until they expire or a login with them fails.
+
+Only cookies of USDB and of the sites needed for age-restricted videos are read.
+The cookie file is readable only by the current user and deleted when the app
+exits. When the cookies are read again, a new file is written and the old one is
+kept for pooled yt-dlp instances still using it, until it is older than the TTL.
+Files left behind by a crash are deleted the same way.
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import tempfile
+import threading
+import time
+from http.cookiejar import Cookie
+from pathlib import Path
+
+from yt_dlp.cookies import YoutubeDLCookieJar
+
+from usdb_syncer.constants import Usdb
+from usdb_syncer.logger import logger
+from usdb_syncer.settings import Browser
+
+# cookies are read from the browser again after this long
+_TTL_SECS = 60 * 60
+# sites whose cookies are read
+DOMAINS = (Usdb.DOMAIN, "youtube.com", "google.com")
+_FILE_PREFIX = "usdb_syncer_cookies_"
+
+
+class CookieCache:
+    """Singleton holding the cookies of the most recently used browser."""
+
+    _browser: Browser | None = None
+    # None if the cookies could not be read
+    _cookies: list[Cookie] | None = None
+    _file: Path | None = None
+    # all files written by this process, including replaced ones
+    _files: list[Path] = []
+    _fetched_at = 0.0
+    _exit_registered = False
+    _lock = threading.Lock()
+
+    @classmethod
+    def cookies(cls, browser: Browser, domain: str | None = None) -> list[Cookie]:
+        """The cookies of `browser`, optionally only those of `domain` and its
+        subdomains.
+        """
+        with cls._lock:
+            cookies = cls._fetch(browser) or []
+        if domain is None:
+            return cookies
+        return [c for c in cookies if _matches(c.domain, domain)]
+
+    @classmethod
+    def cookie_file(cls, browser: Browser) -> Path | None:
+        """A file with the cookies of `browser` in the Netscape format yt-dlp
+        expects. A new file is written whenever the cookies are read again.
+        """
+        with cls._lock:
+            if (cookies := cls._fetch(browser)) is None:
+                return None
+            if cls._file is None:
+                if not cls._exit_registered:
+                    atexit.register(cls.clear)
+                    cls._exit_registered = True
+                _remove_stale_files()
+                cls._file = _write_cookie_file(cookies)
+                cls._files.append(cls._file)
+            return cls._file
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """Read the cookies from the browser again on the next access, e.g.
+        because they failed to log in.
+        """
+        with cls._lock:
+            cls._browser = None
+
+    @classmethod
+    def clear(cls) -> None:
+        """Forget the cookies and delete all cookie files."""
+        with cls._lock:
+            cls._browser = cls._cookies = None
+            cls._file = None
+            for path in cls._files:
+                path.unlink(missing_ok=True)
+            cls._files.clear()
+
+    @classmethod
+    def _fetch(cls, browser: Browser) -> list[Cookie] | None:
+        now = time.time()
+        if browser is cls._browser and now - cls._fetched_at < _TTL_SECS:
+            return cls._cookies
+        start = time.monotonic()
+        # failures are cached as well, so they are not retried for every download
+        jar = browser.cookies(list(DOMAINS))
+        cls._cookies = None
+        if jar is not None:
+            cls._cookies = [
+                c for c in jar if any(_matches(c.domain, d) for d in DOMAINS)
+            ]
+            logger.debug(
+                f"Read {len(cls._cookies)} {browser} cookies in "
+                f"{time.monotonic() - start:.1f}s."
+            )
+        cls._browser = browser
+        cls._fetched_at = now
+        # pooled yt-dlp instances are keyed by the file, so the old one is not
+        # reused, but may still be read by them until it is stale
+        cls._file = None
+        return cls._cookies
+
+
+def _matches(cookie_domain: str, domain: str) -> bool:
+    cookie_domain = cookie_domain.lstrip(".")
+    return cookie_domain == domain or cookie_domain.endswith(f".{domain}")
+
+
+def _write_cookie_file(cookies: list[Cookie]) -> Path:
+    # readable only by the current user
+    handle, name = tempfile.mkstemp(prefix=_FILE_PREFIX, suffix=".txt")
+    os.close(handle)
+    jar = YoutubeDLCookieJar(name)
+    for cookie in cookies:
+        jar.set_cookie(cookie)
+    jar.save(ignore_discard=True, ignore_expires=True)
+    return Path(name)
+
+
+def _remove_stale_files() -> None:
+    """Delete cookie files of earlier runs which did not exit cleanly and files of
+    this run which were replaced a while ago. Files of other running instances are
+    rewritten within the TTL, so they are kept.
+    """
+    cutoff = time.time() - _TTL_SECS
+    for path in Path(tempfile.gettempdir()).glob(f"{_FILE_PREFIX}*.txt"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
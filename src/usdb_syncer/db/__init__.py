@@ -2,131 +2,57 @@
 
 from __future__ import annotations
 
-import contextlib
 import enum
 import json
-import os
-import sqlite3
-import threading
-import time
 import traceback
 from collections import defaultdict
 from pathlib import Path
-from typing import Any, Generator, Iterable, Iterator, assert_never, cast
+from typing import Any, Iterable, Iterator, assert_never, cast
 
 import attrs
 from more_itertools import batched
 
-from usdb_syncer import SongId, SyncMetaId, errors
+from usdb_syncer import SongId, SyncMetaId
+from usdb_syncer.db.caches import (
+    DeadResourceParams,
+    LoudnessStatsRow,
+    YtdlInfoParams,
+    all_dead_resources,
+    delete_dead_resources,
+    get_dead_resource,
+    get_http_validator,
+    get_loudness_stats,
+    get_sync_fingerprint,
+    get_ytdl_info,
+    is_ytdl_age_gated,
+    mark_ytdl_age_gated,
+    upsert_dead_resource,
+    upsert_http_validator,
+    upsert_loudness_stats,
+    upsert_sync_fingerprint,
+    upsert_ytdl_info,
+)
+from usdb_syncer.db.connection import (
+    _SQL_VARIABLES_LIMIT,
+    SCHEMA_VERSION,
+    _DbState,
+    _SqlCache,
+    close,
+    connect,
+    ensure_connection,
+    managed_connection,
+    transaction,
+)
+from usdb_syncer.db.download_queue import (
+    claim_download,
+    dequeue_download,
+    dequeue_unclaimed_downloads,
+    enqueue_downloads,
+    release_download,
+    reset_download_queue,
+)
+from usdb_syncer.db.writer import start_writer, stop_writer, submit_write
 from usdb_syncer.logger import logger
-from usdb_syncer.utils import AppPaths
-
-SCHEMA_VERSION = 5
-
-# https://www.sqlite.org/limits.html
-_SQL_VARIABLES_LIMIT = 32766
-
-
-class _SqlCache:
-    _cache: dict[str, str] = {}
-
-    @classmethod
-    def get(cls, name: str, cache: bool = True) -> str:
-        if (stmt := cls._cache.get(name)) is None:
-            stmt = AppPaths.sql.joinpath(name).read_text("utf8")
-            if cache:
-                cls._cache[name] = stmt
-        return stmt
-
-
-class _LocalConnection(threading.local):
-    """A thread-local database connection."""
-
-    connection: sqlite3.Connection | None = None
-
-
-class _DbState:
-    """Singleton for managing the global database connection."""
-
-    _local: _LocalConnection = _LocalConnection()
-
-    @classmethod
-    def connect(cls, db_path: Path | str, trace: bool = False) -> None:
-        if cls._local.connection:
-            raise errors.DatabaseError("Already connected to database!")
-        cls._local.connection = sqlite3.connect(
-            db_path, check_same_thread=False, isolation_level=None, timeout=20
-        )
-        thread = threading.current_thread().name
-        logger.debug(f"Connected to database at '{db_path}' on thread {thread}.")
-        if trace:
-            cls._local.connection.set_trace_callback(logger.debug)
-        _validate_schema(cls._local.connection)
-
-    @classmethod
-    def connection(cls) -> sqlite3.Connection:
-        if cls._local.connection is None:
-            raise errors.DatabaseError("Not connected to database!")
-        return cls._local.connection
-
-    @classmethod
-    def close(cls) -> None:
-        if _DbState._local.connection is not None:
-            _DbState._local.connection.close()
-            _DbState._local.connection = None
-            thread = threading.current_thread().name
-            logger.debug(f"Closed database connection on thread {thread}.")
-
-
-@contextlib.contextmanager
-def transaction() -> Generator[None, None, None]:
-    try:
-        _DbState.connection().execute("BEGIN IMMEDIATE")
-        yield None
-    except Exception:  # pylint: disable=broad-except
-        _DbState.connection().rollback()
-        raise
-    _DbState.connection().commit()
-
-
-def _validate_schema(connection: sqlite3.Connection) -> None:
-    meta_table = connection.execute(
-        "SELECT 1 FROM sqlite_schema WHERE type = 'table' AND name = 'meta'"
-    ).fetchone()
-    if meta_table is None:
-        version = 0
-    else:
-        row = connection.execute("SELECT version FROM meta WHERE id = 1").fetchone()
-        if not row or row[0] > SCHEMA_VERSION:
-            raise errors.UnknownSchemaError
-        version = row[0]
-    for ver in range(version + 1, SCHEMA_VERSION + 1):
-        connection.executescript(_SqlCache.get(f"{ver}_migration.sql", cache=False))
-        logger.debug(f"Database migrated to version {ver}.")
-    if version < SCHEMA_VERSION:
-        connection.execute(
-            "INSERT INTO meta (id, version, ctime) VALUES (1, :version, :ctime) "
-            "ON CONFLICT (id) DO UPDATE SET version = :version",
-            {"version": SCHEMA_VERSION, "ctime": int(time.time() * 1_000_000)},
-        )
-    connection.executescript(_SqlCache.get("setup_session_script.sql", cache=False))
-
-
-def connect(db_path: Path | str) -> None:
-    _DbState.connect(db_path, trace=bool(os.environ.get("TRACESQL")))
-
-
-def close() -> None:
-    _DbState.close()
-
-
-@contextlib.contextmanager
-def managed_connection(db_path: Path | str) -> Generator[None, None, None]:
-    try:
-        _DbState.connect(db_path)
-        yield None
-    finally:
-        _DbState.close()
 
 
 class DownloadStatus(enum.IntEnum):
@@ -525,6 +451,10 @@ class UsdbSongParams:
 def upsert_usdb_song(params: UsdbSongParams) -> None:
     stmt = _SqlCache.get("upsert_usdb_song.sql")
     _DbState.connection().execute(stmt, params.__dict__)
+    upsert_session_usdb_song(params)
+
+
+def upsert_session_usdb_song(params: UsdbSongParams) -> None:
     stmt = _SqlCache.get("upsert_session_usdb_song.sql")
     _DbState.connection().execute(stmt, params.__dict__)
 
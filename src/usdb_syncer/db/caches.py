@@ -0,0 +1,183 @@
+"""Tables caching what was learnt about songs, resources and responses."""
+
+from __future__ import annotations
+
+import attrs
+
+from usdb_syncer import SyncMetaId
+from usdb_syncer.db.connection import _DbState
+
+### SyncFingerprint
+
+
+def get_sync_fingerprint(sync_meta_id: SyncMetaId) -> str | None:
+    row = (
+        _DbState.connection()
+        .execute(
+            "SELECT fingerprint FROM sync_fingerprint WHERE sync_meta_id = ?",
+            (sync_meta_id,),
+        )
+        .fetchone()
+    )
+    return row[0] if row else None
+
+
+def upsert_sync_fingerprint(sync_meta_id: SyncMetaId, fingerprint: str) -> None:
+    _DbState.connection().execute(
+        "INSERT INTO sync_fingerprint (sync_meta_id, fingerprint) VALUES (?, ?) "
+        "ON CONFLICT (sync_meta_id) DO UPDATE SET fingerprint = excluded.fingerprint",
+        (sync_meta_id, fingerprint),
+    )
+
+
+### LoudnessStats
+
+# input_i, input_tp, input_lra, input_thresh, target_offset
+LoudnessStatsRow = tuple[float, float, float, float, float]
+
+
+def get_loudness_stats(resource: str) -> LoudnessStatsRow | None:
+    stmt = (
+        "SELECT input_i, input_tp, input_lra, input_thresh, target_offset "
+        "FROM loudness_stats WHERE resource = ?"
+    )
+    return _DbState.connection().execute(stmt, (resource,)).fetchone()
+
+
+def upsert_loudness_stats(resource: str, stats: LoudnessStatsRow) -> None:
+    _DbState.connection().execute(
+        "INSERT OR REPLACE INTO loudness_stats (resource, input_i, input_tp, "
+        "input_lra, input_thresh, target_offset) VALUES (?, ?, ?, ?, ?, ?)",
+        (resource, *stats),
+    )
+
+
+### HttpValidator
+
+
+def get_http_validator(url: str) -> tuple[str | None, str | None, int, float] | None:
+    """ETag, Last-Modified, max age and time of validation of a cached response."""
+    stmt = (
+        "SELECT etag, last_modified, max_age, validated_at FROM http_validator "
+        "WHERE url = ?"
+    )
+    return _DbState.connection().execute(stmt, (url,)).fetchone()
+
+
+def upsert_http_validator(
+    url: str,
+    etag: str | None,
+    last_modified: str | None,
+    max_age: int,
+    validated_at: float,
+) -> None:
+    _DbState.connection().execute(
+        "INSERT OR REPLACE INTO http_validator (url, etag, last_modified, max_age, "
+        "validated_at) VALUES (?, ?, ?, ?, ?)",
+        (url, etag, last_modified, max_age, validated_at),
+    )
+
+
+### YtdlInfo
+
+
+@attrs.define(frozen=True, slots=False)
+class YtdlInfoParams:
+    """Parameters for inserting or updating the extraction result of a resource."""
+
+    url: str
+    format_spec: str
+    # JSON list of format ids
+    formats: str
+    duration: float | None
+    age_gated: bool
+    chosen_format: str | None
+    error: str | None
+    fetched_at: float
+
+
+def get_ytdl_info(url: str, format_spec: str) -> YtdlInfoParams | None:
+    stmt = (
+        "SELECT url, format_spec, formats, duration, age_gated, chosen_format, error, "
+        "fetched_at FROM ytdl_info WHERE url = ? AND format_spec = ?"
+    )
+    row = _DbState.connection().execute(stmt, (url, format_spec)).fetchone()
+    return YtdlInfoParams(*row) if row else None
+
+
+def upsert_ytdl_info(params: YtdlInfoParams) -> None:
+    stmt = (
+        "INSERT OR REPLACE INTO ytdl_info (url, format_spec, formats, duration, "
+        "age_gated, chosen_format, error, fetched_at) VALUES (:url, :format_spec, "
+        ":formats, :duration, :age_gated, :chosen_format, :error, :fetched_at)"
+    )
+    _DbState.connection().execute(stmt, params.__dict__)
+
+
+def mark_ytdl_age_gated(url: str, format_spec: str) -> None:
+    """Record that the resource requires cookies, without caching a result."""
+    stmt = (
+        "INSERT INTO ytdl_info (url, format_spec, formats, age_gated, fetched_at) "
+        "VALUES (?, ?, '[]', TRUE, 0) "
+        "ON CONFLICT (url, format_spec) DO UPDATE SET age_gated = TRUE"
+    )
+    _DbState.connection().execute(stmt, (url, format_spec))
+
+
+def is_ytdl_age_gated(url: str) -> bool:
+    """True if the resource required cookies for any format."""
+    stmt = "SELECT 1 FROM ytdl_info WHERE url = ? AND age_gated LIMIT 1"
+    return _DbState.connection().execute(stmt, (url,)).fetchone() is not None
+
+
+### DeadResource
+
+
+@attrs.define(frozen=True, slots=False)
+class DeadResourceParams:
+    """Parameters for inserting or updating a resource that cannot be downloaded."""
+
+    url: str
+    reason: str
+    error: str
+    failed_at: float
+    expires_at: float
+
+
+_DEAD_RESOURCE_COLUMNS = "url, reason, error, failed_at, expires_at"
+
+
+def get_dead_resource(url: str, now: float) -> DeadResourceParams | None:
+    """The entry for `url`, unless it expired before `now`."""
+    stmt = (
+        f"SELECT {_DEAD_RESOURCE_COLUMNS} FROM dead_resource "
+        "WHERE url = ? AND expires_at > ?"
+    )
+    row = _DbState.connection().execute(stmt, (url, now)).fetchone()
+    return DeadResourceParams(*row) if row else None
+
+
+def all_dead_resources() -> list[DeadResourceParams]:
+    stmt = f"SELECT {_DEAD_RESOURCE_COLUMNS} FROM dead_resource ORDER BY failed_at"
+    return [DeadResourceParams(*row) for row in _DbState.connection().execute(stmt)]
+
+
+def upsert_dead_resource(params: DeadResourceParams) -> None:
+    stmt = (
+        f"INSERT OR REPLACE INTO dead_resource ({_DEAD_RESOURCE_COLUMNS}) "
+        "VALUES (:url, :reason, :error, :failed_at, :expires_at)"
+    )
+    _DbState.connection().execute(stmt, params.__dict__)
+
+
+def delete_dead_resources(expired_before: float | None = None) -> int:
+    """Delete all entries, or only those that expired before the given time.
+    Returns the number of deleted entries.
+    """
+    if expired_before is None:
+        cursor = _DbState.connection().execute("DELETE FROM dead_resource")
+    else:
+        cursor = _DbState.connection().execute(
+            "DELETE FROM dead_resource WHERE expires_at <= ?", (expired_before,)
+        )
+    return cursor.rowcount
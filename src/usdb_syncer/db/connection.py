@@ -0,0 +1,136 @@
+"""Thread-local connections to the database and transactions."""
+
+from __future__ import annotations
+
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Generator
+
+from usdb_syncer import errors
+from usdb_syncer.logger import logger
+from usdb_syncer.utils import AppPaths
+
+SCHEMA_VERSION = 11
+
+# https://www.sqlite.org/limits.html
+_SQL_VARIABLES_LIMIT = 32766
+
+
+class _SqlCache:
+    _cache: dict[str, str] = {}
+
+    @classmethod
+    def get(cls, name: str, cache: bool = True) -> str:
+        if (stmt := cls._cache.get(name)) is None:
+            stmt = AppPaths.sql.joinpath(name).read_text("utf8")
+            if cache:
+                cls._cache[name] = stmt
+        return stmt
+
+
+class _LocalConnection(threading.local):
+    """A thread-local database connection."""
+
+    connection: sqlite3.Connection | None = None
+
+
+class _DbState:
+    """Singleton for managing the global database connection."""
+
+    _local: _LocalConnection = _LocalConnection()
+
+    @classmethod
+    def connect(cls, db_path: Path | str, trace: bool = False) -> None:
+        if cls._local.connection:
+            raise errors.DatabaseError("Already connected to database!")
+        cls._local.connection = sqlite3.connect(
+            db_path, check_same_thread=False, isolation_level=None, timeout=20
+        )
+        thread = threading.current_thread().name
+        logger.debug(f"Connected to database at '{db_path}' on thread {thread}.")
+        if trace:
+            cls._local.connection.set_trace_callback(logger.debug)
+        _validate_schema(cls._local.connection)
+
+    @classmethod
+    def connection(cls) -> sqlite3.Connection:
+        if cls._local.connection is None:
+            raise errors.DatabaseError("Not connected to database!")
+        return cls._local.connection
+
+    @classmethod
+    def is_connected(cls) -> bool:
+        return cls._local.connection is not None
+
+    @classmethod
+    def close(cls) -> None:
+        if _DbState._local.connection is not None:
+            _DbState._local.connection.close()
+            _DbState._local.connection = None
+            thread = threading.current_thread().name
+            logger.debug(f"Closed database connection on thread {thread}.")
+
+
+@contextlib.contextmanager
+def transaction() -> Generator[None, None, None]:
+    try:
+        _DbState.connection().execute("BEGIN IMMEDIATE")
+        yield None
+    except Exception:  # pylint: disable=broad-except
+        _DbState.connection().rollback()
+        raise
+    _DbState.connection().commit()
+
+
+def _validate_schema(connection: sqlite3.Connection) -> None:
+    meta_table = connection.execute(
+        "SELECT 1 FROM sqlite_schema WHERE type = 'table' AND name = 'meta'"
+    ).fetchone()
+    if meta_table is None:
+        version = 0
+    else:
+        row = connection.execute("SELECT version FROM meta WHERE id = 1").fetchone()
+        if not row or row[0] > SCHEMA_VERSION:
+            raise errors.UnknownSchemaError
+        version = row[0]
+    for ver in range(version + 1, SCHEMA_VERSION + 1):
+        connection.executescript(_SqlCache.get(f"{ver}_migration.sql", cache=False))
+        logger.debug(f"Database migrated to version {ver}.")
+    if version < SCHEMA_VERSION:
+        connection.execute(
+            "INSERT INTO meta (id, version, ctime) VALUES (1, :version, :ctime) "
+            "ON CONFLICT (id) DO UPDATE SET version = :version",
+            {"version": SCHEMA_VERSION, "ctime": int(time.time() * 1_000_000)},
+        )
+    connection.executescript(_SqlCache.get("setup_session_script.sql", cache=False))
+
+
+def connect(db_path: Path | str) -> None:
+    _DbState.connect(db_path, trace=bool(os.environ.get("TRACESQL")))
+
+
+def close() -> None:
+    _DbState.close()
+
+
+def ensure_connection(db_path: Path | str) -> None:
+    """Connect the current thread unless it already is.
+
+    Meant for pool workers, which keep their connection for all following tasks.
+    It is closed when the thread exits.
+    """
+    if not _DbState.is_connected():
+        connect(db_path)
+
+
+@contextlib.contextmanager
+def managed_connection(db_path: Path | str) -> Generator[None, None, None]:
+    try:
+        _DbState.connect(db_path)
+        yield None
+    finally:
+        _DbState.close()
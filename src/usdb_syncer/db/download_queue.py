@@ -0,0 +1,81 @@
+"""Persistent queue of the songs to download."""
+
+from __future__ import annotations
+
+import time
+from typing import Iterable
+
+from more_itertools import batched
+
+from usdb_syncer import SongId
+from usdb_syncer.db.connection import _SQL_VARIABLES_LIMIT, _DbState, _SqlCache
+
+### DownloadQueue
+
+
+def enqueue_downloads(song_ids: Iterable[SongId], priority: int = 0) -> list[SongId]:
+    """Add songs to the download queue. Returns the ids of the songs that were not
+    queued already.
+    """
+    stmt = (
+        "INSERT INTO download_queue (song_id, priority, enqueued_at) VALUES (?, ?, ?) "
+        "ON CONFLICT (song_id) DO NOTHING RETURNING song_id"
+    )
+    now = int(time.time() * 1_000_000)
+    return [
+        SongId(row[0])
+        for song_id in song_ids
+        for row in _DbState.connection().execute(stmt, (song_id, priority, now))
+    ]
+
+
+def claim_download() -> tuple[SongId, int] | None:
+    """Mark the next unclaimed song in the download queue as claimed. Returns its id
+    and the number of attempts including this one, if there is any.
+    """
+    row = _DbState.connection().execute(_SqlCache.get("claim_download.sql")).fetchone()
+    return (SongId(row[0]), row[1]) if row else None
+
+
+def release_download(song_id: SongId, error: str) -> None:
+    """Move a claimed song to the end of the download queue, so it is retried."""
+    _DbState.connection().execute(
+        "UPDATE download_queue SET claimed = false, last_error = ?, enqueued_at = ? "
+        "WHERE song_id = ?",
+        (error, int(time.time() * 1_000_000), song_id),
+    )
+
+
+def dequeue_download(song_id: SongId) -> None:
+    _DbState.connection().execute(
+        "DELETE FROM download_queue WHERE song_id = ?", (song_id,)
+    )
+
+
+def dequeue_unclaimed_downloads(song_ids: Iterable[SongId]) -> list[SongId]:
+    """Remove songs from the download queue unless they are claimed. Returns the ids
+    of the removed songs.
+    """
+    removed: list[SongId] = []
+    for batch in batched(song_ids, _SQL_VARIABLES_LIMIT):
+        id_str = ", ".join("?" for _ in range(len(batch)))
+        removed.extend(
+            SongId(row[0])
+            for row in _DbState.connection().execute(
+                f"DELETE FROM download_queue WHERE song_id IN ({id_str}) "
+                "AND NOT claimed RETURNING song_id",
+                batch,
+            )
+        )
+    return removed
+
+
+def reset_download_queue() -> list[SongId]:
+    """Mark all songs in the download queue as unclaimed, e.g. after a crash, and
+    return their ids.
+    """
+    _DbState.connection().execute("UPDATE download_queue SET claimed = false")
+    return [
+        SongId(row[0])
+        for row in _DbState.connection().execute("SELECT song_id FROM download_queue")
+    ]
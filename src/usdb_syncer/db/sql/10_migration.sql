@@ -0,0 +1,18 @@
+BEGIN;
+
+CREATE TABLE ytdl_info (
+    url TEXT NOT NULL,
+    -- format specification the resource was requested with
+    format_spec TEXT NOT NULL,
+    -- JSON list of the ids of all available formats
+    formats TEXT NOT NULL,
+    duration REAL,
+    age_gated BOOLEAN NOT NULL,
+    chosen_format TEXT,
+    -- reason why the resource could not be downloaded
+    error TEXT,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (url, format_spec)
+);
+
+END;
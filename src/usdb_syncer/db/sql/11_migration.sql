@@ -0,0 +1,12 @@
+BEGIN;
+
+CREATE TABLE dead_resource (
+    url TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    error TEXT NOT NULL,
+    failed_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (url)
+);
+
+END;
@@ -0,0 +1,17 @@
+BEGIN;
+
+CREATE TABLE download_queue (
+    song_id INTEGER NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    enqueued_at INTEGER NOT NULL,
+    claimed BOOLEAN NOT NULL DEFAULT false,
+    -- no foreign key, so queued downloads survive reloading all songs from USDB;
+    -- songs that are gone when claimed are dropped from the queue
+    PRIMARY KEY (song_id)
+);
+
+CREATE INDEX idx_download_queue_next ON download_queue (claimed, priority DESC, enqueued_at);
+
+END;
\ No newline at end of file
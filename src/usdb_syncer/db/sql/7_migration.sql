@@ -0,0 +1,10 @@
+BEGIN;
+
+CREATE TABLE sync_fingerprint (
+    sync_meta_id INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (sync_meta_id),
+    FOREIGN KEY (sync_meta_id) REFERENCES sync_meta (sync_meta_id) ON DELETE CASCADE
+);
+
+END;
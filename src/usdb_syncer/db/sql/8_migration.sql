@@ -0,0 +1,13 @@
+BEGIN;
+
+CREATE TABLE loudness_stats (
+    resource TEXT NOT NULL,
+    input_i REAL NOT NULL,
+    input_tp REAL NOT NULL,
+    input_lra REAL NOT NULL,
+    input_thresh REAL NOT NULL,
+    target_offset REAL NOT NULL,
+    PRIMARY KEY (resource)
+);
+
+END;
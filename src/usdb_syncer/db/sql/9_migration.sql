@@ -0,0 +1,14 @@
+BEGIN;
+
+CREATE TABLE http_validator (
+    url TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    -- seconds the response may be used without revalidating it
+    max_age INTEGER NOT NULL,
+    -- unix timestamp of the last time the response was fetched or revalidated
+    validated_at REAL NOT NULL,
+    PRIMARY KEY (url)
+);
+
+END;
@@ -0,0 +1,20 @@
+UPDATE
+    download_queue
+SET
+    claimed = true,
+    attempts = attempts + 1
+WHERE
+    song_id = (
+        SELECT
+            song_id
+        FROM
+            download_queue
+        WHERE
+            claimed = false
+        ORDER BY
+            priority DESC,
+            enqueued_at
+        LIMIT
+            1
+    ) RETURNING song_id,
+    attempts
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""Thread committing the writes of other threads in batches."""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+from usdb_syncer.db.connection import _DbState, managed_connection, transaction
+from usdb_syncer.logger import logger
+
+# submitted writes are committed once this many are pending or the interval elapsed
+_WRITE_BATCH_SIZE = 64
+_WRITE_BATCH_INTERVAL_SECS = 0.05
+
+T = TypeVar("T")
+
+
+class _Writer:
+    """Singleton thread committing writes submitted by other threads in batched
+    transactions, so they don't compete for the database lock.
+    """
+
+    _items: queue.SimpleQueue[tuple[Callable[[], Any], Future] | None]
+    _thread: threading.Thread | None = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def start(cls, db_path: Path | str) -> None:
+        with cls._lock:
+            if cls._thread:
+                return
+            cls._items = queue.SimpleQueue()
+            cls._thread = threading.Thread(
+                target=cls._run,
+                args=(db_path, cls._items),
+                name="DbWriter",
+                daemon=True,
+            )
+            cls._thread.start()
+
+    @classmethod
+    def submit(cls, write: Callable[[], T]) -> Future[T]:
+        future: Future[T] = Future()
+        with cls._lock:
+            if running := cls._thread is not None:
+                cls._items.put((write, future))
+        if not running:
+            if _DbState.connection().in_transaction:
+                # the savepoint nests in the caller's transaction, which commits it
+                _run_write(write, future)
+            else:
+                with transaction():
+                    _run_write(write, future)
+        return future
+
+    @classmethod
+    def stop(cls) -> None:
+        with cls._lock:
+            thread, cls._thread = cls._thread, None
+            if thread:
+                cls._items.put(None)
+        if thread:
+            thread.join()
+
+    @classmethod
+    def _run(
+        cls,
+        db_path: Path | str,
+        items: queue.SimpleQueue[tuple[Callable[[], Any], Future] | None],
+    ) -> None:
+        with managed_connection(db_path):
+            stop = False
+            while not stop:
+                batch = []
+                if item := items.get():
+                    batch.append(item)
+                    deadline = time.monotonic() + _WRITE_BATCH_INTERVAL_SECS
+                    while len(batch) < _WRITE_BATCH_SIZE:
+                        try:
+                            item = items.get(
+                                timeout=max(0, deadline - time.monotonic())
+                            )
+                        except queue.Empty:
+                            break
+                        if item is None:
+                            break
+                        batch.append(item)
+                stop = item is None
+                if batch:
+                    cls._commit(batch)
+
+    @classmethod
+    def _commit(cls, batch: list[tuple[Callable[[], Any], Future]]) -> None:
+        """Run all writes in a single transaction. Changes of failed writes are
+        rolled back individually. Futures are only resolved after committing, so
+        waiting threads see the changes.
+        """
+        futures: list[Future] = [Future() for _ in batch]
+        try:
+            with transaction():
+                for (write, _), inner in zip(batch, futures):
+                    _run_write(write, inner)
+        except Exception as exception:  # pylint: disable=broad-except
+            logger.debug(traceback.format_exc())
+            for _, future in batch:
+                future.set_exception(exception)
+            return
+        for (_, future), inner in zip(batch, futures):
+            if (error := inner.exception()) is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(inner.result())
+
+
+def _run_write(write: Callable[[], T], future: Future[T]) -> None:
+    """Run `write` in a savepoint, so if it fails, its partial changes are undone
+    without affecting the other writes of the transaction.
+    """
+    connection = _DbState.connection()
+    connection.execute("SAVEPOINT write")
+    try:
+        future.set_result(write())
+    except Exception as exception:  # pylint: disable=broad-except
+        logger.debug(traceback.format_exc())
+        connection.execute("ROLLBACK TO write")
+        future.set_exception(exception)
+    connection.execute("RELEASE write")
+
+
+def start_writer(db_path: Path | str) -> None:
+    """Start a thread with its own connection for committing submitted writes."""
+    _Writer.start(db_path)
+
+
+def submit_write(write: Callable[[], T]) -> Future[T]:
+    """Run `write` on the writer thread, batched with other writes into a single
+    transaction. If the writer is not running, `write` is run synchronously in a
+    transaction on the current thread's connection, or in the caller's transaction
+    if one is active.
+
+    Returns:
+        a future, which is resolved once the transaction is committed
+    """
+    return _Writer.submit(write)
+
+
+def stop_writer() -> None:
+    """Commit all submitted writes and stop the writer thread."""
+    _Writer.stop()
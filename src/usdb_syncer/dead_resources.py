@@ -0,0 +1,113 @@
+"""Negative cache of audio and video resources which cannot be downloaded.
+
+Resources which are private, removed or geo-blocked fail the same way for every
+song referencing them, so they are skipped until their entry expires. Errors that
+depend on the requested format are cached in `ytdl_info` instead.
+"""
+
+from __future__ import annotations
+
+import enum
+import functools
+import time
+from typing import assert_never
+
+from yt_dlp.utils import DownloadError, ExtractorError, YoutubeDLError
+
+from usdb_syncer import db
+
+_DAY_SECS = 24 * 60 * 60
+
+
+class DeadReason(enum.Enum):
+    """Why a resource cannot be downloaded."""
+
+    PRIVATE = "private"
+    REMOVED = "removed"
+    GEO_BLOCKED = "geo_blocked"
+    # any other error the extractor reports as permanent
+    UNAVAILABLE = "unavailable"
+
+    def __str__(self) -> str:
+        return self.value
+
+    def ttl_secs(self) -> int:
+        """How long a resource is skipped before it is tried again."""
+        match self:
+            case DeadReason.REMOVED:
+                return 30 * _DAY_SECS
+            case DeadReason.PRIVATE | DeadReason.GEO_BLOCKED:
+                return 7 * _DAY_SECS
+            case DeadReason.UNAVAILABLE:
+                return 3 * _DAY_SECS
+            case _ as unreachable:
+                assert_never(unreachable)
+
+
+# lower-case message fragments identifying the reasons, checked in order
+_REASON_MESSAGES = (
+    (DeadReason.PRIVATE, ("private video", "video is private")),
+    (
+        DeadReason.REMOVED,
+        (
+            "has been removed",
+            "been terminated",
+            "no longer available",
+            "does not exist",
+            "video has been deleted",
+        ),
+    ),
+    (
+        DeadReason.GEO_BLOCKED,
+        (
+            "geo restriction",
+            "from your location",
+            "available in your country",
+            "blocked it in your country",
+        ),
+    ),
+)
+# errors which depend on the cookies or on bot detection, so retrying may succeed
+SESSION_DEPENDENT_MESSAGES = ("confirm your age", "not a bot")
+# errors which are permanent, but depend on the format or the session
+_NOT_DEAD_MESSAGES = ("requested format", *SESSION_DEPENDENT_MESSAGES)
+
+
+def classify(error: YoutubeDLError) -> DeadReason | None:
+    """The reason why the resource is dead, if the error shows it is."""
+    if isinstance(error, DownloadError) and error.exc_info:
+        error = error.exc_info[1]
+    if not isinstance(error, ExtractorError) or not error.expected:
+        return None
+    message = str(error).lower()
+    if any(fragment in message for fragment in _NOT_DEAD_MESSAGES):
+        return None
+    for reason, fragments in _REASON_MESSAGES:
+        if any(fragment in message for fragment in fragments):
+            return reason
+    return DeadReason.UNAVAILABLE
+
+
+def depends_on_session(error: YoutubeDLError) -> bool:
+    """True if the error may not occur with different cookies or at a later time,
+    even if the extractor reports it as expected.
+    """
+    message = str(error).lower()
+    return any(fragment in message for fragment in SESSION_DEPENDENT_MESSAGES)
+
+
+def lookup(url: str) -> db.DeadResourceParams | None:
+    """The entry for `url`, if it is known to be dead."""
+    return db.get_dead_resource(url, time.time())
+
+
+def record(url: str, reason: DeadReason, error: YoutubeDLError) -> None:
+    now = time.time()
+    params = db.DeadResourceParams(
+        url=url,
+        reason=reason.value,
+        error=str(error),
+        failed_at=now,
+        expires_at=now + reason.ttl_secs(),
+    )
+    db.submit_write(functools.partial(db.upsert_dead_resource, params))
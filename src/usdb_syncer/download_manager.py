@@ -0,0 +1,532 @@
+"""Scheduler running the steps of song downloads in a staged pipeline."""
+
+from __future__ import annotations
+
+import collections
+import enum
+import functools
+import threading
+import time
+import traceback
+from typing import Iterable, assert_never
+
+import attrs
+from PySide6 import QtCore
+
+from usdb_syncer import SongId, db, download_options, events, settings, utils, ytdl_info
+from usdb_syncer.adaptive_pool import AdaptiveConcurrency, Adjustment
+from usdb_syncer.bandwidth import BandwidthLimiter
+from usdb_syncer.cookie_cache import CookieCache
+from usdb_syncer.host_limiter import HostLimiter
+from usdb_syncer.logger import logger, song_logger
+from usdb_syncer.loudness import NormalizationPool
+from usdb_syncer.song_loader import DownloadStep, SongLoader
+from usdb_syncer.transfer_progress import TransferProgress
+from usdb_syncer.usdb_song import DownloadStatus, UsdbSong
+from usdb_syncer.ytdl_pool import YtdlPool
+
+
+class DownloadStage(enum.Enum):
+    """Stages of a song download. Each stage is processed by its own worker pool, so
+    slow stages only throttle themselves.
+    """
+
+    METADATA = 0
+    MEDIA = enum.auto()
+    IMAGES = enum.auto()
+    TRANSCODE = enum.auto()
+    PERSIST = enum.auto()
+
+    def __str__(self) -> str:
+        match self:
+            case DownloadStage.METADATA:
+                return "metadata"
+            case DownloadStage.MEDIA:
+                return "media"
+            case DownloadStage.IMAGES:
+                return "images"
+            case DownloadStage.TRANSCODE:
+                return "transcode"
+            case DownloadStage.PERSIST:
+                return "persist"
+            case _ as unreachable:
+                assert_never(unreachable)
+
+    def max_workers(self) -> int:
+        match self:
+            case DownloadStage.METADATA:
+                workers = settings.get_metadata_workers()
+            case DownloadStage.MEDIA:
+                workers = settings.get_media_workers()
+            case DownloadStage.IMAGES:
+                workers = settings.get_image_workers()
+            case DownloadStage.TRANSCODE:
+                workers = settings.get_transcode_workers()
+            case DownloadStage.PERSIST:
+                workers = settings.get_persist_workers()
+            case _ as unreachable:
+                assert_never(unreachable)
+        return max(1, workers)
+
+    def downstream(self) -> tuple[DownloadStage, ...]:
+        """The stages that steps of this stage hand their song over to."""
+        match self:
+            case DownloadStage.METADATA:
+                return (DownloadStage.MEDIA, DownloadStage.IMAGES)
+            case DownloadStage.MEDIA:
+                return (DownloadStage.TRANSCODE, DownloadStage.PERSIST)
+            case DownloadStage.IMAGES | DownloadStage.TRANSCODE:
+                return (DownloadStage.PERSIST,)
+            case DownloadStage.PERSIST:
+                return ()
+            case _ as unreachable:
+                assert_never(unreachable)
+
+    @classmethod
+    def of(cls, step: DownloadStep) -> DownloadStage:
+        """The stage processing `step`."""
+        match step:
+            case DownloadStep.METADATA:
+                return DownloadStage.METADATA
+            case DownloadStep.AUDIO | DownloadStep.VIDEO:
+                return DownloadStage.MEDIA
+            case DownloadStep.COVER | DownloadStep.BACKGROUND:
+                return DownloadStage.IMAGES
+            case DownloadStep.TRANSCODE:
+                return DownloadStage.TRANSCODE
+            case DownloadStep.PERSIST:
+                return DownloadStage.PERSIST
+            case _ as unreachable:
+                assert_never(unreachable)
+
+
+@attrs.define
+class _Task:
+    """A step of a song download waiting for a worker."""
+
+    job: SongLoader
+    step: DownloadStep
+
+
+@attrs.define
+class _StageQueue:
+    """Tasks waiting for a download stage and the worker pool processing them.
+
+    The queue is bounded by only starting tasks of upstream stages while this queue
+    has capacity left.
+    """
+
+    stage: DownloadStage
+    pool: QtCore.QThreadPool
+    capacity: int
+    waiting: collections.deque[_Task] = attrs.field(factory=collections.deque)
+    running: int = 0
+    # sizes the pool if workers are adapted to the workload
+    controller: AdaptiveConcurrency | None = None
+
+    @classmethod
+    def new(cls, stage: DownloadStage) -> _StageQueue:
+        queue = cls(stage, QtCore.QThreadPool(), capacity=0)
+        queue.configure(stage.max_workers())
+        return queue
+
+    def configure(self, max_workers: int) -> None:
+        """Use `max_workers`, or adapt the number of workers up to `max_workers` if
+        enabled.
+        """
+        if settings.get_adaptive_workers():
+            self.controller = AdaptiveConcurrency.new(1, max_workers)
+            self.set_workers(self.controller.limit)
+        else:
+            self.controller = None
+            self.set_workers(max_workers)
+
+    def set_workers(self, workers: int) -> None:
+        self.pool.setMaxThreadCount(workers)
+        self.capacity = _QUEUE_CAPACITY_PER_WORKER * workers
+
+    def workers(self) -> int:
+        return self.pool.maxThreadCount()
+
+    def record(self, duration: float, failed: bool, backlog: bool) -> Adjustment | None:
+        """Record a completed task and adapt the number of workers if enabled."""
+        if not self.controller:
+            return None
+        if adjustment := self.controller.record(duration, failed, backlog):
+            self.set_workers(adjustment.new)
+        return adjustment
+
+    def has_capacity(self) -> bool:
+        return len(self.waiting) < self.capacity
+
+    def has_free_worker(self) -> bool:
+        return self.running < self.workers()
+
+    def can_start(self) -> bool:
+        return bool(self.waiting) and self.has_free_worker()
+
+
+# number of tasks that may wait for each worker of a stage
+_QUEUE_CAPACITY_PER_WORKER = 2
+
+
+class DownloadManager:
+    """Manager for concurrent song downloads, processed in a staged pipeline.
+
+    Requested downloads are stored in a persistent queue in the database, from which
+    songs are claimed once a metadata worker is available. Unfinished downloads are
+    restored on the next start.
+    """
+
+    _jobs: dict[SongId, SongLoader] = {}
+    # number of currently processed tasks per song
+    _running: collections.Counter[SongId] = collections.Counter()
+    # number of unclaimed songs in the persistent queue
+    _unclaimed = 0
+    _options: download_options.Options | None = None
+    # while paused, no tasks are started, so waiting ones don't occupy workers
+    _pause = False
+    _parked = 0
+    _quitting = False
+    # KB/s and hours used instead of the configured bandwidth limit
+    _bandwidth_limit: tuple[int, tuple[int, int]] | None = None
+    _queues: dict[DownloadStage, _StageQueue] = {}
+    _lock = threading.RLock()
+    # notified whenever a task has finished
+    _task_done = threading.Condition(_lock)
+
+    @classmethod
+    def download(cls, songs: Iterable[UsdbSong], priority: int = 0) -> None:
+        """Add songs to the download queue. Songs with a higher priority are
+        downloaded first.
+        """
+        songs = list(songs)
+        db.start_writer(utils.AppPaths.db)
+        cls._configure_limits()
+        queued = set(db.enqueue_downloads((s.song_id for s in songs), priority))
+        for song in songs:
+            if song.song_id not in queued:
+                song_logger(song.song_id).warning("Already downloading!")
+        with cls._lock:
+            cls._options = download_options.download_options()
+            cls._unclaimed += len(queued)
+        cls._dispatch()
+
+    @classmethod
+    def restore(cls) -> None:
+        """Resume the downloads that were queued when the app was last closed."""
+        db.start_writer(utils.AppPaths.db)
+        cls._configure_limits()
+        with db.transaction():
+            song_ids = db.reset_download_queue()
+            songs = [song for song_id in song_ids if (song := UsdbSong.get(song_id))]
+            for song in songs:
+                song.status = DownloadStatus.PENDING
+                song.upsert()
+        if not songs:
+            return
+        logger.info(f"Resuming {len(songs)} queued downloads.")
+        for song in songs:
+            events.SongChanged(song.song_id).post()
+        events.DownloadsRequested(len(songs)).post()
+        with cls._lock:
+            cls._options = download_options.download_options()
+            cls._unclaimed += len(songs)
+        cls._dispatch()
+
+    @classmethod
+    def abort(cls, songs: Iterable[SongId]) -> None:
+        song_ids = list(songs)
+        unclaimed = db.submit_write(
+            functools.partial(_dequeue_unclaimed, song_ids)
+        ).result()
+        with cls._lock:
+            cls._unclaimed = max(0, cls._unclaimed - len(unclaimed))
+            cls._task_done.notify_all()
+        for song_id in unclaimed:
+            song_logger(song_id).info("Download aborted by user request.")
+            events.SongChanged(song_id).post()
+            events.DownloadFinished(song_id).post()
+        for song_id in song_ids:
+            if not (job := cls._jobs.get(song_id)):
+                continue
+            if cls._take_waiting(job):
+                job.logger.info("Download aborted by user request.")
+                job.song.status = DownloadStatus.NONE
+                db.submit_write(functools.partial(_store_aborted, job.song)).result()
+                job.cleanup()
+                cls._remove_job(job.song_id)
+                with cls._lock:
+                    cls._task_done.notify_all()
+                events.SongChanged(job.song_id).post()
+                events.DownloadFinished(job.song_id).post()
+            else:
+                job.abort = True
+        # freed capacity is used by waiting and queued songs
+        cls._dispatch()
+        cls._update_parked()
+
+    @classmethod
+    def set_pause(cls, pause: bool) -> None:
+        """Stop or resume starting tasks. Tasks that are already running are
+        finished, subsequent ones are parked until downloads are resumed.
+        """
+        with cls._lock:
+            cls._pause = pause
+        cls._dispatch()
+        cls._update_parked()
+
+    @classmethod
+    def set_workers(cls, workers: int) -> None:
+        """Use the given number of workers for every stage instead of the configured
+        ones. If workers are adapted to the workload, it is the maximum.
+        """
+        with cls._lock:
+            for stage in DownloadStage:
+                cls._queue(stage).configure(max(1, workers))
+        cls._dispatch()
+        cls._post_workers()
+
+    @classmethod
+    def set_bandwidth_limit(cls, kbytes_per_sec: int, hours: tuple[int, int]) -> None:
+        """Use the given bandwidth limit instead of the configured one; see
+        `BandwidthLimiter.configure`.
+        """
+        cls._bandwidth_limit = (kbytes_per_sec, hours)
+        BandwidthLimiter.configure(kbytes_per_sec, hours)
+
+    @classmethod
+    def workers(cls) -> dict[DownloadStage, int]:
+        """The current number of workers per stage."""
+        with cls._lock:
+            return {stage: cls._queue(stage).workers() for stage in DownloadStage}
+
+    @classmethod
+    def wait(cls, timeout: float | None = None) -> bool:
+        """Block until all queued downloads have finished. Returns False if the
+        timeout expired first.
+        """
+        with cls._task_done:
+            return cls._task_done.wait_for(cls._is_idle, timeout)
+
+    @classmethod
+    def _is_idle(cls) -> bool:
+        return (
+            not cls._jobs
+            and not cls._unclaimed
+            and not any(q.running for q in cls._queues.values())
+        )
+
+    @classmethod
+    def parked_count(cls) -> int:
+        """The number of started downloads that are waiting for downloads to be
+        resumed.
+        """
+        with cls._lock:
+            if not cls._pause:
+                return 0
+            return sum(
+                1 for song_id in cls._waiting_song_ids() if not cls._running[song_id]
+            )
+
+    @classmethod
+    def quit(cls) -> None:
+        if cls._queues:
+            logger.debug(f"Quitting {len(cls._jobs)} downloads.")
+            with cls._lock:
+                cls._quitting = True
+                cls._pause = False
+                for job in cls._jobs.values():
+                    # keep them in the persistent queue, so they're resumed next time
+                    job.shutdown = job.abort = True
+            # aborted steps return immediately without scheduling further ones
+            cls._dispatch()
+            with cls._task_done:
+                cls._task_done.wait_for(
+                    lambda: not any(
+                        q.waiting or q.running for q in cls._queues.values()
+                    )
+                )
+            for queue in cls._queues.values():
+                queue.pool.waitForDone()
+        NormalizationPool.shutdown()
+        CookieCache.clear()
+        db.stop_writer()
+
+    @classmethod
+    def _queue(cls, stage: DownloadStage) -> _StageQueue:
+        with cls._lock:
+            if stage not in cls._queues:
+                cls._queues[stage] = _StageQueue.new(stage)
+            return cls._queues[stage]
+
+    @classmethod
+    def _dispatch(cls) -> None:
+        """Start waiting tasks on free workers, downstream stages first, as long as
+        the queues of the following stages are not full. Free metadata workers claim
+        new songs from the persistent queue.
+        """
+        with cls._lock:
+            if cls._pause:
+                return
+            for stage in reversed(DownloadStage):
+                queue = cls._queue(stage)
+                downstream = [cls._queue(s) for s in stage.downstream()]
+                while queue.can_start() and all(q.has_capacity() for q in downstream):
+                    task = queue.waiting.popleft()
+                    queue.running += 1
+                    cls._running[task.job.song_id] += 1
+                    queue.pool.start(functools.partial(cls._run_task, task))
+            queue = cls._queue(DownloadStage.METADATA)
+            downstream = [cls._queue(s) for s in DownloadStage.METADATA.downstream()]
+            while (
+                cls._unclaimed
+                and not cls._quitting
+                and queue.has_free_worker()
+                and all(q.has_capacity() for q in downstream)
+            ):
+                cls._unclaimed -= 1
+                queue.running += 1
+                queue.pool.start(cls._claim_and_run)
+
+    @classmethod
+    def _claim_and_run(cls) -> None:
+        """Claim the next song from the persistent queue and start its download."""
+        job = None
+        try:
+            db.ensure_connection(utils.AppPaths.db)
+            claimed = db.submit_write(db.claim_download).result()
+            if claimed and not (song := UsdbSong.get(claimed[0])):
+                db.submit_write(
+                    functools.partial(db.dequeue_download, claimed[0])
+                ).result()
+            if claimed and song:
+                assert cls._options
+                job = SongLoader(song, cls._options, attempts=claimed[1])
+        except Exception:  # pylint: disable=broad-except
+            logger.debug(traceback.format_exc())
+            logger.error("Failed to claim a download from the queue.")
+        with cls._lock:
+            if job is None:
+                cls._queue(DownloadStage.METADATA).running -= 1
+                cls._task_done.notify_all()
+            else:
+                if cls._quitting:
+                    job.shutdown = job.abort = True
+                cls._jobs[job.song_id] = job
+                cls._running[job.song_id] += 1
+        if job is None:
+            cls._dispatch()
+        else:
+            cls._run_task(_Task(job, DownloadStep.METADATA))
+
+    @classmethod
+    def _run_task(cls, task: _Task) -> None:
+        start = time.monotonic()
+        ready: list[DownloadStep] = []
+        failed = True
+        try:
+            ready = task.job.run_step(task.step)
+            failed = task.job.step_failed(task.step)
+        except Exception:  # pylint: disable=broad-except
+            task.job.logger.debug(traceback.format_exc())
+            task.job.logger.error(f"Unexpected error in {task.step.name} step.")
+        finally:
+            # must happen in any case, or waiting for downloads would never return
+            with cls._lock:
+                queue = cls._queue(DownloadStage.of(task.step))
+                queue.running -= 1
+                backlog = bool(queue.waiting) or (
+                    queue.stage == DownloadStage.METADATA and cls._unclaimed > 0
+                )
+                adjustment = queue.record(time.monotonic() - start, failed, backlog)
+                cls._running[task.job.song_id] -= 1
+                for step in ready:
+                    cls._queue(DownloadStage.of(step)).waiting.append(
+                        _Task(task.job, step)
+                    )
+                if task.job.is_finished():
+                    cls._remove_job(task.job.song_id)
+                    if task.job.retry:
+                        cls._unclaimed += 1
+                    if not cls._jobs and not cls._unclaimed:
+                        HostLimiter.log_stats()
+                        YtdlPool.log_stats()
+                        ytdl_info.log_stats()
+                        TransferProgress.log_stats()
+                cls._task_done.notify_all()
+        if adjustment:
+            logger.debug(f"Workers for {queue.stage} stage: {adjustment}")
+            cls._post_workers()
+        cls._dispatch()
+        cls._update_parked()
+
+    @classmethod
+    def _configure_limits(cls) -> None:
+        NormalizationPool.configure(settings.get_normalize_workers())
+        BandwidthLimiter.configure(
+            *(
+                cls._bandwidth_limit
+                or (
+                    settings.get_bandwidth_limit(),
+                    settings.get_bandwidth_limit_hours(),
+                )
+            )
+        )
+
+    @classmethod
+    def _post_workers(cls) -> None:
+        workers = {str(stage): count for stage, count in cls.workers().items()}
+        events.DownloadWorkersChanged(workers).post()
+
+    @classmethod
+    def _waiting_song_ids(cls) -> set[SongId]:
+        return {t.job.song_id for q in cls._queues.values() for t in q.waiting}
+
+    @classmethod
+    def _update_parked(cls) -> None:
+        with cls._lock:
+            if (parked := cls.parked_count()) == cls._parked:
+                return
+            cls._parked = parked
+        logger.debug(f"{parked} downloads parked.")
+        events.DownloadsParked(parked).post()
+
+    @classmethod
+    def _take_waiting(cls, job: SongLoader) -> bool:
+        """Remove all tasks of the job from the queues. False if one of its tasks is
+        currently being processed.
+        """
+        with cls._lock:
+            if cls._running[job.song_id]:
+                return False
+            for queue in cls._queues.values():
+                queue.waiting = collections.deque(
+                    t for t in queue.waiting if t.job is not job
+                )
+        return True
+
+    @classmethod
+    def _remove_job(cls, song_id: SongId) -> None:
+        with cls._lock:
+            if song_id in cls._jobs:
+                del cls._jobs[song_id]
+            del cls._running[song_id]
+        TransferProgress.finish(song_id)
+
+
+def _dequeue_unclaimed(song_ids: list[SongId]) -> list[SongId]:
+    """Remove songs that are not being downloaded yet from the persistent queue and
+    reset their status. Returns their ids.
+    """
+    unclaimed = db.dequeue_unclaimed_downloads(song_ids)
+    for song_id in unclaimed:
+        if song := UsdbSong.get(song_id):
+            song.status = DownloadStatus.NONE
+            song.upsert()
+    return unclaimed
+
+
+def _store_aborted(song: UsdbSong) -> None:
+    song.upsert()
+    db.dequeue_download(song.song_id)
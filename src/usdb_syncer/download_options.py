@@ -27,6 +27,8 @@ class AudioOptions:
     bitrate: settings.AudioBitrate
     normalize: bool
     embed_artwork: bool
+    # extract audio from the video if both are downloaded from the same resource
+    from_video: bool
 
     def ytdl_format(self) -> str:
         return self.format.ytdl_format()
@@ -42,13 +44,17 @@ class VideoOptions:
     max_fps: settings.VideoFps
     embed_artwork: bool
 
-    def ytdl_format(self) -> str:
+    def ytdl_format(self, with_audio: str | None = None) -> str:
+        """The yt-dlp format selector. If `with_audio` is given, the best matching
+        audio format is merged into the video.
+        """
         fmt = self.format.ytdl_format()
         width = f"[width<={self.max_resolution.width()}]"
         height = f"[height<={self.max_resolution.height()}]"
         fps = f"[fps<={self.max_fps.value}]"
+        audio = f"+({with_audio})" if with_audio else ""
         # fps filter always fails for some platforms, so skip it as a fallback
-        return f"{fmt}{width}{height}{fps}/{fmt}{width}{height}"
+        return f"{fmt}{width}{height}{fps}{audio}/{fmt}{width}{height}{audio}"
 
 
 @dataclass(frozen=True)
@@ -117,6 +123,7 @@ def _audio_options() -> AudioOptions | None:
         bitrate=settings.get_audio_bitrate(),
         normalize=settings.get_audio_normalize(),
         embed_artwork=settings.get_audio_embed_artwork(),
+        from_video=settings.get_audio_from_video(),
     )
 
 
@@ -45,6 +45,15 @@ class UsdbNotFoundError(UsdbError):
     """Raised when a requested USDB record is missing."""
 
 
+### downloads
+
+
+class DownloadRejectedError(UsdbSyncerError):
+    """Raised when a download is aborted because its content is too large or of an
+    unexpected type.
+    """
+
+
 ### txt parsing
 
 
@@ -53,6 +53,10 @@ class SubscriptableEvent(QtCore.QEvent):
         cast(list[Callable[[Self], Any]], cls._subscribers).remove(callback)
 
     def post(self) -> None:
+        if QtCore.QCoreApplication.instance() is None:
+            # no event loop when running headless; process on the calling thread
+            self.process()
+            return
         QtCore.QCoreApplication.postEvent(_EventProcessorManager.processor(), self)
 
     def process(self: Self) -> None:
@@ -126,6 +130,37 @@ class DownloadFinished(SubscriptableEvent):
     song_id: SongId
 
 
+@attrs.define(slots=False)
+class DownloadsParked(SubscriptableEvent):
+    """Sent when the number of started downloads waiting for downloads to be resumed
+    has changed.
+    """
+
+    count: int
+
+
+@attrs.define(slots=False)
+class DownloadProgress(SubscriptableEvent):
+    """Sent periodically while media is being downloaded."""
+
+    # bytes received and expected per song with running transfers
+    songs: dict[SongId, tuple[int, int]]
+    done: int
+    total: int
+    bytes_per_sec: float
+    # None if nothing is being received
+    eta_secs: float | None
+    # songs whose transfers have not progressed for a while
+    stalled: list[SongId]
+
+
+@attrs.define(slots=False)
+class DownloadWorkersChanged(SubscriptableEvent):
+    """Sent when the number of workers of a download stage has changed."""
+
+    workers: dict[str, int]
+
+
 # files
 
 
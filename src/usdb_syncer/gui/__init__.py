@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import cProfile
 import logging
+import multiprocessing
 import os
 import subprocess
 import sys
@@ -19,6 +20,7 @@ from usdb_syncer import (
     addons,
     constants,
     db,
+    download_manager,
     errors,
     events,
     logger,
@@ -28,6 +30,7 @@ from usdb_syncer import (
     usdb_song,
     utils,
 )
+from usdb_syncer.ytdl_pool import YtdlPool
 
 if TYPE_CHECKING:
     # only import from gui after pyside file generation
@@ -42,6 +45,8 @@ SCHEMA_ERROR_MESSAGE = (
 
 
 def main() -> None:
+    # audio is normalized in worker processes, which re-run this in a bundle
+    multiprocessing.freeze_support()
     sys.excepthook = _excepthook
     utils.AppPaths.make_dirs()
     if not utils.is_bundle():
@@ -108,6 +113,9 @@ def _load_main_window(mw: MainWindow) -> None:
         events.SavedSearchRestored(default_search.search).post()
         logging.info(f"Applied default search '{default_search.name}'.")
     mw.table.search_songs()
+    YtdlPool.warm_up()
+    if settings.ffmpeg_is_available():
+        download_manager.DownloadManager.restore()
     splash.showMessage("Song database successfully loaded.", color=Qt.GlobalColor.gray)
     mw.show()
     logging.info("Application successfully loaded.")
@@ -11,6 +11,7 @@ from PySide6.QtWidgets import QFileDialog, QLabel, QMainWindow
 
 from usdb_syncer import SongId, db, events, settings, song_routines, usdb_id_file
 from usdb_syncer.constants import Usdb
+from usdb_syncer.download_manager import DownloadManager
 from usdb_syncer.gui import gui_utils, progress, progress_bar
 from usdb_syncer.gui.about_dialog import AboutDialog
 from usdb_syncer.gui.comment_dialog import CommentDialog
@@ -25,7 +26,6 @@ from usdb_syncer.gui.usdb_login_dialog import UsdbLoginDialog
 from usdb_syncer.json_export import generate_song_json
 from usdb_syncer.logger import logger
 from usdb_syncer.pdf import generate_song_pdf
-from usdb_syncer.song_loader import DownloadManager
 from usdb_syncer.sync_meta import SyncMeta
 from usdb_syncer.usdb_song import UsdbSong
 from usdb_syncer.utils import AppPaths, open_file_explorer
@@ -70,6 +70,24 @@ class MainWindow(Ui_MainWindow, QMainWindow):
 
         self.table.connect_row_count_changed(on_count_changed)
 
+        self._workers_label = QLabel(self)
+        self._workers_label.setToolTip(
+            "Number of concurrent workers per download stage. Unless disabled, they "
+            "are adapted to the workload, up to the configured maximum."
+        )
+        self.statusbar.addPermanentWidget(self._workers_label)
+
+        def on_workers_changed(event: events.DownloadWorkersChanged) -> None:
+            workers = ", ".join(f"{s} {n}" for s, n in event.workers.items())
+            self._workers_label.setText(f"Workers: {workers}")
+
+        events.DownloadWorkersChanged.subscribe(on_workers_changed)
+        on_workers_changed(
+            events.DownloadWorkersChanged(
+                {str(s): n for s, n in DownloadManager.workers().items()}
+            )
+        )
+
     def _setup_log(self) -> None:
         self.plainTextEdit.setReadOnly(True)
         self._debugs: list[tuple[str, float]] = []
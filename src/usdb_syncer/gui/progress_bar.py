@@ -1,11 +1,12 @@
 """Controller for a progress bar to show the numbers of requested and finished
-downloads.
+downloads, and the progress of running media transfers.
 """
 
 import attrs
 from PySide6 import QtWidgets
 
 from usdb_syncer import events
+from usdb_syncer.utils import format_bytes
 
 
 @attrs.define
@@ -16,10 +17,14 @@ class ProgressBar:
     _label: QtWidgets.QLabel
     _running: int = 0
     _finished: int = 0
+    _parked: int = 0
+    _progress: events.DownloadProgress | None = None
 
     def __attrs_post_init__(self) -> None:
         events.DownloadsRequested.subscribe(self._on_downloads_requested)
         events.DownloadFinished.subscribe(self._on_download_finished)
+        events.DownloadsParked.subscribe(self._on_downloads_parked)
+        events.DownloadProgress.subscribe(self._on_download_progress)
 
     def _on_downloads_requested(self, event: events.DownloadsRequested) -> None:
         if self._running == self._finished:
@@ -32,6 +37,36 @@ class ProgressBar:
         self._finished += 1
         self._update()
 
+    def _on_downloads_parked(self, event: events.DownloadsParked) -> None:
+        self._parked = event.count
+        self._update()
+
+    def _on_download_progress(self, event: events.DownloadProgress) -> None:
+        self._progress = event if event.songs else None
+        self._update()
+
     def _update(self) -> None:
-        self._label.setText(f"{self._finished}/{self._running}")
-        self._bar.setValue(int((self._finished + 1) / (self._running + 1) * 100))
+        parked = f" ({self._parked} paused)" if self._parked else ""
+        self._label.setText(f"{self._finished}/{self._running}{parked}")
+        finished = float(self._finished)
+        if progress := self._progress:
+            # running songs count by the fraction of their media received
+            finished += sum(
+                done / total for done, total in progress.songs.values() if total
+            )
+            self._label.setText(f"{self._label.text()}{_transfer_text(progress)}")
+        finished = min(finished, self._running)
+        self._bar.setValue(int((finished + 1) / (self._running + 1) * 100))
+
+
+def _transfer_text(progress: events.DownloadProgress) -> str:
+    text = (
+        f" | {format_bytes(progress.done)}/{format_bytes(progress.total)}"
+        f" at {format_bytes(int(progress.bytes_per_sec))}/s"
+    )
+    if progress.eta_secs is not None:
+        minutes, secs = divmod(int(progress.eta_secs), 60)
+        text += f", {minutes}:{secs:02} left"
+    if progress.stalled:
+        text += f" ({len(progress.stalled)} stalled)"
+    return text
@@ -9,7 +9,9 @@ from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import QDialog, QFileDialog, QWidget
 
 from usdb_syncer import SongId, path_template, settings
+from usdb_syncer.bandwidth import BandwidthLimiter
 from usdb_syncer.gui.forms.SettingsDialog import Ui_Dialog
+from usdb_syncer.host_limiter import HostLimiter
 from usdb_syncer.path_template import PathTemplate
 from usdb_syncer.usdb_scraper import SessionManager
 from usdb_syncer.usdb_song import UsdbSong
@@ -45,7 +47,6 @@ class SettingsDialog(Ui_Dialog, QDialog):
         self._browser = self.comboBox_browser.currentData()
         self.label_video_embed_artwork.setVisible(False)
         self.checkBox_video_embed_artwork.setVisible(False)
-        self.groupBox_reencode_video.setVisible(False)
         if sys.platform != "win32":
             self.groupBox_vocaluxe.setVisible(False)
         self.pushButton_browse_karedi.clicked.connect(
@@ -171,6 +172,7 @@ class SettingsDialog(Ui_Dialog, QDialog):
         )
         self.checkBox_audio_normalize.setChecked(settings.get_audio_normalize())
         self.checkBox_audio_embed_artwork.setChecked(settings.get_audio_embed_artwork())
+        self.checkBox_audio_from_video.setChecked(settings.get_audio_from_video())
         self.groupBox_video.setChecked(settings.get_video())
         self.comboBox_videocontainer.setCurrentIndex(
             self.comboBox_videocontainer.findData(settings.get_video_format())
@@ -206,6 +208,19 @@ class SettingsDialog(Ui_Dialog, QDialog):
             path := settings.get_app_path(settings.SupportedApps.YASS_RELOADED)
         ) is not None:
             self.lineEdit_path_yass_reloaded.setText(str(path))
+        self.spinBox_bandwidth_limit.setValue(settings.get_bandwidth_limit())
+        start, end = settings.get_bandwidth_limit_hours()
+        self.spinBox_bandwidth_start.setValue(start)
+        self.spinBox_bandwidth_end.setValue(end)
+        self.spinBox_image_max_size.setValue(settings.get_image_max_size())
+        self.spinBox_media_cache_budget.setValue(settings.get_media_cache_budget())
+        host_limits = settings.get_host_limits()
+        self.plainTextEdit_host_limits.setPlainText(
+            "\n".join(
+                f"{host} {rate:g} {burst} {connections}"
+                for host, (rate, burst, connections) in host_limits.items()
+            )
+        )
 
     def _setup_path_template(self) -> None:
         self.edit_path_template.textChanged.connect(self._on_path_template_changed)
@@ -260,6 +275,7 @@ class SettingsDialog(Ui_Dialog, QDialog):
         settings.set_audio_bitrate(self.comboBox_audio_bitrate.currentData())
         settings.set_audio_normalize(self.checkBox_audio_normalize.isChecked())
         settings.set_audio_embed_artwork(self.checkBox_audio_embed_artwork.isChecked())
+        settings.set_audio_from_video(self.checkBox_audio_from_video.isChecked())
         settings.set_video(self.groupBox_video.isChecked())
         settings.set_video_format(self.comboBox_videocontainer.currentData())
         settings.set_video_format_new(self.comboBox_videoencoder.currentData())
@@ -276,6 +292,17 @@ class SettingsDialog(Ui_Dialog, QDialog):
                 self, "Invalid setting", "Please provide a valid path template!"
             )
             return False
+        if (host_limits := _parse_host_limits(self.plainTextEdit_host_limits)) is None:
+            QtWidgets.QMessageBox.warning(
+                self,
+                "Invalid setting",
+                "Please provide host limits as a host followed by three positive "
+                "numbers per line!",
+            )
+            return False
+        if host_limits != settings.get_host_limits():
+            settings.set_host_limits(host_limits)
+            HostLimiter.reset()
         settings.set_app_path(
             settings.SupportedApps.KAREDI, self.lineEdit_path_karedi.text()
         )
@@ -296,4 +323,33 @@ class SettingsDialog(Ui_Dialog, QDialog):
             settings.SupportedApps.YASS_RELOADED,
             self.lineEdit_path_yass_reloaded.text(),
         )
+        settings.set_bandwidth_limit(self.spinBox_bandwidth_limit.value())
+        settings.set_bandwidth_limit_hours(
+            self.spinBox_bandwidth_start.value(), self.spinBox_bandwidth_end.value()
+        )
+        # also applies to running downloads
+        BandwidthLimiter.configure(
+            settings.get_bandwidth_limit(), settings.get_bandwidth_limit_hours()
+        )
+        settings.set_image_max_size(self.spinBox_image_max_size.value())
+        settings.set_media_cache_budget(self.spinBox_media_cache_budget.value())
         return True
+
+
+def _parse_host_limits(
+    edit: QtWidgets.QPlainTextEdit,
+) -> dict[str, tuple[float, int, int]] | None:
+    """The limits in `edit` or None if they are invalid."""
+    limits = {}
+    for line in edit.toPlainText().splitlines():
+        if not (parts := line.split()):
+            continue
+        try:
+            host, rate, burst, connections = parts
+            limit = (float(rate), int(burst), int(connections))
+        except ValueError:
+            return None
+        if min(limit) <= 0:
+            return None
+        limits[host.lower().removeprefix("www.")] = limit
+    return limits
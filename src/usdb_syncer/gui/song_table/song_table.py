@@ -9,15 +9,23 @@ import send2trash
 from PySide6 import QtCore, QtGui, QtMultimedia, QtWidgets
 from PySide6.QtCore import QItemSelectionModel, Qt
 
-from usdb_syncer import SongId, db, events, media_player, settings, sync_meta
+from usdb_syncer import (
+    SongId,
+    db,
+    events,
+    media_player,
+    settings,
+    song_routines,
+    sync_meta,
+)
+from usdb_syncer.download_manager import DownloadManager
 from usdb_syncer.gui import ffmpeg_dialog
 from usdb_syncer.gui.custom_data_dialog import CustomDataDialog
 from usdb_syncer.gui.progress import run_with_progress
 from usdb_syncer.gui.song_table.column import Column
 from usdb_syncer.gui.song_table.table_model import TableModel
 from usdb_syncer.logger import song_logger
-from usdb_syncer.song_loader import DownloadManager
-from usdb_syncer.usdb_song import DownloadStatus, UsdbSong
+from usdb_syncer.usdb_song import UsdbSong
 
 if TYPE_CHECKING:
     from usdb_syncer.gui.mw import MainWindow
@@ -105,22 +113,7 @@ class SongTable:
         )
 
     def _download_inner(self, rows: Iterable[int]) -> None:
-        to_download: list[UsdbSong] = []
-        for song_id in self._model.ids_for_rows(rows):
-            song = UsdbSong.get(song_id)
-            assert song
-            if song.sync_meta and song.sync_meta.pinned:
-                song_logger(song.song_id).info("Not downloading song as it is pinned.")
-                continue
-            if song.status.can_be_downloaded():
-                song.status = DownloadStatus.PENDING
-                with db.transaction():
-                    song.upsert()
-                events.SongChanged(song.song_id).post()
-                to_download.append(song)
-        if to_download:
-            events.DownloadsRequested(len(to_download)).post()
-            DownloadManager.download(to_download)
+        song_routines.download_songs(self._model.ids_for_rows(rows))
 
     def abort_selected_downloads(self) -> None:
         ids = self._model.ids_for_rows(self._selected_rows())
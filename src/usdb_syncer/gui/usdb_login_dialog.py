@@ -5,6 +5,7 @@ from PySide6.QtWidgets import QDialog, QMessageBox, QWidget
 
 from usdb_syncer import settings
 from usdb_syncer.constants import Usdb
+from usdb_syncer.cookie_cache import CookieCache
 from usdb_syncer.gui.forms.UsdbLoginDialog import Ui_Dialog
 from usdb_syncer.usdb_scraper import (
     SessionManager,
@@ -48,8 +49,15 @@ class UsdbLoginDialog(Ui_Dialog, QDialog):
         super().accept()
 
     def _on_check_login(self) -> None:
-        session = new_session_with_cookies(self.combobox_browser.currentData())
-        if user := get_logged_in_usdb_user(session):
+        browser = self.combobox_browser.currentData()
+        session = new_session_with_cookies(browser)
+        user = get_logged_in_usdb_user(session)
+        if not user and browser is not settings.Browser.NONE:
+            # the user may have logged in with the browser after the cookies were read
+            CookieCache.invalidate()
+            session = new_session_with_cookies(browser)
+            user = get_logged_in_usdb_user(session)
+        if user:
             message = f"Success! Existing session found with user '{user}'."
         elif (user := self.line_edit_username.text()) and (
             password := self.line_edit_password.text()
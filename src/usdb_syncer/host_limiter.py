@@ -0,0 +1,264 @@
+"""Per-host concurrency and rate limiting for outbound requests.
+
+All requests to a remote host should be wrapped in `HostLimiter.limit`, so bulk
+downloads can run many workers without flooding a single host. Requests failing in
+a way that suggests the host is overloaded are counted per thread, so workers can
+back off.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import threading
+import time
+import urllib.parse
+from typing import Iterator
+
+import attrs
+import requests
+from yt_dlp.networking.exceptions import (
+    CertificateVerifyError,
+    HTTPError,
+    TransportError,
+)
+from yt_dlp.utils import DownloadError, ExtractorError
+
+from usdb_syncer import settings
+from usdb_syncer.constants import Usdb
+from usdb_syncer.logger import logger
+
+# waiting longer than this for a single request is logged
+_LOG_WAIT_THRESHOLD_SECS = 1.0
+# replies suggesting that the host is overloaded or temporarily failing
+TRANSIENT_STATUS_CODES = frozenset((408, 429, 500, 502, 503, 504))
+
+
+@attrs.define(frozen=True)
+class HostLimits:
+    """Limits for requests to a single host."""
+
+    # sustained requests per second
+    rate: float
+    # number of requests that may be sent in quick succession
+    burst: int
+    # maximum number of concurrent connections
+    connections: int
+
+
+DEFAULT_LIMITS = HostLimits(rate=4.0, burst=8, connections=4)
+BUILTIN_LIMITS = {
+    Usdb.DOMAIN: HostLimits(rate=2.0, burst=4, connections=2),
+    "youtube.com": HostLimits(rate=1.0, burst=4, connections=4),
+    "youtu.be": HostLimits(rate=1.0, burst=4, connections=4),
+    "vimeo.com": HostLimits(rate=1.0, burst=2, connections=2),
+    "fanart.tv": HostLimits(rate=4.0, burst=8, connections=4),
+}
+
+
+@attrs.define
+class HostStats:
+    """Counters about requests to a single host."""
+
+    requests: int = 0
+    # total and maximum seconds requests waited for a slot
+    waited: float = 0.0
+    max_wait: float = 0.0
+    transient_failures: int = 0
+
+    def record(self, waited: float) -> None:
+        self.requests += 1
+        self.waited += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def __str__(self) -> str:
+        average = self.waited / self.requests if self.requests else 0.0
+        return (
+            f"{self.requests} requests, waited {self.waited:.1f}s in total "
+            f"(avg {average:.2f}s, max {self.max_wait:.2f}s), "
+            f"{self.transient_failures} failed transiently"
+        )
+
+
+class TokenBucket:
+    """Thread-safe token bucket."""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self._rate = max(rate, 0.001)
+        self._capacity = float(max(capacity, 1))
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> None:
+        """Take `tokens`, sleeping until they are available.
+
+        Tokens are reserved immediately, so concurrent callers are served in order.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._capacity, self._tokens + (now - self._updated) * self._rate
+            )
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class _Host:
+    """Limiter state for a single host."""
+
+    def __init__(self, key: str, limits: HostLimits) -> None:
+        self.key = key
+        self.limits = limits
+        self.bucket = TokenBucket(limits.rate, limits.burst)
+        self.connections = threading.BoundedSemaphore(max(limits.connections, 1))
+        self.stats = HostStats()
+        self.lock = threading.Lock()
+
+
+class HostLimiter:
+    """Singleton limiting requests per host."""
+
+    _hosts: dict[str, _Host] = {}
+    _custom_limits: dict[str, HostLimits] | None = None
+    _local = threading.local()
+    _lock = threading.Lock()
+
+    @classmethod
+    @contextlib.contextmanager
+    def limit(cls, url: str) -> Iterator[None]:
+        """Block until a request to the host of `url` may be sent, and hold one of the
+        host's connection slots until the context is left.
+        """
+        host = cls._host(cls.host_key(url))
+        start = time.monotonic()
+        with host.connections:
+            host.bucket.acquire()
+            waited = time.monotonic() - start
+            with host.lock:
+                host.stats.record(waited)
+            if waited > _LOG_WAIT_THRESHOLD_SECS:
+                logger.debug(f"Request to {host.key} waited {waited:.1f}s for a slot.")
+            try:
+                yield
+            except Exception as error:
+                if is_transient(error):
+                    cls._record_transient_failure(host)
+                raise
+
+    @classmethod
+    def record_status(cls, url: str, status_code: int) -> None:
+        """Count the reply to a request to `url` as a transient failure if its
+        status shows the host is overloaded. Errors raised within `limit` are
+        counted automatically.
+        """
+        if status_code in TRANSIENT_STATUS_CODES:
+            cls._record_transient_failure(cls._host(cls.host_key(url)))
+
+    @classmethod
+    def transient_failures(cls) -> int:
+        """The number of requests on the current thread that failed transiently so
+        far, e.g. with a timeout or because the host was overloaded.
+        """
+        return getattr(cls._local, "transient_failures", 0)
+
+    @classmethod
+    def stats(cls) -> dict[str, HostStats]:
+        with cls._lock:
+            hosts = list(cls._hosts.values())
+        stats = {}
+        for host in hosts:
+            with host.lock:
+                stats[host.key] = attrs.evolve(host.stats)
+        return stats
+
+    @classmethod
+    def log_stats(cls) -> None:
+        for key, stats in cls.stats().items():
+            logger.debug(f"Requests to {key}: {stats}")
+
+    @classmethod
+    def reset(cls) -> None:
+        """Drop all state, so changed limits are applied to new requests."""
+        with cls._lock:
+            cls._hosts = {}
+            cls._custom_limits = None
+
+    @classmethod
+    def host_key(cls, url: str) -> str:
+        """The key limits are tracked under, i.e. the configured host `url` belongs
+        to, or its hostname if there is none.
+        """
+        if "://" not in url:
+            url = f"https://{url}"
+        host = (urllib.parse.urlsplit(url).hostname or "").removeprefix("www.")
+        for key in (*cls._custom(), *BUILTIN_LIMITS):
+            if host == key or host.endswith(f".{key}"):
+                return key
+        return host
+
+    @classmethod
+    def _custom(cls) -> dict[str, HostLimits]:
+        if cls._custom_limits is None:
+            cls._custom_limits = {
+                host: HostLimits(*limits)
+                for host, limits in settings.get_host_limits().items()
+            }
+        return cls._custom_limits
+
+    @classmethod
+    def _record_transient_failure(cls, host: _Host) -> None:
+        cls._local.transient_failures = cls.transient_failures() + 1
+        with host.lock:
+            host.stats.transient_failures += 1
+
+    @classmethod
+    def _host(cls, key: str) -> _Host:
+        limits = cls._custom().get(key) or BUILTIN_LIMITS.get(key, DEFAULT_LIMITS)
+        with cls._lock:
+            if (host := cls._hosts.get(key)) is None:
+                host = cls._hosts[key] = _Host(key, limits)
+            return host
+
+
+def is_transient(error: BaseException) -> bool:
+    """True if `error`, or an error it was caused by, is a timeout, a failure to
+    connect or a reply showing the host is overloaded, so the request may succeed
+    later.
+    """
+    for cause in _causes(error):
+        match cause:
+            case requests.HTTPError() if cause.response is not None:
+                return cause.response.status_code in TRANSIENT_STATUS_CODES
+            case HTTPError():
+                return cause.status in TRANSIENT_STATUS_CODES
+            case CertificateVerifyError() | requests.exceptions.SSLError():
+                return False
+            case (
+                requests.Timeout()
+                | requests.ConnectionError()
+                | TransportError()
+                | TimeoutError()
+                | ConnectionError()
+            ):
+                return True
+    return False
+
+
+def _causes(error: BaseException) -> Iterator[BaseException]:
+    """`error` and the chain of errors it was caused by, including those yt-dlp
+    wraps.
+    """
+    seen: set[int] = set()
+    current: BaseException | None = error
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        yield current
+        if isinstance(current, ExtractorError) and current.cause:
+            current = current.cause
+        elif isinstance(current, (DownloadError, ExtractorError)) and current.exc_info:
+            current = current.exc_info[1]
+        else:
+            current = current.__cause__ or current.__context__
@@ -0,0 +1,192 @@
+"""Cache for HTTP responses validated with conditional requests.
+
+Bodies are stored in the media cache, which enforces its disk budget, and their
+validators (ETag, Last-Modified) and freshness in the database. Cached responses
+are served without a request while fresh, and revalidated otherwise, so unchanged
+resources cost a 304 instead of a full download.
+"""
+
+from __future__ import annotations
+
+import functools
+import re
+import threading
+import time
+from typing import Any, Callable, Mapping
+
+import attrs
+import requests
+from requests.adapters import HTTPAdapter
+
+from usdb_syncer import db, errors
+from usdb_syncer.bandwidth import BandwidthLimiter
+from usdb_syncer.host_limiter import HostLimiter
+from usdb_syncer.media_cache import MediaCache
+
+# connections kept open per host, shared by all workers
+_POOL_SIZE = 16
+# responses without validators or explicit freshness are reused for this long
+_HEURISTIC_MAX_AGE_SECS = 7 * 24 * 60 * 60
+# bodies are read in chunks of this many bytes
+_CHUNK_SIZE = 64 * 1024
+# number of leading bytes needed to tell the type of content
+_SNIFF_BYTES = 262
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+@attrs.define
+class CachedResponse:
+    """A response, which may have been served from the cache."""
+
+    url: str
+    status_code: int
+    content: bytes
+    headers: Mapping[str, str] = attrs.field(factory=dict)
+    from_cache: bool = False
+
+
+class HttpSession:
+    """Singleton holding the session shared by all workers, so connections are
+    reused across downloads.
+    """
+
+    _session: requests.Session | None = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def session(cls) -> requests.Session:
+        with cls._lock:
+            if cls._session is None:
+                cls._session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=_POOL_SIZE, pool_maxsize=_POOL_SIZE
+                )
+                cls._session.mount("https://", adapter)
+                cls._session.mount("http://", adapter)
+            return cls._session
+
+    @classmethod
+    def close(cls) -> None:
+        with cls._lock:
+            if cls._session:
+                cls._session.close()
+                cls._session = None
+
+
+def get(
+    url: str,
+    headers: dict[str, str],
+    timeout: float,
+    *,
+    max_bytes: int | None = None,
+    sniff: Callable[[bytes], bool] | None = None,
+    on_progress: Callable[[int, int | None], Any] | None = None,
+) -> CachedResponse:
+    """GET `url`, serving it from the cache if it is fresh or not modified.
+    Requests, but not cache lookups, are subject to the `HostLimiter`.
+
+    Successful responses are not stored automatically; see `store`.
+
+    Parameters:
+        max_bytes: abort if the body is larger
+        sniff: abort unless this returns True for the first bytes of the body
+        on_progress: called with the bytes received so far and the expected total
+
+    Raises:
+        DownloadRejectedError: if the download was aborted
+    """
+    key = MediaCache.key(url)
+    validator = db.get_http_validator(url) if MediaCache.contains(key) else None
+    if validator:
+        etag, last_modified, max_age, validated_at = validator
+        if time.time() - validated_at < max_age and (data := MediaCache.read(key)):
+            return CachedResponse(url, 200, data, from_cache=True)
+        headers = dict(headers)
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+    with (
+        HostLimiter.limit(url),
+        HttpSession.session().get(
+            url, allow_redirects=True, headers=headers, timeout=timeout, stream=True
+        ) as reply,
+    ):
+        HostLimiter.record_status(url, reply.status_code)
+        if reply.status_code == 304 and validator and (data := MediaCache.read(key)):
+            # validators may be omitted if unchanged
+            _store_validator(
+                url,
+                reply.headers.get("ETag", validator[0]),
+                reply.headers.get("Last-Modified", validator[1]),
+                reply.headers.get("Cache-Control", ""),
+            )
+            return CachedResponse(url, 200, data, reply.headers, from_cache=True)
+        # the body of errors is not needed
+        content = _read(reply, max_bytes, sniff, on_progress) if reply.ok else b""
+        return CachedResponse(reply.url, reply.status_code, content, reply.headers)
+
+
+def _read(
+    reply: requests.Response,
+    max_bytes: int | None,
+    sniff: Callable[[bytes], bool] | None,
+    on_progress: Callable[[int, int | None], Any] | None = None,
+) -> bytes:
+    """Read the body of `reply` in chunks, aborting as soon as it is rejected."""
+    length = reply.headers.get("Content-Length", "")
+    if max_bytes and length.isdigit() and int(length) > max_bytes:
+        raise errors.DownloadRejectedError(
+            f"size of {int(length)} bytes exceeds the limit of {max_bytes}"
+        )
+    total = int(length) if length.isdigit() else None
+    data = bytearray()
+    sniffed = sniff is None
+    for chunk in reply.iter_content(_CHUNK_SIZE):
+        BandwidthLimiter.consume(len(chunk))
+        data += chunk
+        if on_progress:
+            on_progress(len(data), total)
+        if max_bytes and len(data) > max_bytes:
+            raise errors.DownloadRejectedError(
+                f"size exceeds the limit of {max_bytes} bytes"
+            )
+        if not sniffed and len(data) >= _SNIFF_BYTES:
+            if sniff and not sniff(bytes(data[:_SNIFF_BYTES])):
+                raise errors.DownloadRejectedError("unexpected type of content")
+            sniffed = True
+    if not sniffed and sniff and not sniff(bytes(data)):
+        raise errors.DownloadRejectedError("unexpected type of content")
+    return bytes(data)
+
+
+def store(url: str, response: CachedResponse, ext: str) -> None:
+    """Cache the successful response for `url` as a file with extension `ext`,
+    unless the server forbids it.
+    """
+    cache_control = response.headers.get("Cache-Control", "")
+    if response.from_cache or "no-store" in cache_control:
+        return
+    MediaCache.write(MediaCache.key(url), response.content, ext)
+    _store_validator(
+        url,
+        response.headers.get("ETag"),
+        response.headers.get("Last-Modified"),
+        cache_control,
+    )
+
+
+def _store_validator(
+    url: str, etag: str | None, last_modified: str | None, cache_control: str
+) -> None:
+    if match := _MAX_AGE.search(cache_control):
+        max_age = int(match.group(1))
+    elif "no-cache" in cache_control or etag or last_modified:
+        max_age = 0
+    else:
+        max_age = _HEURISTIC_MAX_AGE_SECS
+    db.submit_write(
+        functools.partial(
+            db.upsert_http_validator, url, etag, last_modified, max_age, time.time()
+        )
+    )
@@ -0,0 +1,199 @@
+"""EBU R128 loudness normalization of audio files, run in a pool of worker processes.
+
+Normalization takes two passes: the first measures the loudness of the input and
+the second applies a linear gain. The measurements only depend on the source, so
+they are returned to be stored, and passing them in again skips the first pass.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import attrs
+from ffmpeg_normalize import FFmpegNormalize
+
+# targets of the normalization
+_TARGET_LEVEL = -23.0
+_LOUDNESS_RANGE_TARGET = 7.0
+_TRUE_PEAK = -2.0
+
+
+@attrs.frozen
+class LoudnessStats:
+    """Loudness of an audio source as measured by ffmpeg's loudnorm filter."""
+
+    input_i: float
+    input_tp: float
+    input_lra: float
+    input_thresh: float
+    target_offset: float
+
+    @classmethod
+    def from_ebu(cls, stats: dict[str, Any]) -> LoudnessStats:
+        return cls(
+            input_i=float(stats["input_i"]),
+            input_tp=float(stats["input_tp"]),
+            input_lra=float(stats["input_lra"]),
+            input_thresh=float(stats["input_thresh"]),
+            target_offset=float(stats["target_offset"]),
+        )
+
+    def loudnorm_filter(self) -> str:
+        """The filter applying the linear gain for these measurements."""
+        # like keep_lra_above_loudness_range_target, so the gain can be linear
+        lra = max(_LOUDNESS_RANGE_TARGET, min(self.input_lra, 50.0))
+        opts = {
+            "i": _TARGET_LEVEL,
+            "lra": lra,
+            "tp": _TRUE_PEAK,
+            "offset": _clamp(self.target_offset, -99, 99),
+            "measured_i": _clamp(self.input_i, -99, 0),
+            "measured_lra": _clamp(self.input_lra, 0, 99),
+            "measured_tp": _clamp(self.input_tp, -99, 99),
+            "measured_thresh": _clamp(self.input_thresh, -99, 0),
+            "linear": "true",
+        }
+        return "loudnorm=" + ":".join(f"{key}={value}" for key, value in opts.items())
+
+
+def _clamp(value: float, lower: float, upper: float) -> float:
+    return min(max(value, lower), upper)
+
+
+class NormalizationPool:
+    """Singleton managing the worker processes normalizing audio."""
+
+    _executor: ProcessPoolExecutor | None = None
+    _workers = 1
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, workers: int) -> None:
+        """Set the number of worker processes, taking effect once the pool is idle."""
+        with cls._lock:
+            if workers == cls._workers:
+                return
+            cls._workers = workers
+            if cls._executor:
+                cls._executor.shutdown(wait=False)
+                cls._executor = None
+
+    @classmethod
+    def normalize(
+        cls,
+        source: str,
+        target: str,
+        codec: str,
+        bitrate: int,
+        stats: LoudnessStats | None,
+    ) -> LoudnessStats | None:
+        """Normalize `source` and write the result to `target`, blocking until done.
+
+        Returns:
+            the measurements of the source if they were not passed in
+        """
+        with cls._lock:
+            if cls._executor is None:
+                # forking a process with running Qt threads is not safe
+                context = multiprocessing.get_context("spawn")
+                cls._executor = ProcessPoolExecutor(cls._workers, mp_context=context)
+            future = cls._executor.submit(
+                normalize_audio, source, target, codec, bitrate, stats
+            )
+        return future.result()
+
+    @classmethod
+    def shutdown(cls) -> None:
+        with cls._lock:
+            if cls._executor:
+                cls._executor.shutdown(cancel_futures=True)
+                cls._executor = None
+
+
+def normalize_audio(
+    source: str, target: str, codec: str, bitrate: int, stats: LoudnessStats | None
+) -> LoudnessStats | None:
+    """Normalize `source` to `target` in a single pass with known measurements, or
+    in two passes otherwise, returning the measurements in this case.
+    """
+    if stats:
+        try:
+            _apply_gain(source, target, codec, bitrate, stats)
+        except subprocess.CalledProcessError:
+            # e.g. a different source stream than the measured one; measure again
+            pass
+        else:
+            return None
+    normalizer = FFmpegNormalize(
+        normalization_type="ebu",
+        target_level=_TARGET_LEVEL,
+        print_stats=False,
+        keep_lra_above_loudness_range_target=True,  # needed for linear normalization
+        loudness_range_target=_LOUDNESS_RANGE_TARGET,
+        true_peak=_TRUE_PEAK,
+        dynamic=False,
+        audio_codec=codec,
+        audio_bitrate=bitrate,
+        sample_rate=None,
+        debug=False,
+        progress=False,
+        # input may be a video when the audio is extracted from it
+        video_disable=True,
+    )
+    normalizer.add_media_file(source, target)
+    normalizer.run_normalization()
+    for media_file in normalizer.media_files:
+        for stream_stats in media_file.get_stats():
+            # named "ebu" in older versions of ffmpeg-normalize
+            ebu: Any = stream_stats.get("ebu_pass1") or stream_stats.get("ebu")
+            if ebu:
+                return LoudnessStats.from_ebu(ebu)
+    return None
+
+
+def _apply_gain(
+    source: str, target: str, codec: str, bitrate: int, stats: LoudnessStats
+) -> None:
+    # source and target may be the same file
+    path = Path(target)
+    temp = path.with_name(f"{path.stem}.normalized{path.suffix}")
+    try:
+        _run_ffmpeg(source, str(temp), codec, bitrate, stats)
+        os.replace(temp, path)
+    finally:
+        temp.unlink(missing_ok=True)
+
+
+def _run_ffmpeg(
+    source: str, target: str, codec: str, bitrate: int, stats: LoudnessStats
+) -> None:
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-i",
+            source,
+            "-map",
+            "0:a:0",
+            "-vn",
+            "-sn",
+            "-af",
+            stats.loudnorm_filter(),
+            "-c:a",
+            codec,
+            "-b:a",
+            str(bitrate),
+            target,
+        ],
+        check=True,
+        capture_output=True,
+    )
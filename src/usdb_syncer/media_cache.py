@@ -0,0 +1,176 @@
+"""Content-addressed cache of downloaded media, shared across songs and downloads.
+
+Entries are keyed by the resource and all options affecting the resulting file, and
+evicted in least recently used order once the configured disk budget is exceeded.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from usdb_syncer import settings, utils
+from usdb_syncer.logger import logger
+
+# suffix of files that are still being written
+_PARTIAL_SUFFIX = ".part"
+
+
+class MediaCache:
+    """Singleton managing the media cache directory."""
+
+    # total size of all entries in bytes; None until first computed
+    _size: int | None = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def key(cls, resource: str, *options: object) -> str:
+        """The cache key for `resource` downloaded with the given options."""
+        return hashlib.sha256(repr((resource, *options)).encode()).hexdigest()
+
+    @classmethod
+    def get(cls, key: str, path_stem: Path) -> str | None:
+        """Copy the entry for `key` to `path_stem` with the extension of the entry.
+
+        Entries are copied rather than hardlinked, because files are modified in
+        place afterwards, e.g. when writing tags.
+
+        Returns:
+            the extension of the copied file, or None if there is no entry
+        """
+        if not (entry := cls._find(key)):
+            return None
+        ext = entry.suffix[1:]
+        try:
+            shutil.copyfile(entry, path_stem.with_name(f"{path_stem.name}.{ext}"))
+            os.utime(entry)
+        except OSError as error:
+            logger.debug(f"Failed to read media cache entry '{entry}': {error}")
+            return None
+        return ext
+
+    @classmethod
+    def read(cls, key: str) -> bytes | None:
+        """The contents of the entry for `key`, if there is one."""
+        if not (entry := cls._find(key)):
+            return None
+        try:
+            data = entry.read_bytes()
+            os.utime(entry)
+        except OSError as error:
+            logger.debug(f"Failed to read media cache entry '{entry}': {error}")
+            return None
+        return data
+
+    @classmethod
+    def contains(cls, key: str) -> bool:
+        """True if there is an entry for `key`."""
+        return cls._find(key) is not None
+
+    @classmethod
+    def put(cls, key: str, path: Path) -> None:
+        """Store a copy of the file at `path` under `key`."""
+        if not cls._enabled() or not path.is_file():
+            return
+        entry = cls._entry_path(key, path.suffix)
+        cls._store(entry, lambda target: shutil.copyfile(path, target))
+
+    @classmethod
+    def write(cls, key: str, data: bytes, ext: str) -> None:
+        """Store `data` under `key` as a file with extension `ext`."""
+        if not cls._enabled():
+            return
+        entry = cls._entry_path(key, f".{ext}")
+        cls._store(entry, lambda target: target.write_bytes(data))
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            shutil.rmtree(utils.AppPaths.media_cache, ignore_errors=True)
+            cls._size = None
+
+    @classmethod
+    def _enabled(cls) -> bool:
+        return settings.get_media_cache_budget() > 0
+
+    @classmethod
+    def _find(cls, key: str) -> Path | None:
+        if not cls._enabled():
+            return None
+        shard = utils.AppPaths.media_cache.joinpath(key[:2])
+        return next(
+            (p for p in shard.glob(f"{key}.*") if p.suffix != _PARTIAL_SUFFIX), None
+        )
+
+    @classmethod
+    def _entry_path(cls, key: str, suffix: str) -> Path:
+        return utils.AppPaths.media_cache.joinpath(key[:2], f"{key}{suffix}")
+
+    @classmethod
+    def _store(cls, entry: Path, write: Callable[[Path], object]) -> None:
+        partial = entry.with_name(
+            f"{entry.name}.{threading.get_ident()}{_PARTIAL_SUFFIX}"
+        )
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            write(partial)
+            size = partial.stat().st_size
+            os.replace(partial, entry)
+        except OSError as error:
+            logger.debug(f"Failed to write media cache entry '{entry}': {error}")
+            partial.unlink(missing_ok=True)
+            return
+        with cls._lock:
+            if cls._size is None:
+                cls._size = cls._total_size()
+            else:
+                # may overestimate if an entry was replaced; fixed when evicting
+                cls._size += size
+            cls._evict()
+
+    @classmethod
+    def _total_size(cls) -> int:
+        return sum(p.stat().st_size for p in cls._entries())
+
+    @classmethod
+    def _entries(cls) -> list[Path]:
+        return [
+            path
+            for path in utils.AppPaths.media_cache.glob("*/*")
+            if path.is_file() and path.suffix != _PARTIAL_SUFFIX
+        ]
+
+    @classmethod
+    def _evict(cls) -> None:
+        """Delete least recently used entries until the cache fits into the budget.
+        Must be called with the lock held.
+        """
+        budget = settings.get_media_cache_budget() * 1024 * 1024
+        if cls._size is None or cls._size <= budget:
+            return
+        start = time.monotonic()
+        entries = []
+        for path in cls._entries():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        cls._size = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if cls._size <= budget:
+                break
+            path.unlink(missing_ok=True)
+            cls._size -= size
+            evicted += 1
+        logger.debug(
+            f"Evicted {evicted} entries from the media cache in "
+            f"{time.monotonic() - start:.2f}s."
+        )
@@ -1,23 +1,37 @@
 """Functions for downloading and processing media."""
 
+import functools
+import io
 import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from pathlib import Path
-from typing import Union, assert_never
+from typing import Any, Callable, Union, assert_never
 
+import attrs
 import filetype
+import mutagen
 import requests
 import yt_dlp
-from ffmpeg_normalize import FFmpegNormalize
 from PIL import Image, ImageEnhance, ImageOps
 from PIL.Image import Resampling
 
-from usdb_syncer.download_options import AudioOptions, VideoOptions
+from usdb_syncer import db, dead_resources, errors, http_cache, settings, ytdl_info
+from usdb_syncer.bandwidth import BandwidthLimiter
+from usdb_syncer.cookie_cache import CookieCache
+from usdb_syncer.download_options import AudioOptions, Options, VideoOptions
+from usdb_syncer.host_limiter import HostLimiter
 from usdb_syncer.logger import Log, song_logger
+from usdb_syncer.loudness import LoudnessStats, NormalizationPool
+from usdb_syncer.media_cache import MediaCache
 from usdb_syncer.meta_tags import ImageMetaTags
-from usdb_syncer.settings import Browser, CoverMaxSize
+from usdb_syncer.settings import AudioFormat, Browser, CoverMaxSize, VideoCodec
+from usdb_syncer.transfer_progress import TransferProgress
 from usdb_syncer.usdb_scraper import SongDetails
 from usdb_syncer.utils import video_url_from_resource
+from usdb_syncer.ytdl_pool import YtdlPool
 
 IMAGE_DOWNLOAD_HEADERS = {
     "User-Agent": (
@@ -28,6 +42,20 @@ IMAGE_DOWNLOAD_HEADERS = {
 
 YtdlOptions = dict[str, Union[str, bool, tuple, list, int]]
 
+# seconds between checks for cancellation and progress while transcoding
+_TRANSCODE_POLL_SECS = 1.0
+# progress of transcoding is logged in steps of this many percent
+_TRANSCODE_PROGRESS_STEP = 25
+# resources longer than the song by up to this many seconds are considered equally
+# fitting, and those differing more are ranked by the difference
+_DURATION_TOLERANCE_SECS = 30
+# resources of a song are probed concurrently by this many threads in total
+_PROBE_WORKERS = 8
+_PROBE_EXECUTOR = ThreadPoolExecutor(_PROBE_WORKERS, thread_name_prefix="probe")
+# downscale by integer factors first while the image is at least this many times
+# larger than the target, which is much faster and barely affects quality
+_REDUCING_GAP = 3.0
+
 
 class ImageKind(Enum):
     """Types of images used for songs."""
@@ -59,6 +87,10 @@ def download_audio(
     Returns:
         the extension of the successfully downloaded file or None
     """
+    cache_key = _audio_cache_key(resource, options)
+    if ext := MediaCache.get(cache_key, path_stem):
+        logger.debug(f"Audio resource '{resource}' found in media cache.")
+        return ext
     ydl_opts = _ytdl_options(options.ytdl_format(), browser, path_stem)
     if not options.normalize:
         postprocessor = {
@@ -72,29 +104,35 @@ def download_audio(
         return None
 
     if options.normalize:
-        _normalize(options, path_stem, filename)
-
-    return options.format.value
-
-
-def _normalize(options: AudioOptions, path_stem: Path, filename: str) -> None:
-    normalizer = FFmpegNormalize(
-        normalization_type="ebu",  # default: "ebu"
-        target_level=-23,  # default: -23
-        print_stats=True,  # set to False?
-        keep_lra_above_loudness_range_target=True,  # needed for linear normalization
-        loudness_range_target=7,  # default: 7.0
-        true_peak=-2,  # default: -2
-        dynamic=False,  # default: False
-        audio_codec=options.format.ffmpeg_encoder(),
-        audio_bitrate=options.bitrate.ffmpeg_format(),
-        sample_rate=None,  # default
-        debug=True,  # set to False
-        progress=True,  # set to False?
-    )
+        _normalize(options, path_stem, filename, resource)
+
     ext = options.format.value
-    normalizer.add_media_file(filename, f"{path_stem}.{ext}")
-    normalizer.run_normalization()
+    MediaCache.put(cache_key, path_stem.with_name(f"{path_stem.name}.{ext}"))
+    return ext
+
+
+def _normalize(
+    options: AudioOptions, path_stem: Path, filename: str, resource: str
+) -> None:
+    """Normalize the loudness of the audio in `filename` in a worker process,
+    reusing measurements of the same resource from earlier downloads.
+    """
+    stats = None
+    if row := db.get_loudness_stats(resource):
+        stats = LoudnessStats(*row)
+    ext = options.format.value
+    if new_stats := NormalizationPool.normalize(
+        filename,
+        f"{path_stem}.{ext}",
+        options.format.ffmpeg_encoder(),
+        options.bitrate.ffmpeg_format(),
+        stats,
+    ):
+        db.submit_write(
+            functools.partial(
+                db.upsert_loudness_stats, resource, attrs.astuple(new_stats)
+            )
+        )
 
 
 def download_video(
@@ -111,12 +149,221 @@ def download_video(
     Returns:
         the extension of the successfully downloaded file or None
     """
+    cache_key = _video_cache_key(resource, options)
+    if ext := MediaCache.get(cache_key, path_stem):
+        logger.debug(f"Video resource '{resource}' found in media cache.")
+        return ext
     ydl_opts = _ytdl_options(options.ytdl_format(), browser, path_stem)
     if filename := _download_resource(ydl_opts, resource, logger):
+        MediaCache.put(cache_key, Path(filename))
         return os.path.splitext(filename)[1][1:]
     return None
 
 
+def download_audio_and_video(
+    resource: str, options: Options, path_stem: Path, logger: Log
+) -> tuple[str, str] | None:
+    """Download video with audio from resource with a single request and split it
+    into separate audio and video files locally.
+
+    Parameters:
+        resource: URL or YouTube id
+        options: download options, including both audio and video options
+        path_stem: the target on the file system *without* an extension
+
+    Returns:
+        the extensions of the successfully created audio and video files or None
+    """
+    audio_options, video_options = options.audio_options, options.video_options
+    assert audio_options and video_options
+    audio_key = _audio_cache_key(resource, audio_options)
+    video_key = _video_cache_key(resource, video_options)
+    if (audio_ext := MediaCache.get(audio_key, path_stem)) and (
+        video_ext := MediaCache.get(video_key, path_stem)
+    ):
+        logger.debug(f"Audio and video resource '{resource}' found in media cache.")
+        return audio_ext, video_ext
+    ydl_opts = _ytdl_options(
+        video_options.ytdl_format(with_audio=audio_options.ytdl_format()),
+        options.browser,
+        path_stem.with_name(f"{path_stem.name}.merged"),
+    )
+    if not (result := _download_resource_with_info(ydl_opts, resource, logger)):
+        return None
+    merged, info = result
+    try:
+        audio_ext, video_ext = _split_streams(
+            merged, info, audio_options, path_stem, resource
+        )
+    except subprocess.CalledProcessError as error:
+        logger.debug(error.stderr)
+        logger.error(f"Failed to extract audio and video from {resource}.")
+        return None
+    finally:
+        Path(merged).unlink(missing_ok=True)
+    MediaCache.put(audio_key, path_stem.with_name(f"{path_stem.name}.{audio_ext}"))
+    MediaCache.put(video_key, path_stem.with_name(f"{path_stem.name}.{video_ext}"))
+    return audio_ext, video_ext
+
+
+def _split_streams(
+    merged: str,
+    info: dict[str, Any],
+    options: AudioOptions,
+    path_stem: Path,
+    resource: str,
+) -> tuple[str, str]:
+    """Write the video stream of the `merged` file and its audio, processed
+    according to `options`, to separate files. Returns their extensions.
+    """
+    formats = info.get("requested_formats") or [info]
+    video_ext = formats[0]["ext"]
+    _ffmpeg("-i", merged, "-map", "0:v:0", "-c", "copy", f"{path_stem}.{video_ext}")
+    audio_ext = options.format.value
+    if options.normalize:
+        _normalize(options, path_stem, merged, resource)
+        return audio_ext, video_ext
+    audio_codec = (formats[-1].get("acodec") or "").split(".")[0]
+    if audio_codec == _SOURCE_CODECS[options.format]:
+        codec = ["-c:a", "copy"]
+    else:
+        codec = [
+            "-c:a",
+            options.format.ffmpeg_encoder(),
+            "-b:a",
+            str(options.bitrate.ffmpeg_format()),
+        ]
+    _ffmpeg("-i", merged, "-map", "0:a:0", *codec, f"{path_stem}.{audio_ext}")
+    return audio_ext, video_ext
+
+
+def transcode_video(
+    path: Path, codec: VideoCodec, logger: Log, is_cancelled: Callable[[], bool]
+) -> Path | None:
+    """Reencode the video at `path` with `codec` in a separate ffmpeg process, and
+    replace the original with it. Audio streams are copied.
+
+    Parameters:
+        path: the video to reencode
+        codec: the target codec
+        is_cancelled: polled while encoding; the process is killed once it is True
+
+    Returns:
+        the path of the reencoded video, whose extension may differ, or None if
+        reencoding failed
+
+    Raises:
+        AbortError: if cancelled
+    """
+    ext = codec.container(path.suffix[1:])
+    target = path.with_name(f"{path.stem}.transcoded.{ext}")
+    progress_file = target.with_name(f"{target.name}.progress")
+    duration = _media_duration(path)
+    args = ["ffmpeg", "-y", "-loglevel", "error", "-nostats"]
+    args += ["-progress", str(progress_file), "-i", str(path)]
+    args += ["-map", "0:v:0", "-map", "0:a?", "-c:a", "copy", *codec.ffmpeg_args()]
+    logger.info(f"Reencoding video with {codec} ...")
+    reported = 0
+    try:
+        with subprocess.Popen(
+            [*args, str(target)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        ) as process:
+            while True:
+                try:
+                    _, stderr = process.communicate(timeout=_TRANSCODE_POLL_SECS)
+                    break
+                except subprocess.TimeoutExpired:
+                    if is_cancelled():
+                        process.kill()
+                        process.communicate()
+                        raise errors.AbortError from None
+                    percent = _transcode_progress(progress_file, duration)
+                    if percent >= reported + _TRANSCODE_PROGRESS_STEP:
+                        reported = percent - percent % _TRANSCODE_PROGRESS_STEP
+                        logger.info(f"Reencoding video: {reported}%")
+        if process.returncode:
+            logger.debug(stderr)
+            return None
+        path.unlink()
+        return target.replace(path.with_suffix(f".{ext}"))
+    except OSError as error:
+        logger.debug(error)
+        return None
+    finally:
+        target.unlink(missing_ok=True)
+        progress_file.unlink(missing_ok=True)
+
+
+def _media_duration(path: Path) -> float | None:
+    try:
+        if file := mutagen.File(path):
+            return float(file.info.length) or None
+    except (mutagen.MutagenError, AttributeError):
+        pass
+    return None
+
+
+def _transcode_progress(progress_file: Path, duration: float | None) -> int:
+    """The percentage of the video ffmpeg has processed so far."""
+    if not duration:
+        return 0
+    try:
+        lines = progress_file.read_text(encoding="utf-8").splitlines()
+    except OSError:
+        return 0
+    for line in reversed(lines):
+        if line.startswith("out_time_us=") and line[12:].isdigit():
+            return min(100, int(int(line[12:]) / 1_000_000 / duration * 100))
+    return 0
+
+
+def audio_is_cached(resource: str, options: AudioOptions) -> bool:
+    return MediaCache.contains(_audio_cache_key(resource, options))
+
+
+def video_is_cached(resource: str, options: VideoOptions) -> bool:
+    return MediaCache.contains(_video_cache_key(resource, options))
+
+
+def _audio_cache_key(resource: str, options: AudioOptions) -> str:
+    return MediaCache.key(
+        video_url_from_resource(resource) or resource,
+        options.format,
+        options.bitrate,
+        options.normalize,
+    )
+
+
+def _video_cache_key(resource: str, options: VideoOptions) -> str:
+    return MediaCache.key(
+        video_url_from_resource(resource) or resource,
+        options.format,
+        options.max_resolution,
+        options.max_fps,
+    )
+
+
+# codecs yt-dlp reports for audio streams that can be copied into the audio format
+_SOURCE_CODECS = {
+    AudioFormat.M4A: "mp4a",
+    AudioFormat.MP3: "mp3",
+    AudioFormat.OGG: "vorbis",
+    AudioFormat.OPUS: "opus",
+}
+
+
+def _ffmpeg(*args: str) -> None:
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", *args],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+
 def _ytdl_options(format_: str, browser: Browser, target_stem: Path) -> YtdlOptions:
     options: YtdlOptions = {
         "format": format_,
@@ -126,42 +373,218 @@ def _ytdl_options(format_: str, browser: Browser, target_stem: Path) -> YtdlOpti
         # suppresses download of playlists, channels and search results
         "playlistend": 0,
         "overwrites": True,
+        "progress_hooks": [TransferProgress.ytdl_hook, BandwidthLimiter.ytdl_hook],
+        **BandwidthLimiter.ytdl_options(),
     }
-    if browser:
-        options["cookiesfrombrowser"] = (browser.value, None, None, None)
+    if cookie_file := CookieCache.cookie_file(browser):
+        options["cookiefile"] = str(cookie_file)
     return options
 
 
 def _download_resource(options: YtdlOptions, resource: str, logger: Log) -> str | None:
+    if result := _download_resource_with_info(options, resource, logger):
+        return result[0]
+    return None
+
+
+def _download_resource_with_info(
+    options: YtdlOptions, resource: str, logger: Log
+) -> tuple[str, dict[str, Any]] | None:
+    """Returns the path of the downloaded file and the info dict of the resource."""
     if (url := video_url_from_resource(resource)) is None:
         logger.debug(f"invalid audio/video resource: {resource}")
         return None
 
-    options_without_cookies = options.copy()
-    options_without_cookies.pop("cookiesfrombrowser")
-    with yt_dlp.YoutubeDL(options_without_cookies) as ydl:
+    if dead := dead_resources.lookup(url):
+        logger.debug(f"Skipping {url}, which is {dead.reason}: {dead.error}")
+        return None
+    format_spec = str(options["format"])
+    cached = ytdl_info.lookup(url, format_spec)
+    if cached and cached.error:
+        logger.debug(f"Skipping {url}, which failed recently: {cached.error}")
+        return None
+    options = options | {"format": ytdl_info.format_with_fallback(cached, format_spec)}
+    if age_gated := "cookiefile" in options and ytdl_info.is_age_gated(url):
+        logger.debug("Age-restricted resource. Downloading with cookies...")
+        ytdl_info.record_skipped_attempt()
+    else:
+        options_without_cookies = options.copy()
+        options_without_cookies.pop("cookiefile", None)
+        start = time.monotonic()
+        result = _extract(options_without_cookies, url, logger)
+        if not isinstance(result, yt_dlp.utils.YoutubeDLError):
+            ytdl_info.store_info(url, format_spec, result[1], age_gated=False)
+            return result
+        logger.debug(f"error downloading video url: {url}")
+        if not _is_age_restricted(result):
+            ytdl_info.store_error(url, format_spec, result, age_gated=False)
+            return None
+        ytdl_info.store_age_gated(url, format_spec)
+        if "cookiefile" not in options:
+            logger.error("Age-restricted resource, but no browser to use cookies from.")
+            return None
+        ytdl_info.record_failed_attempt(time.monotonic() - start)
+        logger.debug("Age-restricted resource. Retrying with cookies...")
+    result = _extract(options, url, logger)
+    if isinstance(result, yt_dlp.utils.YoutubeDLError):
+        logger.error(f"{'Download' if age_gated else 'Retry'} failed: {result}")
+        if _is_age_restricted(result):
+            # e.g. the user has been logged out with the browser in the meantime
+            CookieCache.invalidate()
+            ytdl_info.store_age_gated(url, format_spec)
+        else:
+            ytdl_info.store_error(url, format_spec, result, age_gated=True)
+        return None
+    ytdl_info.store_info(url, format_spec, result[1], age_gated=True)
+    return result
+
+
+def _extract(
+    options: YtdlOptions, url: str, logger: Log
+) -> tuple[str, dict[str, Any]] | yt_dlp.utils.YoutubeDLError:
+    """Returns the path of the downloaded file and the info dict, or the error."""
+    with YtdlPool.get(options, logger) as ydl:
         try:
-            return ydl.prepare_filename(ydl.extract_info(url))
+            # only extraction holds a slot of the host, so long media downloads
+            # don't cap the number of songs downloaded in parallel
+            with HostLimiter.limit(url):
+                info = ydl.extract_info(url, download=False)
+            info = ydl.process_ie_result(info, download=True)
         except yt_dlp.utils.YoutubeDLError as e:
-            logger.debug(f"error downloading video url: {url}")
-            # Check if the error is due to age restriction
-            if "confirm your age" in str(e).lower():
-                logger.debug("Age-restricted resource. Retrying with cookies...")
-                try:
-                    with yt_dlp.YoutubeDL(options) as ydl:
-                        return ydl.prepare_filename(ydl.extract_info(url))
-                except yt_dlp.utils.YoutubeDLError as retry_error:
-                    logger.error(f"Retry failed: {retry_error}")
-                    return None
-            else:
-                return None
+            return e
+        return ydl.prepare_filename(info), info
+
+
+def _is_age_restricted(error: yt_dlp.utils.YoutubeDLError) -> bool:
+    return "confirm your age" in str(error).lower()
+
+
+@attrs.define
+class ProbeResult:
+    """Availability of a resource, determined without downloading it."""
+
+    resource: str
+    # None if unknown, e.g. because of a network error or an age restriction
+    available: bool | None
+    duration: float | None = None
+    error: str | None = None
+
+    def is_long_enough(self, min_secs: float) -> bool:
+        """True if the resource is available and not known to be shorter than
+        `min_secs`.
+        """
+        return bool(self.available) and (
+            self.duration is None or self.duration >= min_secs
+        )
+
+    def rank(self, min_secs: float) -> tuple[int, int]:
+        """Sort key, best first: resources with a known duration of at least
+        `min_secs` by how much longer they are, then those with an unknown
+        duration, then those that are too short.
+        """
+        if self.available is None or self.duration is None:
+            return 1, 0
+        if self.duration < min_secs:
+            return 2, 0
+        return 0, int(self.duration - min_secs) // _DURATION_TOLERANCE_SECS
+
+
+def probe_resources(
+    resources: list[str], format_spec: str, browser: Browser, logger: Log
+) -> list[ProbeResult]:
+    """Resolve the metadata of all resources concurrently, without downloading
+    them, unless known from earlier downloads.
+
+    Parameters:
+        resources: URLs or YouTube ids
+        format_spec: yt-dlp format the resources must provide
+        browser: browser whose cookies would be used for downloading
+    """
+    results: dict[str, ProbeResult] = {}
+    futures = {}
+    options = _ytdl_options(format_spec, browser, Path("probe"))
+    options.pop("cookiefile", None)
+    for resource in resources:
+        if resource in results or resource in futures:
+            continue
+        if (url := video_url_from_resource(resource)) is None:
+            results[resource] = ProbeResult(resource, False, error="invalid resource")
+        elif known := _known_probe_result(resource, url, format_spec):
+            results[resource] = known
+        else:
+            futures[resource] = (
+                url,
+                _PROBE_EXECUTOR.submit(_probe_resource, url, options, logger),
+            )
+    for resource, (url, future) in futures.items():
+        results[resource] = _store_probe_result(
+            resource, url, format_spec, future.result()
+        )
+    return [results[resource] for resource in resources]
+
+
+def _known_probe_result(
+    resource: str, url: str, format_spec: str
+) -> ProbeResult | None:
+    """The result for `url` if it is known from earlier downloads or probes."""
+    if dead := dead_resources.lookup(url):
+        return ProbeResult(resource, False, error=dead.error)
+    if cached := ytdl_info.lookup(url, format_spec):
+        return ProbeResult(resource, not cached.error, cached.duration, cached.error)
+    if ytdl_info.is_age_gated(url):
+        # would fail without cookies
+        return ProbeResult(resource, None, error="age-restricted")
+    return None
+
+
+def _store_probe_result(
+    resource: str,
+    url: str,
+    format_spec: str,
+    outcome: dict[str, Any] | yt_dlp.utils.YoutubeDLError,
+) -> ProbeResult:
+    """Cache the outcome of probing `url` and turn it into a result."""
+    match outcome:
+        case dict() as info:
+            ytdl_info.store_info(url, format_spec, info, age_gated=False)
+            return ProbeResult(resource, True, info.get("duration"))
+        case yt_dlp.utils.YoutubeDLError() as error:
+            if _is_age_restricted(error):
+                return ProbeResult(resource, None, error=str(error))
+            ytdl_info.store_error(url, format_spec, error, age_gated=False)
+            return ProbeResult(
+                resource,
+                False if ytdl_info.is_permanent(error) else None,
+                error=str(error),
+            )
+        case _ as unreachable:
+            assert_never(unreachable)
+
+
+def _probe_resource(
+    url: str, options: YtdlOptions, logger: Log
+) -> dict[str, Any] | yt_dlp.utils.YoutubeDLError:
+    with YtdlPool.get(options, logger) as ydl:
+        try:
+            with HostLimiter.limit(url):
+                return ydl.extract_info(url, download=False)
+        except yt_dlp.utils.YoutubeDLError as error:
+            return error
 
 
 def download_image(url: str, logger: Log) -> bytes | None:
     try:
-        reply = requests.get(
-            url, allow_redirects=True, headers=IMAGE_DOWNLOAD_HEADERS, timeout=60
+        reply = http_cache.get(
+            url,
+            IMAGE_DOWNLOAD_HEADERS,
+            timeout=60,
+            max_bytes=settings.get_image_max_size() * 1024 * 1024,
+            sniff=filetype.is_image,
+            on_progress=functools.partial(TransferProgress.update, url),
         )
+    except errors.DownloadRejectedError as error:
+        logger.error(f"Failed to retrieve {url}: {error}.")
+        return None
     except requests.exceptions.SSLError:
         logger.error(
             f"Failed to retrieve {url}. The SSL certificate could not be verified."
@@ -173,8 +596,15 @@ def download_image(url: str, logger: Log) -> bytes | None:
             "connection is currently unavailable."
         )
         return None
+    if reply.from_cache:
+        logger.debug(f"Image '{url}' found in cache.")
+        return reply.content
     if reply.status_code in range(100, 399):
         # 1xx informational response, 2xx success, 3xx redirection
+        if filetype.is_image(reply.content) and (
+            ext := filetype.guess_extension(reply.content)
+        ):
+            http_cache.store(url, reply, ext)
         return reply.content
     if reply.status_code in range(400, 499):
         logger.error(
@@ -205,41 +635,65 @@ def download_and_process_image(
         logger.error(f"#{str(kind).upper()}: file at {url} is no image")
         return None
 
+    try:
+        img_bytes = process_image(img_bytes, meta_tags, max_width)
+    except (OSError, ValueError) as error:
+        logger.debug(f"Failed to process image: {error}")
+        logger.error(f"#{str(kind).upper()}: image at {url} could not be processed")
+        return None
     path = target_stem.with_name(f"{target_stem.name} [{kind.value}].jpg")
-    with path.open("wb") as file:
-        file.write(img_bytes)
-
-    _process_image(meta_tags, max_width, path)
+    path.write_bytes(img_bytes)
     return path
 
 
-def _process_image(
-    meta_tags: ImageMetaTags | None, max_width: CoverMaxSize | None, path: Path
-) -> None:
-    processed = False
-    with Image.open(path).convert("RGB") as image:
-        if meta_tags and meta_tags.image_processing():
-            processed = True
-            if rotate := meta_tags.rotate:
-                image = image.rotate(rotate, resample=Resampling.BICUBIC, expand=True)
-            if crop := meta_tags.crop:
-                image = image.crop((crop.left, crop.upper, crop.right, crop.lower))
-            if resize := meta_tags.resize:
-                image = image.resize(
-                    (resize.width, resize.height), resample=Resampling.LANCZOS
-                )
-            if meta_tags.contrast == "auto":
-                image = ImageOps.autocontrast(image, cutoff=5)
-            elif meta_tags.contrast:
-                image = ImageEnhance.Contrast(image).enhance(meta_tags.contrast)
-        if (
-            max_width
-            and max_width != CoverMaxSize.DISABLE
-            and max_width.value < image.width
-        ):
-            processed = True
-            height = round(image.height * max_width.value / image.width)
-            image = image.resize((max_width.value, height), resample=Resampling.LANCZOS)
+def process_image(
+    data: bytes, meta_tags: ImageMetaTags | None, max_width: CoverMaxSize | None
+) -> bytes:
+    """Apply the processing of the meta tags and the maximum size to an encoded
+    image in memory. Returns `data` unchanged if nothing applies, and the image
+    encoded as JPEG otherwise.
+
+    This has no side effects, so it may also run in a worker process.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        processing = bool(meta_tags and meta_tags.image_processing())
+        scale_to = _scaled_size(source.size, max_width)
+        if not processing and not scale_to:
+            return data
+        if scale_to and not processing:
+            # decode JPEGs at a reduced scale right away; no-op for other formats
+            source.draft("RGB", scale_to)
+        image = source.convert("RGB")
+    if processing:
+        assert meta_tags
+        if rotate := meta_tags.rotate:
+            image = image.rotate(rotate, resample=Resampling.BICUBIC, expand=True)
+        if crop := meta_tags.crop:
+            image = image.crop((crop.left, crop.upper, crop.right, crop.lower))
+        if resize := meta_tags.resize:
+            image = image.resize(
+                (resize.width, resize.height), resample=Resampling.LANCZOS
+            )
+        if meta_tags.contrast == "auto":
+            image = ImageOps.autocontrast(image, cutoff=5)
+        elif meta_tags.contrast:
+            image = ImageEnhance.Contrast(image).enhance(meta_tags.contrast)
+        # the size may have changed
+        scale_to = _scaled_size(image.size, max_width)
+    if scale_to:
+        image = image.resize(
+            scale_to, resample=Resampling.LANCZOS, reducing_gap=_REDUCING_GAP
+        )
+    out = io.BytesIO()
+    image.save(out, "jpeg", quality=100, subsampling=0)
+    return out.getvalue()
+
 
-        if processed:
-            image.save(path, "jpeg", quality=100, subsampling=0)
+def _scaled_size(
+    size: tuple[int, int], max_width: CoverMaxSize | None
+) -> tuple[int, int] | None:
+    """The size to scale an image down to, if it is wider than the maximum."""
+    width, height = size
+    if not max_width or max_width == CoverMaxSize.DISABLE or max_width.value >= width:
+        return None
+    return max_width.value, round(height * max_width.value / width)
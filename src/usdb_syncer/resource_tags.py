@@ -0,0 +1,124 @@
+"""Writes tags with the song's metadata to downloaded audio and video files."""
+
+import base64
+from pathlib import Path
+
+import mutagen.mp4
+import mutagen.ogg
+from mutagen import id3
+from mutagen.flac import Picture
+from PIL import Image
+
+from usdb_syncer.constants import ISO_639_2B_LANGUAGE_CODES
+from usdb_syncer.song_txt import SongTxt
+
+
+def write_m4a_mp4_tags(
+    path: Path, resource: str, txt: SongTxt, images: list[Path]
+) -> None:
+    """Write tags to an m4a or mp4 file, embedding `images`."""
+    tags = mutagen.mp4.MP4Tags()
+
+    tags["\xa9ART"] = txt.headers.artist
+    tags["\xa9nam"] = txt.headers.title
+    if txt.headers.genre:
+        tags["\xa9gen"] = txt.headers.genre
+    if txt.headers.year:
+        tags["\xa9day"] = txt.headers.year
+    tags["\xa9lyr"] = txt.unsynchronized_lyrics()
+    tags["\xa9cmt"] = resource
+
+    if images:
+        tags["covr"] = [
+            mutagen.mp4.MP4Cover(
+                image.read_bytes(), imageformat=mutagen.mp4.MP4Cover.FORMAT_JPEG
+            )
+            for image in images
+        ]
+
+    tags.save(path)
+
+
+def write_mp3_tags(
+    path: Path, resource: str, txt: SongTxt, cover: tuple[Path, str] | None
+) -> None:
+    """Write tags to an mp3 file, embedding `cover` if given."""
+    tags = id3.ID3()
+
+    lang = ISO_639_2B_LANGUAGE_CODES.get(txt.headers.main_language(), "und")
+    tags["TPE1"] = id3.TPE1(encoding=id3.Encoding.UTF8, text=txt.headers.artist)
+    tags["TIT2"] = id3.TIT2(encoding=id3.Encoding.UTF8, text=txt.headers.title)
+    tags["TLAN"] = id3.TLAN(encoding=id3.Encoding.UTF8, text=lang)
+    if genre := txt.headers.genre:
+        tags["TCON"] = id3.TCON(encoding=id3.Encoding.UTF8, text=genre)
+    if year := txt.headers.year:
+        tags["TDRC"] = id3.TDRC(encoding=id3.Encoding.UTF8, text=year)
+    tags[f"USLT::'{lang}'"] = id3.USLT(
+        encoding=id3.Encoding.UTF8,
+        lang=lang,
+        desc="Lyrics",
+        text=txt.unsynchronized_lyrics(),
+    )
+    tags["SYLT"] = id3.SYLT(
+        encoding=id3.Encoding.UTF8,
+        lang=lang,
+        format=2,  # milliseconds as units
+        type=1,  # lyrics
+        text=txt.synchronized_lyrics(),
+    )
+    tags["COMM"] = id3.COMM(
+        encoding=id3.Encoding.UTF8, lang="eng", desc="Audio Source", text=resource
+    )
+
+    if cover:
+        tags.add(
+            id3.APIC(
+                encoding=id3.Encoding.UTF8,
+                mime="image/jpeg",
+                type=id3.PictureType.COVER_FRONT,
+                desc=f"Source: {cover[1]}",
+                data=cover[0].read_bytes(),
+            )
+        )
+
+    tags.save(path)
+
+
+def write_ogg_tags(
+    audio: mutagen.ogg.OggFileType,
+    resource: str,
+    txt: SongTxt,
+    cover: tuple[Path, str] | None,
+) -> None:
+    """Write tags to an Ogg Vorbis or Opus file, embedding `cover` if given."""
+    # Set basic tags
+    audio["artist"] = txt.headers.artist
+    audio["title"] = txt.headers.title
+    lang = ISO_639_2B_LANGUAGE_CODES.get(txt.headers.main_language(), "und")
+    audio["language"] = lang
+    if genre := txt.headers.genre:
+        audio["genre"] = genre
+    if year := txt.headers.year:
+        audio["date"] = year
+    audio["lyrics"] = txt.unsynchronized_lyrics()
+    audio["comment"] = resource
+
+    if cover:
+        cover_path = cover[0]
+        picture = Picture()
+        with cover_path.open("rb") as file:
+            picture.data = file.read()
+        with Image.open(cover_path) as image:
+            picture.width, picture.height = image.size
+        picture.type = 3  # "Cover (front)"
+        picture.desc = "Cover art"
+        picture.mime = "image/jpeg"
+        picture.depth = 24
+
+        picture_data = picture.write()
+        encoded_data = base64.b64encode(picture_data)
+        vcomment_value = encoded_data.decode("ascii")
+
+        audio["metadata_block_picture"] = [vcomment_value]
+
+    audio.save()
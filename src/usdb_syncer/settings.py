@@ -5,8 +5,12 @@ used directly. Instead, new settings should be added to the SettingKey enum and
 and getters should be added to this module.
 """
 
+# all settings are defined here, as explained above
+# pylint: disable=too-many-lines
+
 from __future__ import annotations
 
+import json
 import os
 import shutil
 import subprocess
@@ -81,6 +85,7 @@ class SettingKey(Enum):
     AUDIO_BITRATE = "downloads/audio_bitrate"
     AUDIO_NORMALIZE = "downloads/audio_normalize"
     AUDIO_EMBED_ARTWORK = "downloads/audio_embed_artwork"
+    AUDIO_FROM_VIDEO = "downloads/audio_from_video"
     VIDEO = "downloads/video"
     VIDEO_FORMAT = "downloads/video_format"
     VIDEO_REENCODE = "downloads/video_reencode"
@@ -104,6 +109,19 @@ class SettingKey(Enum):
     APP_PATH_USDX = "app_paths/usdx"
     APP_PATH_VOCALUXE = "app_paths/vocaluxe"
     APP_PATH_YASS_RELOADED = "app_paths/yass_reloaded"
+    WORKERS_METADATA = "workers/metadata"
+    WORKERS_MEDIA = "workers/media"
+    WORKERS_IMAGES = "workers/images"
+    WORKERS_PERSIST = "workers/persist"
+    WORKERS_TRANSCODE = "workers/transcode"
+    WORKERS_NORMALIZE = "workers/normalize"
+    WORKERS_ADAPTIVE = "workers/adaptive"
+    HOST_LIMITS = "network/host_limits"
+    MEDIA_CACHE_BUDGET = "cache/media_budget"
+    IMAGE_MAX_SIZE = "downloads/image_max_size"
+    BANDWIDTH_LIMIT = "network/bandwidth_limit"
+    BANDWIDTH_LIMIT_START = "network/bandwidth_limit_start"
+    BANDWIDTH_LIMIT_END = "network/bandwidth_limit_end"
 
 
 class Encoding(Enum):
@@ -330,7 +348,10 @@ class Browser(Enum):
             case _ as unreachable:
                 assert_never(unreachable)
 
-    def cookies(self) -> CookieJar | None:
+    def cookies(self, domains: list[str] | None = None) -> CookieJar | None:
+        """Read the cookies of `domains`, by default USDB, from the browser's
+        store, which is slow; see `CookieCache`.
+        """
         match self:
             case Browser.NONE:
                 return None
@@ -353,7 +374,7 @@ class Browser(Enum):
             case _ as unreachable:
                 assert_never(unreachable)
         try:
-            return rookiepy.to_cookiejar(function([Usdb.DOMAIN]))
+            return rookiepy.to_cookiejar(function(domains or [Usdb.DOMAIN]))
         except Exception:  # pylint: disable=broad-exception-caught
             logger.debug(traceback.format_exc())
         logger.warning(f"Failed to retrieve {str(self).capitalize()} cookies.")
@@ -414,6 +435,40 @@ class VideoCodec(Enum):
             case _ as unreachable:
                 assert_never(unreachable)
 
+    def ffmpeg_args(self) -> list[str]:
+        """Arguments for encoding the video stream with ffmpeg."""
+        match self:
+            case VideoCodec.H264:
+                return ["-c:v", "libx264", "-preset", "medium", "-crf", "23"]
+            case VideoCodec.H265:
+                # the tag makes Apple players recognize the stream
+                return ["-c:v", "libx265", "-crf", "28", "-tag:v", "hvc1"]
+            case VideoCodec.LIBVPX:
+                return ["-c:v", "libvpx-vp9", "-crf", "31", "-b:v", "0", "-row-mt", "1"]
+            case VideoCodec.LIBAOM:
+                return [
+                    "-c:v",
+                    "libaom-av1",
+                    "-crf",
+                    "30",
+                    "-b:v",
+                    "0",
+                    "-cpu-used",
+                    "6",
+                ]
+            case _ as unreachable:
+                assert_never(unreachable)
+
+    def container(self, ext: str) -> str:
+        """The extension of a reencoded video, given the original one."""
+        match self:
+            case VideoCodec.H264 | VideoCodec.H265:
+                return "mp4"
+            case VideoCodec.LIBVPX | VideoCodec.LIBAOM:
+                return ext if ext in ("mp4", "webm", "mkv") else "webm"
+            case _ as unreachable:
+                assert_never(unreachable)
+
 
 class VideoResolution(Enum):
     """Maximum video resolution."""
@@ -636,6 +691,14 @@ def set_audio_embed_artwork(value: bool) -> None:
     set_setting(SettingKey.AUDIO_EMBED_ARTWORK, value)
 
 
+def get_audio_from_video() -> bool:
+    return get_setting(SettingKey.AUDIO_FROM_VIDEO, True)
+
+
+def set_audio_from_video(value: bool) -> None:
+    set_setting(SettingKey.AUDIO_FROM_VIDEO, value)
+
+
 def get_encoding() -> Encoding:
     return get_setting(SettingKey.ENCODING, Encoding.UTF_8)
 
@@ -857,6 +920,126 @@ def set_path_template(template: path_template.PathTemplate) -> None:
     set_setting(SettingKey.PATH_TEMPLATE, template)
 
 
+def get_metadata_workers() -> int:
+    return get_setting(SettingKey.WORKERS_METADATA, 8)
+
+
+def set_metadata_workers(value: int) -> None:
+    set_setting(SettingKey.WORKERS_METADATA, value)
+
+
+def get_media_workers() -> int:
+    return get_setting(SettingKey.WORKERS_MEDIA, 4)
+
+
+def set_media_workers(value: int) -> None:
+    set_setting(SettingKey.WORKERS_MEDIA, value)
+
+
+def get_image_workers() -> int:
+    return get_setting(SettingKey.WORKERS_IMAGES, 8)
+
+
+def set_image_workers(value: int) -> None:
+    set_setting(SettingKey.WORKERS_IMAGES, value)
+
+
+def get_persist_workers() -> int:
+    return get_setting(SettingKey.WORKERS_PERSIST, 2)
+
+
+def set_persist_workers(value: int) -> None:
+    set_setting(SettingKey.WORKERS_PERSIST, value)
+
+
+def get_transcode_workers() -> int:
+    """Maximum number of concurrent ffmpeg processes reencoding videos."""
+    return get_setting(SettingKey.WORKERS_TRANSCODE, 1)
+
+
+def set_transcode_workers(value: int) -> None:
+    set_setting(SettingKey.WORKERS_TRANSCODE, value)
+
+
+def get_normalize_workers() -> int:
+    """Number of worker processes normalizing the loudness of audio files."""
+    return get_setting(SettingKey.WORKERS_NORMALIZE, max(1, (os.cpu_count() or 2) // 2))
+
+
+def set_normalize_workers(value: int) -> None:
+    set_setting(SettingKey.WORKERS_NORMALIZE, value)
+
+
+def get_adaptive_workers() -> bool:
+    """Whether the numbers of workers are adapted to the workload, with the
+    configured ones as the maximum.
+    """
+    return get_setting(SettingKey.WORKERS_ADAPTIVE, True)
+
+
+def set_adaptive_workers(value: bool) -> None:
+    set_setting(SettingKey.WORKERS_ADAPTIVE, value)
+
+
+def get_host_limits() -> dict[str, tuple[float, int, int]]:
+    """Custom limits per host as (requests per second, burst, connections)."""
+    try:
+        value = json.loads(get_setting(SettingKey.HOST_LIMITS, "{}"))
+        return {
+            str(host): (float(limits[0]), int(limits[1]), int(limits[2]))
+            for host, limits in value.items()
+        }
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError, IndexError):
+        logger.warning("Ignoring invalid custom host limits.")
+    return {}
+
+
+def set_host_limits(value: dict[str, tuple[float, int, int]]) -> None:
+    set_setting(SettingKey.HOST_LIMITS, json.dumps(value))
+
+
+def get_media_cache_budget() -> int:
+    """Disk space in MB the media cache may use. 0 disables the cache."""
+    return get_setting(SettingKey.MEDIA_CACHE_BUDGET, 0)
+
+
+def set_media_cache_budget(value: int) -> None:
+    set_setting(SettingKey.MEDIA_CACHE_BUDGET, value)
+
+
+def get_image_max_size() -> int:
+    """Size in MB above which downloads of covers and backgrounds are aborted."""
+    return get_setting(SettingKey.IMAGE_MAX_SIZE, 20)
+
+
+def set_image_max_size(value: int) -> None:
+    set_setting(SettingKey.IMAGE_MAX_SIZE, value)
+
+
+def get_bandwidth_limit() -> int:
+    """Download rate in KB/s all media downloads share. 0 means unlimited."""
+    return get_setting(SettingKey.BANDWIDTH_LIMIT, 0)
+
+
+def set_bandwidth_limit(value: int) -> None:
+    set_setting(SettingKey.BANDWIDTH_LIMIT, value)
+
+
+def get_bandwidth_limit_hours() -> tuple[int, int]:
+    """Hours of the day from which and until which the bandwidth limit applies.
+    If they are equal, it applies all day.
+    """
+    return (
+        get_setting(SettingKey.BANDWIDTH_LIMIT_START, 0),
+        get_setting(SettingKey.BANDWIDTH_LIMIT_END, 0),
+    )
+
+
+def set_bandwidth_limit_hours(start: int, end: int) -> None:
+    set_setting(SettingKey.BANDWIDTH_LIMIT_START, start)
+    set_setting(SettingKey.BANDWIDTH_LIMIT_END, end)
+
+
 def get_app_path(app: SupportedApps) -> Path | None:
     match app:
         case SupportedApps.KAREDI:
@@ -1,109 +1,65 @@
-"""Contains a runnable song loader."""
+"""Contains a song loader, whose steps are run by the download manager."""
 
 from __future__ import annotations
 
-import base64
+import collections
 import copy
+import enum
+import functools
+import hashlib
 import shutil
 import tempfile
-import time
+import threading
 import traceback
 from itertools import islice
 from pathlib import Path
-from typing import Iterable, Iterator, assert_never
+from typing import Callable, Iterator, assert_never
 
 import attrs
-import mutagen.mp4
-import mutagen.ogg
 import mutagen.oggopus
 import mutagen.oggvorbis
 import send2trash
-import shiboken6
-from mutagen import id3
-from mutagen.flac import Picture
-from PIL import Image
-from PySide6 import QtCore
 
 from usdb_syncer import (
     SongId,
     SyncMetaId,
     db,
+    dead_resources,
     download_options,
     errors,
     events,
     hooks,
     resource_dl,
+    resource_tags,
+    sync_plan,
     usdb_scraper,
     utils,
 )
-from usdb_syncer.constants import ISO_639_2B_LANGUAGE_CODES
 from usdb_syncer.custom_data import CustomData
-from usdb_syncer.logger import Log, logger, song_logger
+from usdb_syncer.host_limiter import HostLimiter
+from usdb_syncer.logger import Log, song_logger
 from usdb_syncer.settings import FormatVersion
 from usdb_syncer.song_txt import SongTxt
 from usdb_syncer.sync_meta import ResourceFile, SyncMeta
+from usdb_syncer.transfer_progress import TransferProgress
 from usdb_syncer.usdb_scraper import SongDetails
 from usdb_syncer.usdb_song import DownloadStatus, UsdbSong
 from usdb_syncer.utils import video_url_from_resource
 
 
-class DownloadManager:
-    """Manager for concurrent song downloads."""
-
-    _jobs: dict[SongId, _SongLoader] = {}
-    _pause = False
-    _pool: QtCore.QThreadPool | None = None
-
-    @classmethod
-    def download(cls, songs: Iterable[UsdbSong]) -> None:
-        options = download_options.download_options()
-        for song in songs:
-            if song.song_id in cls._jobs:
-                cls._jobs[song.song_id].logger.warning("Already downloading!")
-                continue
-            cls._jobs[song.song_id] = job = _SongLoader(song, options)
-            job.pause = cls._pause
-            cls._threadpool().start(job)
-
-    @classmethod
-    def abort(cls, songs: Iterable[SongId]) -> None:
-        for song in songs:
-            if (job := cls._jobs.get(song)) and shiboken6.isValid(job):
-                if cls._threadpool().tryTake(job):
-                    job.logger.info("Download aborted by user request.")
-                    job.song.status = DownloadStatus.NONE
-                    with db.transaction():
-                        job.song.upsert()
-                    events.SongChanged(job.song_id).post()
-                    events.DownloadFinished(job.song_id).post()
-                else:
-                    job.abort = True
-
-    @classmethod
-    def set_pause(cls, pause: bool) -> None:
-        cls._pause = pause
-        for job in cls._jobs.values():
-            job.pause = pause
-
-    @classmethod
-    def quit(cls) -> None:
-        if cls._pool:
-            logger.debug(f"Quitting {len(cls._jobs)} downloads.")
-            for job in cls._jobs.values():
-                job.abort = True
-            cls._pool.waitForDone()
-
-    @classmethod
-    def _threadpool(cls) -> QtCore.QThreadPool:
-        if cls._pool is None:
-            cls._pool = QtCore.QThreadPool()
-            events.DownloadFinished.subscribe(cls._remove_job)
-        return cls._pool
+class DownloadStep(enum.Enum):
+    """Steps of a song download. Media and image steps of the same song run
+    concurrently, the video is transcoded once it has been downloaded, and
+    persisting waits for all of them.
+    """
 
-    @classmethod
-    def _remove_job(cls, event: events.DownloadFinished) -> None:
-        if event.song_id in cls._jobs:
-            del cls._jobs[event.song_id]
+    METADATA = enum.auto()
+    AUDIO = enum.auto()
+    VIDEO = enum.auto()
+    COVER = enum.auto()
+    BACKGROUND = enum.auto()
+    TRANSCODE = enum.auto()
+    PERSIST = enum.auto()
 
 
 @attrs.define(kw_only=True)
@@ -119,12 +75,9 @@ class _Locations:
     def new(
         cls, song: UsdbSong, options: download_options.Options, tempdir: Path
     ) -> _Locations:
-        target = options.path_template.evaluate(song, options.song_dir)
-        if (
-            _current := song.sync_meta.path.parent if song.sync_meta else None
-        ) and utils.path_matches_maybe_with_suffix(_current, target.parent):
-            target = _current / target.name
-        else:
+        _current = song.sync_meta.path.parent if song.sync_meta else None
+        target, in_place = sync_plan.song_target(song, options)
+        if not in_place:
             target = utils.next_unique_directory(target.parent) / target.name
         return cls(current=_current, target=target, tempdir=tempdir)  # pyright: ignore
 
@@ -142,6 +95,14 @@ class _Locations:
         """
         return self._path(self._tempdir, file, ext)
 
+    def staging_path(self, step: str) -> Path:
+        """Path stem in a subdirectory of the temporary download directory private to
+        `step`, so concurrent downloads cannot clash over intermediate files.
+        """
+        parent = self._tempdir.joinpath(step)
+        parent.mkdir(exist_ok=True)
+        return self._path(parent)
+
     def target_path(self, file: str = "", ext: str = "") -> Path:
         """Path to file in the final download directory.
         The final path component is the generic name or the provided file, optionally
@@ -232,6 +193,10 @@ class _Context:
     locations: _Locations
     logger: Log
     out: _TempResourceFiles = attrs.field(factory=_TempResourceFiles)
+    # hash of the USDB data and options the song's files depend on
+    fingerprint: str = ""
+    # download video with audio once and extract the audio from it
+    audio_from_video: bool = attrs.field(init=False, default=False)
 
     def __attrs_post_init__(self) -> None:
         # reuse old resource files unless we acquire new ones later on
@@ -246,6 +211,23 @@ class _Context:
                 if old and old.is_in_sync(current.parent):
                     out.resource = old.resource
                     out.old_fname = old.fname
+        self.audio_from_video = self._can_extract_audio_from_video()
+
+    def _can_extract_audio_from_video(self) -> bool:
+        """True if audio and video would be downloaded from the same resource, and
+        neither is already up to date.
+        """
+        audio, video = self.options.audio_options, self.options.video_options
+        if not (audio and video and audio.from_video):
+            return False
+        if self.txt.meta_tags.is_audio_only():
+            return False
+        resource = next(self.all_video_resources(), None)
+        return (
+            resource is not None
+            and (self.txt.meta_tags.audio or resource) == resource
+            and resource not in (self.out.audio.resource, self.out.video.resource)
+        )
 
     @classmethod
     def new(
@@ -259,7 +241,8 @@ class _Context:
             song.sync_meta = SyncMeta.new(
                 song.song_id, paths.target_path().parent, txt.meta_tags
             )
-        return cls(song, details, options, txt, paths, log)
+        fingerprint = _fingerprint(details, txt, options)
+        return cls(song, details, options, txt, paths, log, fingerprint=fingerprint)
 
     def all_audio_resources(self) -> Iterator[str]:
         if self.txt.meta_tags.audio:
@@ -293,6 +276,21 @@ def _get_usdb_data(
     return details, txt
 
 
+def _fingerprint(
+    details: SongDetails, txt: SongTxt, options: download_options.Options
+) -> str:
+    data = (
+        str(txt),
+        details.artist,
+        details.title,
+        details.uploader,
+        details.cover_url,
+        tuple(details.all_comment_videos()),
+        options,
+    )
+    return hashlib.sha256(repr(data).encode()).hexdigest()
+
+
 def _update_song_with_usdb_data(
     song: UsdbSong, details: SongDetails, txt: SongTxt
 ) -> None:
@@ -311,95 +309,323 @@ def _update_song_with_usdb_data(
     song.creator = txt.headers.creator or ""
 
 
-class _SongLoader(QtCore.QRunnable):
-    """Runnable to create a complete song folder."""
+# number of times a download is attempted before it is considered failed
+_MAX_ATTEMPTS = 3
+# number of audio or video resources tried per song
+_MAX_CANDIDATES = 10
 
-    abort = False
-    pause = False
 
-    def __init__(self, song: UsdbSong, options: download_options.Options) -> None:
-        super().__init__()
+class SongLoader:
+    """Creates a complete song folder, step by step.
+
+    Steps may be run concurrently on different threads. Each one returns the steps
+    that became ready to run after it finished.
+    """
+
+    abort = False
+    # aborted because the app is closing; remains in the persistent queue
+    shutdown = False
+    # failed, but will be retried later
+    retry = False
+
+    def __init__(
+        self, song: UsdbSong, options: download_options.Options, attempts: int = 1
+    ) -> None:
         self.song = song
         self.song_id = song.song_id
         self.options = options
         self.logger = song_logger(self.song_id)
+        self._tempdir: tempfile.TemporaryDirectory | None = None
+        self._ctx: _Context | None = None
+        self._lock = threading.Lock()
+        # steps that are ready or running, and those that have finished
+        self._outstanding: set[DownloadStep] = {DownloadStep.METADATA}
+        self._done: set[DownloadStep] = set()
+        self._error: BaseException | None = None
+        self._attempts = attempts
+        # nothing changed since the last download, so no further steps are needed
+        self._unchanged = False
+        # set once the song has been persisted
+        self._fingerprint: str | None = None
+        # steps during which a request failed transiently, e.g. with a timeout
+        self._failed_steps: set[DownloadStep] = set()
 
     def run(self) -> None:
-        with db.managed_connection(utils.AppPaths.db):
+        """Run all steps on the current thread."""
+        steps = collections.deque([DownloadStep.METADATA])
+        while steps:
+            steps.extend(self.run_step(steps.popleft()))
+
+    def is_finished(self) -> bool:
+        with self._lock:
+            return not self._outstanding
+
+    def step_failed(self, step: DownloadStep) -> bool:
+        """True if a request of the step failed in a way suggesting that hosts are
+        overloaded. Unavailable resources don't count.
+        """
+        with self._lock:
+            return step in self._failed_steps
+
+    def run_step(self, step: DownloadStep) -> list[DownloadStep]:
+        """Run a single step and return the steps that may be run next."""
+        db.ensure_connection(utils.AppPaths.db)
+        error = None
+        transient_failures = HostLimiter.transient_failures()
+        with self._lock:
+            failed = self._error is not None
+        if not failed:
+            try:
+                with TransferProgress.track(self.song_id):
+                    self._run_step_inner(step)
+            except Exception as exception:  # pylint: disable=broad-except
+                error = exception
+        with self._lock:
+            if HostLimiter.transient_failures() > transient_failures:
+                self._failed_steps.add(step)
+            self._outstanding.discard(step)
+            self._done.add(step)
+            if error and not self._error:
+                self._error = error
+            ready = [] if self._error or self._unchanged else self._ready_steps()
+            self._outstanding.update(ready)
+            finished = not self._outstanding
+        if finished:
             try:
-                self.song = self._run_inner()
-            except errors.AbortError:
+                self._finish()
+            except Exception as exception:  # pylint: disable=broad-except
+                self.logger.debug(traceback.format_exc())
+                self.logger.error("Failed to store the outcome of the download.")
+                with self._lock:
+                    self._error = self._error or exception
+                self.cleanup()
+                events.DownloadFinished(self.song_id).post()
+        return ready
+
+    def cleanup(self) -> None:
+        if self._tempdir:
+            self._tempdir.cleanup()
+            self._tempdir = None
+        self._ctx = None
+
+    def _ready_steps(self) -> list[DownloadStep]:
+        """Steps whose dependencies have just been satisfied."""
+        pending = [
+            step
+            for step in DownloadStep
+            if step not in self._done and step not in self._outstanding
+        ]
+        return [s for s in pending if self._dependencies(s) <= self._done]
+
+    def _dependencies(self, step: DownloadStep) -> set[DownloadStep]:
+        match step:
+            case DownloadStep.METADATA:
+                return set()
+            case DownloadStep.AUDIO:
+                if self._ctx and self._ctx.audio_from_video:
+                    return {DownloadStep.METADATA, DownloadStep.VIDEO}
+                return {DownloadStep.METADATA}
+            case DownloadStep.VIDEO | DownloadStep.COVER:
+                return {DownloadStep.METADATA}
+            case DownloadStep.TRANSCODE:
+                return {DownloadStep.METADATA, DownloadStep.VIDEO}
+            case DownloadStep.BACKGROUND:
+                # whether the background is needed may depend on the video
+                if (options := self.options.background_options) and not (
+                    options.even_with_video
+                ):
+                    return {DownloadStep.METADATA, DownloadStep.VIDEO}
+                return {DownloadStep.METADATA}
+            case DownloadStep.PERSIST:
+                return {s for s in DownloadStep if s != DownloadStep.PERSIST}
+            case _ as unreachable:
+                assert_never(unreachable)
+
+    def _finish(self) -> None:
+        """Record the outcome of the download after its last step."""
+        dequeue = True
+        match self._error:
+            case None if self._unchanged:
+                self.song.status = DownloadStatus.NONE
+                self.logger.info("Song is unchanged on USDB and locally. All done!")
+            case None:
+                self.song.status = DownloadStatus.NONE
+                self.logger.info("All done!")
+            case errors.AbortError():
                 self.logger.info("Download aborted by user request.")
                 self.song.status = DownloadStatus.NONE
-            except errors.UsdbLoginError:
+                dequeue = not self.shutdown
+            case errors.UsdbLoginError():
                 self.logger.error("Aborted; download requires login.")
                 self.song.status = DownloadStatus.FAILED
-            except errors.UsdbNotFoundError:
+            case errors.UsdbNotFoundError():
                 self.logger.error("Song has been deleted from USDB.")
-                with db.transaction():
-                    self.song.delete()
+                db.submit_write(self._delete).result()
+                self.cleanup()
                 events.SongDeleted(self.song_id).post()
                 events.DownloadFinished(self.song_id).post()
                 return
-            except Exception:  # pylint: disable=broad-except
-                self.logger.debug(traceback.format_exc())
-                self.logger.error(
-                    "Failed to finish download due to an unexpected error. "
-                    "See debug log for more information."
+            case _:
+                self.logger.debug(
+                    "".join(traceback.format_exception(self._error)).rstrip()
                 )
-                self.song.status = DownloadStatus.FAILED
-            else:
-                self.song.status = DownloadStatus.NONE
-                self.logger.info("All done!")
-            with db.transaction():
-                self.song.upsert()
+                if self._attempts < _MAX_ATTEMPTS:
+                    self.logger.warning(
+                        "Failed to finish download due to an unexpected error. "
+                        f"Retrying later (attempt {self._attempts} of "
+                        f"{_MAX_ATTEMPTS})."
+                    )
+                    self.song.status = DownloadStatus.PENDING
+                    self.retry = True
+                    dequeue = False
+                else:
+                    self.logger.error(
+                        "Failed to finish download due to an unexpected error. "
+                        "See debug log for more information."
+                    )
+                    self.song.status = DownloadStatus.FAILED
+        db.submit_write(functools.partial(self._store, dequeue)).result()
+        self.cleanup()
         events.SongChanged(self.song_id).post()
-        events.DownloadFinished(self.song_id).post()
+        if not self.retry:
+            events.DownloadFinished(self.song_id).post()
 
-    def _run_inner(self) -> UsdbSong:
-        self._check_flags()
-        self.song.status = DownloadStatus.DOWNLOADING
-        with db.transaction():
+    def _store(self, dequeue: bool) -> None:
+        if self._unchanged:
+            self.song.upsert_status()
+        else:
             self.song.upsert()
-        events.SongChanged(self.song_id).post()
-        with tempfile.TemporaryDirectory() as tempdir:
-            ctx = _Context.new(self.song, self.options, Path(tempdir), self.logger)
-            for job in (
-                _maybe_download_audio,
-                _maybe_download_video,
-                _maybe_download_cover,
-                _maybe_download_background,
-                _maybe_write_audio_tags,
-                _maybe_write_video_tags,
-            ):
+        if self._fingerprint and self.song.sync_meta:
+            db.upsert_sync_fingerprint(
+                self.song.sync_meta.sync_meta_id, self._fingerprint
+            )
+        if dequeue:
+            db.dequeue_download(self.song_id)
+        elif self.retry:
+            db.release_download(self.song_id, repr(self._error))
+
+    def _delete(self) -> None:
+        db.dequeue_download(self.song_id)
+        self.song.delete()
+
+    def _run_step_inner(self, step: DownloadStep) -> None:
+        self._check_flags()
+        if step == DownloadStep.METADATA:
+            self.song.status = DownloadStatus.DOWNLOADING
+            # committed before the GUI reloads the song
+            db.submit_write(self.song.upsert_status).result()
+            events.SongChanged(self.song_id).post()
+            # used by the following steps on other threads, removed in `cleanup()`
+            # pylint: disable-next=consider-using-with
+            self._tempdir = tempfile.TemporaryDirectory()
+            self._ctx = _Context.new(
+                self.song, self.options, Path(self._tempdir.name), self.logger
+            )
+            self._unchanged = self._is_unchanged(self._ctx)
+            return
+        assert self._ctx
+        match step:
+            case DownloadStep.AUDIO:
+                _maybe_download_audio(self._ctx)
+            case DownloadStep.VIDEO:
+                _maybe_download_video(self._ctx)
+            case DownloadStep.COVER:
+                _maybe_download_cover(self._ctx)
+            case DownloadStep.BACKGROUND:
+                _maybe_download_background(self._ctx)
+            case DownloadStep.TRANSCODE:
+                _maybe_transcode_video(self._ctx, lambda: self.abort)
+            case DownloadStep.PERSIST:
+                _maybe_write_audio_tags(self._ctx)
                 self._check_flags()
-                job(ctx)
-
-            # last chance to abort before irreversible changes
-            self._check_flags()
-            _cleanup_existing_resources(ctx)
-            # only here so filenames in header are up-to-date
-            _maybe_write_txt(ctx)
-            ctx.locations.move_to_target_folder()
-            _persist_tempfiles(ctx)
+                _maybe_write_video_tags(self._ctx)
+                self._persist()
+            case _ as unreachable:
+                assert_never(unreachable)
+
+    def _persist(self) -> None:
+        assert self._ctx
+        ctx = self._ctx
+        # last chance to abort before irreversible changes
+        self._check_flags()
+        _cleanup_existing_resources(ctx)
+        # only here so filenames in header are up-to-date
+        _maybe_write_txt(ctx)
+        ctx.locations.move_to_target_folder()
+        _persist_tempfiles(ctx)
         _write_sync_meta(ctx)
         hooks.SongLoaderDidFinish.call(ctx.song)
-        return ctx.song
+        self.song = ctx.song
+        self._fingerprint = ctx.fingerprint
+
+    def _is_unchanged(self, ctx: _Context) -> bool:
+        """True if neither the data on USDB nor the options nor the local files
+        changed since the song was last downloaded.
+        """
+        if not (meta := self.song.sync_meta):
+            return False
+        if db.get_sync_fingerprint(meta.sync_meta_id) != ctx.fingerprint:
+            return False
+        fallbacks = sync_plan.Fallbacks(
+            comment_videos=any(True for _ in ctx.details.all_comment_videos()),
+            usdb_cover=bool(ctx.details.cover_url),
+        )
+        return sync_plan.plan_song(ctx.song, ctx.options, fallbacks).is_noop()
 
     def _check_flags(self) -> None:
         if self.abort:
             raise errors.AbortError
-        if self.pause:
-            while self.pause:
-                time.sleep(0.5)
-                if self.abort:
-                    raise errors.AbortError
+
+
+def _ranked_resources(
+    ctx: _Context, resources: Iterator[str], format_spec: str, current: str | None
+) -> list[str]:
+    """The first few candidate resources, best first. If there are several, they are
+    probed concurrently, so unavailable ones can be dropped. The first one, usually
+    the resource from the meta tags the txt is timed to, is kept first unless it is
+    too short; the others are ordered by how well their duration fits the song.
+    """
+    candidates = list(dict.fromkeys(islice(resources, _MAX_CANDIDATES)))
+    if candidates and candidates[0] == current:
+        return candidates
+    primary = candidates[0] if candidates else None
+    candidates = [r for r in candidates if not _is_dead_resource(r, ctx.logger)]
+    if len(candidates) < 2:
+        return candidates
+    min_secs = ctx.txt.minimum_song_secs()
+    results = resource_dl.probe_resources(
+        candidates, format_spec, ctx.options.browser, ctx.logger
+    )
+    ranked: list[str] = []
+    # the first resource is trusted unless it is too short
+    if (first := results[0]).resource == primary and first.is_long_enough(min_secs):
+        ranked, results = [first.resource], results[1:]
+    for result in sorted(results, key=lambda r: r.rank(min_secs)):
+        if result.available is False:
+            ctx.logger.debug(f"Skipping unavailable resource: {result.error}")
+        else:
+            ranked.append(result.resource)
+    ctx.logger.debug(f"Resources ranked by availability and duration: {ranked}")
+    return ranked
+
+
+def _is_dead_resource(resource: str, log: Log) -> bool:
+    if (url := video_url_from_resource(resource)) and (
+        dead := dead_resources.lookup(url)
+    ):
+        log.debug(f"Skipping resource '{resource}', which is {dead.reason}.")
+        return True
+    return False
 
 
 def _maybe_download_audio(ctx: _Context) -> None:
     if not (options := ctx.options.audio_options):
         return
-    for resource in islice(ctx.all_audio_resources(), 10):
+    if ctx.audio_from_video and ctx.out.audio.new_fname:
+        return
+    for resource in _ranked_resources(
+        ctx, ctx.all_audio_resources(), options.ytdl_format(), ctx.out.audio.resource
+    ):
         if ctx.out.audio.resource == resource:
             ctx.logger.info("Audio resource is unchanged.")
             return
@@ -407,11 +633,14 @@ def _maybe_download_audio(ctx: _Context) -> None:
             resource,
             options,
             ctx.options.browser,
-            ctx.locations.temp_path(),
+            staging := ctx.locations.staging_path("audio"),
             ctx.logger,
         ):
             ctx.out.audio.resource = resource
             ctx.out.audio.new_fname = ctx.locations.filename(ext=ext)
+            staging.with_name(ctx.out.audio.new_fname).replace(
+                ctx.locations.temp_path(ctx.out.audio.new_fname)
+            )
             ctx.logger.info("Success! Downloaded audio.")
             return
     keep = " Keeping last resource." if ctx.out.audio.resource else ""
@@ -422,7 +651,11 @@ def _maybe_download_audio(ctx: _Context) -> None:
 def _maybe_download_video(ctx: _Context) -> None:
     if not (options := ctx.options.video_options) or ctx.txt.meta_tags.is_audio_only():
         return
-    for resource in islice(ctx.all_video_resources(), 10):
+    if ctx.audio_from_video and _maybe_download_audio_and_video(ctx):
+        return
+    for resource in _ranked_resources(
+        ctx, ctx.all_video_resources(), options.ytdl_format(), ctx.out.video.resource
+    ):
         if ctx.out.video.resource == resource:
             ctx.logger.info("Video resource is unchanged.")
             return
@@ -430,17 +663,60 @@ def _maybe_download_video(ctx: _Context) -> None:
             resource,
             options,
             ctx.options.browser,
-            ctx.locations.temp_path(),
+            staging := ctx.locations.staging_path("video"),
             ctx.logger,
         ):
             ctx.out.video.resource = resource
             ctx.out.video.new_fname = ctx.locations.filename(ext=ext)
+            staging.with_name(ctx.out.video.new_fname).replace(
+                ctx.locations.temp_path(ctx.out.video.new_fname)
+            )
             ctx.logger.info("Success! Downloaded video.")
             return
     keep = " Keeping last resource." if ctx.out.video.resource else ""
     ctx.logger.error(f"Failed to download video!{keep}")
 
 
+def _maybe_transcode_video(ctx: _Context, is_cancelled: Callable[[], bool]) -> None:
+    if not (options := ctx.options.video_options) or not options.reencode_format:
+        return
+    # kept videos are left as they are
+    if not ctx.out.video.new_fname:
+        return
+    path = ctx.locations.temp_path(ctx.out.video.new_fname)
+    if not (
+        out := resource_dl.transcode_video(
+            path, options.reencode_format, ctx.logger, is_cancelled
+        )
+    ):
+        ctx.logger.error("Failed to reencode video! Keeping the original one.")
+        return
+    ctx.out.video.new_fname = out.name
+    ctx.logger.info("Success! Reencoded video.")
+
+
+def _maybe_download_audio_and_video(ctx: _Context) -> bool:
+    """True if audio and video were both created from a single download."""
+    assert ctx.options.audio_options and ctx.options.video_options
+    resource = next(ctx.all_video_resources())
+    if exts := resource_dl.download_audio_and_video(
+        resource,
+        ctx.options,
+        staging := ctx.locations.staging_path("video"),
+        ctx.logger,
+    ):
+        for out, ext in zip((ctx.out.audio, ctx.out.video), exts):
+            out.resource = resource
+            out.new_fname = ctx.locations.filename(ext=ext)
+            staging.with_name(out.new_fname).replace(
+                ctx.locations.temp_path(out.new_fname)
+            )
+        ctx.logger.info("Success! Downloaded video and extracted audio.")
+        return True
+    ctx.logger.warning("Failed to extract audio from video. Downloading separately.")
+    return False
+
+
 def _maybe_download_cover(ctx: _Context) -> None:
     if not ctx.options.cover:
         return
@@ -501,9 +777,9 @@ def _maybe_download_background(ctx: _Context) -> None:
         ctx.out.background.resource = url
         ctx.out.background.new_fname = path.name
         ctx.logger.info("Success! Downloaded background.")
-    else:
-        keep = " Keeping last resource." if ctx.out.cover.resource else ""
-        ctx.logger.error(f"Failed to download background!{keep}")
+        return
+    keep = " Keeping last resource." if ctx.out.cover.resource else ""
+    ctx.logger.error(f"Failed to download background!{keep}")
 
 
 def _maybe_write_txt(ctx: _Context) -> None:
@@ -585,22 +861,22 @@ def _maybe_write_audio_tags(ctx: _Context) -> None:
     if not (path_resource := ctx.out.audio.path_and_resource(ctx.locations, temp=True)):
         return
     path, resource = path_resource
+    cover = _cover(ctx, options.embed_artwork)
     try:
         match path.suffix:
             case ".m4a":
-                _write_m4a_mp4_tags(path, resource, ctx, options.embed_artwork)
+                resource_tags.write_m4a_mp4_tags(
+                    path, resource, ctx.txt, _artwork(ctx, options.embed_artwork)
+                )
             case ".mp3":
-                _write_mp3_tags(path, resource, ctx, options.embed_artwork)
+                resource_tags.write_mp3_tags(path, resource, ctx.txt, cover)
             case ".ogg":
-                _write_ogg_tags(
-                    mutagen.oggvorbis.OggVorbis(path),
-                    resource,
-                    ctx,
-                    options.embed_artwork,
+                resource_tags.write_ogg_tags(
+                    mutagen.oggvorbis.OggVorbis(path), resource, ctx.txt, cover
                 )
             case ".opus":
-                _write_ogg_tags(
-                    mutagen.oggopus.OggOpus(path), resource, ctx, options.embed_artwork
+                resource_tags.write_ogg_tags(
+                    mutagen.oggopus.OggOpus(path), resource, ctx.txt, cover
                 )
             case other:
                 ctx.logger.debug(f"Audio tags not supported for suffix '{other}'.")
@@ -621,7 +897,9 @@ def _maybe_write_video_tags(ctx: _Context) -> None:
     try:
         match path.suffix:
             case ".mp4":
-                _write_m4a_mp4_tags(path, resource, ctx, options.embed_artwork)
+                resource_tags.write_m4a_mp4_tags(
+                    path, resource, ctx.txt, _artwork(ctx, options.embed_artwork)
+                )
             case other:
                 ctx.logger.debug(f"Video tags not supported for suffix '{other}'.")
                 return
@@ -632,114 +910,22 @@ def _maybe_write_video_tags(ctx: _Context) -> None:
         ctx.logger.debug(f"Video tags written to file '{path}'.")
 
 
-def _write_m4a_mp4_tags(
-    path: Path, resource: str, ctx: _Context, embed_artwork: bool
-) -> None:
-    tags = mutagen.mp4.MP4Tags()
-
-    tags["\xa9ART"] = ctx.txt.headers.artist
-    tags["\xa9nam"] = ctx.txt.headers.title
-    if ctx.txt.headers.genre:
-        tags["\xa9gen"] = ctx.txt.headers.genre
-    if ctx.txt.headers.year:
-        tags["\xa9day"] = ctx.txt.headers.year
-    tags["\xa9lyr"] = ctx.txt.unsynchronized_lyrics()
-    tags["\xa9cmt"] = resource
-
-    if embed_artwork:
-        tags["covr"] = [
-            mutagen.mp4.MP4Cover(
-                image.read_bytes(), imageformat=mutagen.mp4.MP4Cover.FORMAT_JPEG
-            )
-            for image in (
-                ctx.out.cover.path(ctx.locations, temp=True),
-                ctx.out.background.path(ctx.locations, temp=True),
-            )
-            if image
-        ]
-
-    tags.save(path)
+def _cover(ctx: _Context, embed_artwork: bool) -> tuple[Path, str] | None:
+    """The cover to embed into media files and its resource, if any."""
+    if not embed_artwork:
+        return None
+    return ctx.out.cover.path_and_resource(ctx.locations, temp=True)
 
 
-def _write_mp3_tags(
-    path: Path, resource: str, ctx: _Context, embed_artwork: bool
-) -> None:
-    tags = id3.ID3()
-
-    lang = ISO_639_2B_LANGUAGE_CODES.get(ctx.txt.headers.main_language(), "und")
-    tags["TPE1"] = id3.TPE1(encoding=id3.Encoding.UTF8, text=ctx.txt.headers.artist)
-    tags["TIT2"] = id3.TIT2(encoding=id3.Encoding.UTF8, text=ctx.txt.headers.title)
-    tags["TLAN"] = id3.TLAN(encoding=id3.Encoding.UTF8, text=lang)
-    if genre := ctx.txt.headers.genre:
-        tags["TCON"] = id3.TCON(encoding=id3.Encoding.UTF8, text=genre)
-    if year := ctx.txt.headers.year:
-        tags["TDRC"] = id3.TDRC(encoding=id3.Encoding.UTF8, text=year)
-    tags[f"USLT::'{lang}'"] = id3.USLT(
-        encoding=id3.Encoding.UTF8,
-        lang=lang,
-        desc="Lyrics",
-        text=ctx.txt.unsynchronized_lyrics(),
-    )
-    tags["SYLT"] = id3.SYLT(
-        encoding=id3.Encoding.UTF8,
-        lang=lang,
-        format=2,  # milliseconds as units
-        type=1,  # lyrics
-        text=ctx.txt.synchronized_lyrics(),
+def _artwork(ctx: _Context, embed_artwork: bool) -> list[Path]:
+    """The cover and background to embed into media files, if any."""
+    if not embed_artwork:
+        return []
+    images = (
+        ctx.out.cover.path(ctx.locations, temp=True),
+        ctx.out.background.path(ctx.locations, temp=True),
     )
-    tags["COMM"] = id3.COMM(
-        encoding=id3.Encoding.UTF8, lang="eng", desc="Audio Source", text=resource
-    )
-
-    if embed_artwork and (
-        path_resource := ctx.out.cover.path_and_resource(ctx.locations, temp=True)
-    ):
-        tags.add(
-            id3.APIC(
-                encoding=id3.Encoding.UTF8,
-                mime="image/jpeg",
-                type=id3.PictureType.COVER_FRONT,
-                desc=f"Source: {path_resource[1]}",
-                data=path_resource[0].read_bytes(),
-            )
-        )
-
-    tags.save(path)
-
-
-def _write_ogg_tags(
-    audio: mutagen.ogg.OggFileType, resource: str, ctx: _Context, embed_artwork: bool
-) -> None:
-    # Set basic tags
-    audio["artist"] = ctx.txt.headers.artist
-    audio["title"] = ctx.txt.headers.title
-    lang = ISO_639_2B_LANGUAGE_CODES.get(ctx.txt.headers.main_language(), "und")
-    audio["language"] = lang
-    if genre := ctx.txt.headers.genre:
-        audio["genre"] = genre
-    if year := ctx.txt.headers.year:
-        audio["date"] = year
-    audio["lyrics"] = ctx.txt.unsynchronized_lyrics()
-    audio["comment"] = resource
-
-    if embed_artwork and (cover_path := ctx.out.cover.path(ctx.locations, temp=True)):
-        picture = Picture()
-        with cover_path.open("rb") as file:
-            picture.data = file.read()
-        with Image.open(cover_path) as image:
-            picture.width, picture.height = image.size
-        picture.type = 3  # "Cover (front)"
-        picture.desc = "Cover art"
-        picture.mime = "image/jpeg"
-        picture.depth = 24
-
-        picture_data = picture.write()
-        encoded_data = base64.b64encode(picture_data)
-        vcomment_value = encoded_data.decode("ascii")
-
-        audio["metadata_block_picture"] = [vcomment_value]
-
-    audio.save()
+    return [image for image in images if image]
 
 
 def _cleanup_existing_resources(ctx: _Context) -> None:
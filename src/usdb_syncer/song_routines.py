@@ -3,7 +3,7 @@
 import json
 import os
 from pathlib import Path
-from typing import Generator
+from typing import Generator, Iterable
 
 import send2trash
 from requests import Session
@@ -18,8 +18,8 @@ from usdb_syncer import (
     song_txt,
     utils,
 )
-from usdb_syncer.logger import error_logger, logger
-from usdb_syncer.song_loader import DownloadManager
+from usdb_syncer.download_manager import DownloadManager
+from usdb_syncer.logger import error_logger, logger, song_logger
 from usdb_syncer.sync_meta import SyncMeta
 from usdb_syncer.usdb_scraper import get_usdb_available_songs
 from usdb_syncer.usdb_song import UsdbSong, UsdbSongEncoder
@@ -30,19 +30,65 @@ def load_available_songs(force_reload: bool, session: Session | None = None) ->
     if force_reload:
         max_skip_id = SongId(0)
         UsdbSong.delete_all()
-    elif (max_skip_id := db.max_usdb_song_id()) == 0 and (songs := load_cached_songs()):
+    else:
+        max_skip_id = max_known_song_id()
+    store_new_songs(fetch_new_songs(max_skip_id, session))
+
+
+def max_known_song_id() -> SongId:
+    """The highest id of all known songs. If there are none yet, the cached song list
+    is loaded first.
+    """
+    if (max_skip_id := db.max_usdb_song_id()) == 0 and (songs := load_cached_songs()):
         UsdbSong.upsert_many(songs)
         max_skip_id = db.max_usdb_song_id()
+    return max_skip_id
+
+
+def fetch_new_songs(
+    max_skip_id: SongId, session: Session | None = None
+) -> list[UsdbSong]:
+    """The songs on USDB with a higher id than `max_skip_id`, or none if not logged
+    in. Doesn't access the database, so it need not block other connections.
+    """
     try:
-        songs = get_usdb_available_songs(max_skip_id, session=session)
+        return get_usdb_available_songs(max_skip_id, session=session)
     except errors.UsdbLoginError:
         logger.debug("Skipping fetching new songs as there is no login.")
-        return
+        return []
+
+
+def store_new_songs(songs: list[UsdbSong]) -> None:
+    """Store fetched songs and download those matching a subscribed search."""
     if songs:
         UsdbSong.upsert_many(songs)
         _download_subscribed_songs(songs)
 
 
+def download_songs(song_ids: Iterable[SongId]) -> list[UsdbSong]:
+    """Queue the given songs for download unless they are pinned or already being
+    downloaded. Returns the queued songs.
+    """
+    to_download: list[UsdbSong] = []
+    for song_id in song_ids:
+        if not (song := UsdbSong.get(song_id)):
+            song_logger(song_id).warning("Song is not available on USDB.")
+            continue
+        if song.sync_meta and song.sync_meta.pinned:
+            song_logger(song.song_id).info("Not downloading song as it is pinned.")
+            continue
+        if song.status.can_be_downloaded():
+            song.status = db.DownloadStatus.PENDING
+            with db.transaction():
+                song.upsert()
+            events.SongChanged(song.song_id).post()
+            to_download.append(song)
+    if to_download:
+        events.DownloadsRequested(len(to_download)).post()
+        DownloadManager.download(to_download)
+    return to_download
+
+
 def _download_subscribed_songs(songs: list[UsdbSong]) -> None:
     if not settings.ffmpeg_is_available():
         return
@@ -0,0 +1,163 @@
+"""Computes the work a sync would do for songs, based only on the database and the
+file system, so nothing is downloaded and no state is changed.
+
+Changes to a song on USDB can only be detected by fetching it, so songs whose
+local copy is complete are planned as unchanged, even if the txt was updated
+online. Likewise, the resources a download falls back to if the meta tags don't
+reference one, like videos from the comments, must be passed in if known.
+"""
+
+from __future__ import annotations
+
+import enum
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import attrs
+
+from usdb_syncer import SongId, resource_dl, utils
+from usdb_syncer.db import ResourceFileKind
+from usdb_syncer.download_options import Options
+from usdb_syncer.logger import song_logger
+from usdb_syncer.sync_meta import ResourceFile, SyncMeta
+from usdb_syncer.usdb_song import UsdbSong
+
+
+class SyncReason(enum.Enum):
+    """Why a song would be downloaded."""
+
+    # there is no local copy of the song
+    NEW = "new"
+    # an enabled resource file, which there is a resource for, was never downloaded
+    FILE_MISSING = "file_missing"
+    # a resource file was modified or deleted since it was downloaded
+    FILE_CHANGED = "file_changed"
+    # the meta tags reference a different resource than the downloaded one
+    RESOURCE_CHANGED = "resource_changed"
+    # the song folder does not match the path template
+    PATH_CHANGED = "path_changed"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+@attrs.define
+class SongPlan:
+    """The work a sync would do for a single song."""
+
+    song_id: SongId
+    # folder according to the path template, without a suffix to make it unique
+    target: Path
+    pinned: bool = False
+    reasons: set[SyncReason] = attrs.field(factory=set)
+    # resource files that would be downloaded again
+    fetched: list[ResourceFileKind] = attrs.field(factory=list)
+    # resource files that are in sync and would be kept
+    reused: list[ResourceFileKind] = attrs.field(factory=list)
+    # fetched resource files that are available in the media cache
+    cached: list[ResourceFileKind] = attrs.field(factory=list)
+
+    def is_noop(self) -> bool:
+        return self.pinned or not self.reasons
+
+
+@attrs.define(frozen=True)
+class Fallbacks:
+    """Resources a download uses if the meta tags don't reference any."""
+
+    # videos linked in the comments on USDB
+    comment_videos: bool = False
+    # the cover on USDB
+    usdb_cover: bool = False
+
+
+def song_target(song: UsdbSong, options: Options) -> tuple[Path, bool]:
+    """The path of the song according to the path template, including the filename
+    stem, and whether the song is already in the right place.
+
+    The current folder of a song is kept if it matches the template except for a
+    suffix making it unique.
+    """
+    target = options.path_template.evaluate(song, options.song_dir)
+    if (
+        current := song.sync_meta.path.parent if song.sync_meta else None
+    ) and utils.path_matches_maybe_with_suffix(current, target.parent):
+        return current / target.name, True
+    return target, False
+
+
+def plan_songs(song_ids: Iterable[SongId], options: Options) -> Iterator[SongPlan]:
+    """Plans for all of `song_ids` which are in the database."""
+    for song_id in song_ids:
+        if song := UsdbSong.get(song_id):
+            yield plan_song(song, options)
+
+
+def plan_song(
+    song: UsdbSong, options: Options, fallbacks: Fallbacks = Fallbacks()
+) -> SongPlan:
+    target, in_place = song_target(song, options)
+    plan = SongPlan(song.song_id, target.parent)
+    if not (meta := song.sync_meta):
+        plan.reasons.add(SyncReason.NEW)
+        return plan
+    if meta.pinned:
+        plan.pinned = True
+        return plan
+    if not in_place:
+        plan.reasons.add(SyncReason.PATH_CHANGED)
+    for kind, old, expected in _wanted_resource_files(meta, options, fallbacks):
+        if old is None:
+            reason = SyncReason.FILE_MISSING
+        elif not old.is_in_sync(meta.path.parent):
+            reason = SyncReason.FILE_CHANGED
+        elif expected is not None and old.resource != expected:
+            reason = SyncReason.RESOURCE_CHANGED
+        else:
+            plan.reused.append(kind)
+            continue
+        plan.reasons.add(reason)
+        plan.fetched.append(kind)
+        if expected is not None and _is_cached(kind, expected, options):
+            plan.cached.append(kind)
+    return plan
+
+
+def _wanted_resource_files(
+    meta: SyncMeta, options: Options, fallbacks: Fallbacks
+) -> Iterator[tuple[ResourceFileKind, ResourceFile | None, str | None]]:
+    """Kind, current file and expected resource of all resource files that would be
+    downloaded with the given options. The expected resource is None if it cannot be
+    told without fetching the song. Missing files are skipped if there is nothing to
+    download them from.
+    """
+    tags = meta.meta_tags
+    logger = song_logger(meta.song_id)
+    if options.txt_options:
+        yield ResourceFileKind.TXT, meta.txt, None
+    if options.audio_options:
+        audio = tags.audio or tags.video
+        if audio or meta.audio or fallbacks.comment_videos:
+            yield ResourceFileKind.AUDIO, meta.audio, audio
+    if options.video_options and not tags.is_audio_only():
+        if tags.video or meta.video or fallbacks.comment_videos:
+            yield ResourceFileKind.VIDEO, meta.video, tags.video
+    if options.cover:
+        cover = tags.cover.source_url(logger) if tags.cover else None
+        if cover or meta.cover or fallbacks.usdb_cover:
+            yield ResourceFileKind.COVER, meta.cover, cover
+    if (bg_options := options.background_options) and bg_options.download_background(
+        bool(meta.video)
+    ):
+        # without a background tag there is nothing to download
+        if tags.background or meta.background:
+            background = tags.background.source_url(logger) if tags.background else None
+            yield ResourceFileKind.BACKGROUND, meta.background, background
+
+
+def _is_cached(kind: ResourceFileKind, resource: str, options: Options) -> bool:
+    if kind == ResourceFileKind.AUDIO and options.audio_options:
+        return resource_dl.audio_is_cached(resource, options.audio_options)
+    if kind == ResourceFileKind.VIDEO and options.video_options:
+        return resource_dl.video_is_cached(resource, options.video_options)
+    return False
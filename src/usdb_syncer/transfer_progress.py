@@ -0,0 +1,175 @@
+"""Byte-level progress of media downloads across all workers.
+
+Workers report the bytes transferred by yt-dlp and image downloads for the song
+they are processing. The per-song and total counts, the current throughput and an
+estimate of the remaining time are posted as `DownloadProgress` events, which are
+throttled, so the GUI is not flooded with one event per chunk.
+"""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import threading
+import time
+from typing import Any, Iterator
+
+import attrs
+
+from usdb_syncer import SongId, events
+from usdb_syncer.logger import logger
+from usdb_syncer.utils import format_bytes
+
+# minimum time between two progress events
+_INTERVAL_SECS = 0.5
+# the throughput is averaged over this many seconds
+_WINDOW_SECS = 5.0
+# songs without any progress for this long are reported as stalled
+_STALL_SECS = 30.0
+
+
+@attrs.define
+class _Transfer:
+    done: int
+    # None if unknown
+    total: int | None
+    updated_at: float
+
+
+@attrs.define
+class TransferStats:
+    """Counters about all transfers since the app was started."""
+
+    transferred: int = 0
+    # seconds during which any transfer was running
+    active_secs: float = 0.0
+
+    def __str__(self) -> str:
+        rate = self.transferred / self.active_secs if self.active_secs else 0.0
+        return (
+            f"{format_bytes(self.transferred)} in {self.active_secs:.1f}s "
+            f"(avg {format_bytes(int(rate))}/s)"
+        )
+
+
+class TransferProgress:
+    """Singleton aggregating the progress of all transfers."""
+
+    _local = threading.local()
+    _songs: dict[SongId, dict[str, _Transfer]] = {}
+    # (time, bytes transferred in total)
+    _samples: collections.deque[tuple[float, int]] = collections.deque()
+    _stats = TransferStats()
+    _last_post = 0.0
+    _lock = threading.Lock()
+
+    @classmethod
+    @contextlib.contextmanager
+    def track(cls, song_id: SongId) -> Iterator[None]:
+        """Attribute transfers reported on the current thread to `song_id`."""
+        cls._local.song_id = song_id
+        try:
+            yield
+        finally:
+            cls._local.song_id = None
+
+    @classmethod
+    def update(cls, key: str, done: int, total: int | None) -> None:
+        """Report that `done` of `total` bytes of the transfer identified by `key`
+        have been received. Ignored if the thread is not tracking a song.
+        """
+        if (song_id := getattr(cls._local, "song_id", None)) is None:
+            return
+        now = time.monotonic()
+        with cls._lock:
+            transfers = cls._songs.setdefault(song_id, {})
+            previous = transfers.get(key)
+            # a restarted transfer counts again
+            delta = done - previous.done if previous and done >= previous.done else done
+            transfers[key] = _Transfer(done, total, now)
+            cls._record(now, delta)
+            if now - cls._last_post < _INTERVAL_SECS:
+                return
+            cls._last_post = now
+            event = cls._event(now)
+        event.post()
+
+    @classmethod
+    def ytdl_hook(cls, progress: dict[str, Any]) -> None:
+        """Progress hook for yt-dlp."""
+        if progress.get("status") not in ("downloading", "finished"):
+            return
+        key = progress.get("filename") or ""
+        total = progress.get("total_bytes") or progress.get("total_bytes_estimate")
+        cls.update(
+            key, progress.get("downloaded_bytes") or 0, int(total) if total else None
+        )
+
+    @classmethod
+    def finish(cls, song_id: SongId) -> None:
+        """Forget the transfers of `song_id`, e.g. because its download finished."""
+        with cls._lock:
+            if cls._songs.pop(song_id, None) is None:
+                return
+            now = time.monotonic()
+            cls._last_post = now
+            event = cls._event(now)
+        event.post()
+
+    @classmethod
+    def stats(cls) -> TransferStats:
+        with cls._lock:
+            return attrs.evolve(cls._stats)
+
+    @classmethod
+    def log_stats(cls) -> None:
+        if (stats := cls.stats()).transferred:
+            logger.debug(f"Media downloaded: {stats}")
+
+    @classmethod
+    def reset(cls) -> None:
+        """Drop all state."""
+        with cls._lock:
+            cls._songs = {}
+            cls._samples = collections.deque()
+            cls._stats = TransferStats()
+            cls._last_post = 0.0
+
+    @classmethod
+    def _record(cls, now: float, delta: int) -> None:
+        if cls._samples:
+            last_time = cls._samples[-1][0]
+            # pauses between transfers don't count
+            cls._stats.active_secs += min(now - last_time, _WINDOW_SECS)
+        cls._stats.transferred += delta
+        cls._samples.append((now, cls._stats.transferred))
+        while len(cls._samples) > 1 and cls._samples[0][0] < now - _WINDOW_SECS:
+            cls._samples.popleft()
+
+    @classmethod
+    def _event(cls, now: float) -> events.DownloadProgress:
+        songs = {}
+        stalled = []
+        for song_id, transfers in cls._songs.items():
+            done = sum(t.done for t in transfers.values())
+            # unknown sizes are estimated by what has been received so far
+            total = sum(max(t.total or t.done, t.done) for t in transfers.values())
+            songs[song_id] = (done, total)
+            if done < total and all(
+                now - t.updated_at > _STALL_SECS for t in transfers.values()
+            ):
+                stalled.append(song_id)
+        done = sum(song[0] for song in songs.values())
+        total = sum(song[1] for song in songs.values())
+        bytes_per_sec = 0.0
+        if cls._samples and (secs := now - cls._samples[0][0]) > 0:
+            bytes_per_sec = (cls._stats.transferred - cls._samples[0][1]) / secs
+        eta_secs = (total - done) / bytes_per_sec if bytes_per_sec > 0 else None
+        return events.DownloadProgress(
+            songs=songs,
+            done=done,
+            total=total,
+            bytes_per_sec=bytes_per_sec,
+            eta_secs=eta_secs,
+            stalled=stalled,
+        )
@@ -21,6 +21,8 @@ from usdb_syncer.constants import (
     UsdbStringsFrench,
     UsdbStringsGerman,
 )
+from usdb_syncer.cookie_cache import CookieCache
+from usdb_syncer.host_limiter import HostLimiter
 from usdb_syncer.logger import Log, song_logger
 from usdb_syncer.usdb_song import UsdbSong
 from usdb_syncer.utils import extract_youtube_id, normalize
@@ -66,9 +68,8 @@ def establish_usdb_login(session: Session) -> bool:
 
 def new_session_with_cookies(browser: settings.Browser) -> Session:
     session = Session()
-    if cookies := browser.cookies():
-        for cookie in cookies:
-            session.cookies.set_cookie(cookie)
+    for cookie in CookieCache.cookies(browser, Usdb.DOMAIN):
+        session.cookies.set_cookie(cookie)
     return session
 
 
@@ -86,7 +87,9 @@ class SessionManager:
             cls._connecting = True
             try:
                 cls._session = new_session_with_cookies(settings.get_browser())
-                establish_usdb_login(cls._session)
+                if not establish_usdb_login(cls._session):
+                    # the cookies may be outdated
+                    CookieCache.invalidate()
             finally:
                 cls._connecting = False
         return cls._session
@@ -103,7 +106,8 @@ class SessionManager:
 
 
 def get_logged_in_usdb_user(session: Session) -> str | None:
-    response = session.get(Usdb.BASE_URL, timeout=10, params={"link": "profil"})
+    with HostLimiter.limit(Usdb.BASE_URL):
+        response = session.get(Usdb.BASE_URL, timeout=10, params={"link": "profil"})
     response.raise_for_status()
     if match := WELCOME_REGEX.search(response.text):
         return match.group(2)
@@ -112,11 +116,12 @@ def get_logged_in_usdb_user(session: Session) -> str | None:
 
 def login_to_usdb(session: Session, user: str, password: str) -> bool:
     """True if success."""
-    response = session.post(
-        Usdb.BASE_URL,
-        timeout=10,
-        data={"user": user, "pass": password, "login": "Login"},
-    )
+    with HostLimiter.limit(Usdb.BASE_URL):
+        response = session.post(
+            Usdb.BASE_URL,
+            timeout=10,
+            data={"user": user, "pass": password, "login": "Login"},
+        )
     response.raise_for_status()
     return UsdbStrings.LOGIN_INVALID not in response.text
 
@@ -247,17 +252,18 @@ def _get_usdb_page_inner(
 ) -> str:
     session = session or SessionManager.session()
     url = Usdb.BASE_URL + rel_url
-    match method:
-        case RequestMethod.GET:
-            _logger.debug(f"Get request for {url}")
-            response = session.get(url, headers=headers, params=params, timeout=10)
-        case RequestMethod.POST:
-            _logger.debug(f"Post request for {url}")
-            response = session.post(
-                url, headers=headers, data=payload, params=params, timeout=10
-            )
-        case _ as unreachable:
-            assert_never(unreachable)
+    with HostLimiter.limit(url):
+        match method:
+            case RequestMethod.GET:
+                _logger.debug(f"Get request for {url}")
+                response = session.get(url, headers=headers, params=params, timeout=10)
+            case RequestMethod.POST:
+                _logger.debug(f"Post request for {url}")
+                response = session.post(
+                    url, headers=headers, data=payload, params=params, timeout=10
+                )
+            case _ as unreachable:
+                assert_never(unreachable)
     response.raise_for_status()
     response.encoding = "utf-8"
     if UsdbStrings.NOT_LOGGED_IN in (page := normalize(response.text)):
@@ -130,6 +130,11 @@ class UsdbSong:
             self.sync_meta.upsert()
         _UsdbSongCache.update(self)
 
+    def upsert_status(self) -> None:
+        """Store only the state of this session, like the download status."""
+        db.upsert_session_usdb_song(self.db_params())
+        _UsdbSongCache.update(self)
+
     @classmethod
     def upsert_many(cls, songs: list[UsdbSong]) -> None:
         db.upsert_usdb_songs(song.db_params() for song in songs)
@@ -53,6 +53,7 @@ class AppPaths:
 
     log = Path(_app_dirs.user_data_dir, "usdb_syncer.log")
     song_list = Path(_app_dirs.user_cache_dir, "available_songs.json")
+    media_cache = Path(_app_dirs.user_cache_dir, "media")
     root = _root()
     fallback_song_list = Path(root, "data", "song_list.json")
     profile = Path(root, "usdb_syncer.prof")
@@ -236,6 +237,16 @@ def get_mtime(path: Path) -> int:
     return int(os.path.getmtime(path) * 1_000_000)
 
 
+def format_bytes(count: int) -> str:
+    """Human-readable size, e.g. 1.5 MB."""
+    size = float(count)
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.2f} GB"
+
+
 @functools.cache
 def format_timestamp(micros: int) -> str:
     return datetime.datetime.fromtimestamp(micros / 1_000_000).strftime(
@@ -0,0 +1,169 @@
+"""Persistent cache of yt-dlp extraction results per resource URL.
+
+Resources for which no format matches are skipped until their entry expires.
+For resources which were downloaded before, the previously chosen format is tried
+first, so the format selection doesn't have to be repeated. Resources which
+required cookies because of an age restriction are downloaded with cookies right
+away, instead of failing without them first.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import threading
+import time
+from typing import Any
+
+import attrs
+from yt_dlp.utils import DownloadError, ExtractorError, YoutubeDLError
+
+from usdb_syncer import db, dead_resources
+from usdb_syncer.logger import logger
+
+# successful extractions are reused for this long
+_INFO_TTL_SECS = 30 * 24 * 60 * 60
+# failed resources are retried after this long
+_ERROR_TTL_SECS = 3 * 24 * 60 * 60
+
+
+@attrs.define
+class AgeGateStats:
+    """Counters about downloads of age-restricted resources."""
+
+    # attempts without cookies skipped, because the resource was known to need them
+    skipped: int = 0
+    # attempts without cookies which failed because of an age restriction
+    failed: int = 0
+    # total seconds spent on failed attempts
+    failed_secs: float = 0.0
+
+    def saved_secs(self) -> float:
+        """Estimated time the skipped attempts would have taken."""
+        return self.skipped * self.failed_secs / self.failed if self.failed else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.skipped} attempts without cookies skipped "
+            f"(~{self.saved_secs():.1f}s saved), {self.failed} failed "
+            f"({self.failed_secs:.1f}s)"
+        )
+
+
+_age_gate_stats = AgeGateStats()
+_stats_lock = threading.Lock()
+
+
+def lookup(url: str, format_spec: str) -> db.YtdlInfoParams | None:
+    """The cached result for `url` requested with `format_spec`, unless expired."""
+    if not (info := db.get_ytdl_info(url, format_spec)):
+        return None
+    ttl = _ERROR_TTL_SECS if info.error else _INFO_TTL_SECS
+    if time.time() - info.fetched_at > ttl:
+        return None
+    return info
+
+
+def format_with_fallback(info: db.YtdlInfoParams | None, format_spec: str) -> str:
+    """The format spec preferring the format chosen last time, if any."""
+    if info and info.chosen_format and not info.error:
+        return f"{info.chosen_format}/{format_spec}"
+    return format_spec
+
+
+def is_age_gated(url: str) -> bool:
+    """True if `url` required cookies before. This does not expire, because
+    downloading with cookies works for resources without restriction, too.
+    """
+    return db.is_ytdl_age_gated(url)
+
+
+def record_skipped_attempt() -> None:
+    with _stats_lock:
+        _age_gate_stats.skipped += 1
+
+
+def record_failed_attempt(secs: float) -> None:
+    with _stats_lock:
+        _age_gate_stats.failed += 1
+        _age_gate_stats.failed_secs += secs
+
+
+def age_gate_stats() -> AgeGateStats:
+    with _stats_lock:
+        return attrs.evolve(_age_gate_stats)
+
+
+def log_stats() -> None:
+    if (stats := age_gate_stats()).skipped or stats.failed:
+        logger.debug(f"Age-restricted resources: {stats}")
+
+
+def store_info(
+    url: str, format_spec: str, info: dict[str, Any], age_gated: bool
+) -> None:
+    """Cache the result of a successful extraction."""
+    _store(
+        db.YtdlInfoParams(
+            url=url,
+            format_spec=format_spec,
+            formats=json.dumps(
+                [f["format_id"] for f in info.get("formats") or [] if "format_id" in f]
+            ),
+            duration=info.get("duration"),
+            age_gated=age_gated or (info.get("age_limit") or 0) >= 18,
+            chosen_format=info.get("format_id"),
+            error=None,
+            fetched_at=time.time(),
+        )
+    )
+
+
+def store_age_gated(url: str, format_spec: str) -> None:
+    """Record that `url` requires cookies. Age restrictions are not cached as
+    errors, so a download with fresh cookies is attempted next time.
+    """
+    db.submit_write(functools.partial(db.mark_ytdl_age_gated, url, format_spec))
+
+
+def store_error(
+    url: str, format_spec: str, error: YoutubeDLError, age_gated: bool
+) -> None:
+    """Cache a failed extraction, if retrying it is pointless. Errors showing that
+    the resource is dead regardless of the format are recorded in
+    `dead_resources` instead.
+    """
+    if reason := dead_resources.classify(error):
+        dead_resources.record(url, reason, error)
+        return
+    if not is_permanent(error):
+        return
+    _store(
+        db.YtdlInfoParams(
+            url=url,
+            format_spec=format_spec,
+            formats="[]",
+            duration=None,
+            age_gated=age_gated,
+            chosen_format=None,
+            error=str(error),
+            fetched_at=time.time(),
+        )
+    )
+
+
+def is_permanent(error: YoutubeDLError) -> bool:
+    """True if the error is expected by the extractor, as opposed to network errors
+    or bugs, and doesn't depend on cookies or bot detection.
+    """
+    if isinstance(error, DownloadError) and error.exc_info:
+        error = error.exc_info[1]
+    return (
+        isinstance(error, ExtractorError)
+        and error.expected
+        and not dead_resources.depends_on_session(error)
+    )
+
+
+def _store(params: db.YtdlInfoParams) -> None:
+    db.submit_write(functools.partial(db.upsert_ytdl_info, params))
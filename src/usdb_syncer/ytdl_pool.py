@@ -0,0 +1,106 @@
+"""Reuse of configured yt-dlp instances across downloads.
+
+Creating a `YoutubeDL` parses its options, sets up postprocessors and cookies and
+registers all extractors, which adds noticeable overhead to every resource in a
+bulk sync. Instances are kept per worker thread, because they are not thread-safe,
+and keyed by their options except the output template and the format, which are
+set per download.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import threading
+import time
+from typing import Any, Iterator
+
+import attrs
+import yt_dlp
+
+from usdb_syncer.logger import Log, logger
+
+# options which are changed on reused instances
+_PER_DOWNLOAD = ("outtmpl", "format", "ratelimit")
+
+
+@attrs.define
+class YtdlStats:
+    """Counters about acquiring yt-dlp instances."""
+
+    created: int = 0
+    reused: int = 0
+    # total seconds spent creating and preparing instances
+    setup_secs: float = 0.0
+
+    def record(self, secs: float, reused: bool) -> None:
+        self.reused += reused
+        self.created += not reused
+        self.setup_secs += secs
+
+    def __str__(self) -> str:
+        total = self.created + self.reused
+        average = self.setup_secs / total if total else 0.0
+        return (
+            f"{total} downloads, {self.created} instances created, "
+            f"setup took {self.setup_secs:.1f}s in total (avg {average * 1000:.0f}ms)"
+        )
+
+
+class YtdlPool:
+    """Singleton managing yt-dlp instances per thread."""
+
+    _local = threading.local()
+    _stats = YtdlStats()
+    _lock = threading.Lock()
+
+    @classmethod
+    @contextlib.contextmanager
+    def get(cls, options: dict[str, Any], log: Log) -> Iterator[yt_dlp.YoutubeDL]:
+        """An instance configured with `options`, exclusive to the current thread
+        while the context is active. The time it took to set up is logged to `log`.
+        """
+        start = time.monotonic()
+        instances: dict[str, yt_dlp.YoutubeDL] = cls._local.__dict__.setdefault(
+            "instances", {}
+        )
+        key = repr(sorted((k, v) for k, v in options.items() if k not in _PER_DOWNLOAD))
+        if reused := key in instances:
+            ydl = instances.pop(key)
+            ydl.params["outtmpl"]["default"] = options["outtmpl"]
+            ydl.params["ratelimit"] = options.get("ratelimit")
+            if (format_ := options.get("format")) != ydl.params.get("format"):
+                ydl.params["format"] = format_
+                ydl.format_selector = ydl.build_format_selector(format_)
+        else:
+            ydl = yt_dlp.YoutubeDL(options)
+        secs = time.monotonic() - start
+        with cls._lock:
+            cls._stats.record(secs, reused)
+        log.debug(
+            f"yt-dlp setup took {secs * 1000:.0f}ms"
+            f"{' (reused instance)' if reused else ''}."
+        )
+        # not returned to the pool if an unexpected error leaves it in a bad state
+        yield ydl
+        instances[key] = ydl
+
+    @classmethod
+    def stats(cls) -> YtdlStats:
+        with cls._lock:
+            return attrs.evolve(cls._stats)
+
+    @classmethod
+    def log_stats(cls) -> None:
+        if (stats := cls.stats()).created:
+            logger.debug(f"yt-dlp: {stats}")
+
+    @classmethod
+    def warm_up(cls) -> None:
+        """Load all extractors in the background, so the first download doesn't
+        have to wait for it.
+        """
+        threading.Thread(
+            target=yt_dlp.extractor.gen_extractor_classes,
+            name="ytdl-warm-up",
+            daemon=True,
+        ).start()
@@ -0,0 +1,56 @@
+"""Integration tests for the download_manager module."""
+
+import concurrent.futures
+from unittest import mock
+
+from usdb_syncer import SongId
+from usdb_syncer.download_manager import (  # pylint: disable=protected-access
+    DownloadManager,
+    DownloadStage,
+    _Task,
+)
+from usdb_syncer.song_loader import DownloadStep
+
+
+@mock.patch.object(DownloadManager, "_dispatch", mock.Mock())
+@mock.patch.object(DownloadManager, "_update_parked", mock.Mock())
+def test_task_bookkeeping_survives_unexpected_errors() -> None:
+    song_id = SongId(1)
+    job = mock.Mock(song_id=song_id, retry=False)
+    job.run_step.side_effect = RuntimeError("store failed")
+    job.is_finished.return_value = True
+    # pylint: disable=protected-access
+    queue = DownloadManager._queue(DownloadStage.MEDIA)
+    with DownloadManager._lock:
+        queue.running += 1
+        DownloadManager._running[song_id] += 1
+        DownloadManager._jobs[song_id] = job
+
+    DownloadManager._run_task(_Task(job, DownloadStep.AUDIO))
+
+    assert queue.running == 0
+    assert song_id not in DownloadManager._running
+    assert song_id not in DownloadManager._jobs
+
+
+@mock.patch.object(DownloadManager, "_dispatch", mock.Mock())
+@mock.patch.object(DownloadManager, "_update_parked", mock.Mock())
+@mock.patch("usdb_syncer.download_manager.events", mock.Mock())
+@mock.patch("usdb_syncer.download_manager.db")
+def test_aborting_waiting_job_wakes_up_waiters(db_mock: mock.Mock) -> None:
+    db_mock.submit_write.return_value.result.return_value = []
+    song_id = SongId(2)
+    job = mock.Mock(song_id=song_id)
+    # pylint: disable=protected-access
+    queue = DownloadManager._queue(DownloadStage.MEDIA)
+    with DownloadManager._lock:
+        queue.waiting.append(_Task(job, DownloadStep.AUDIO))
+        DownloadManager._jobs[song_id] = job
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        idle = executor.submit(DownloadManager.wait, 10)
+
+        DownloadManager.abort([song_id])
+
+        assert idle.result(timeout=1)
+    assert not queue.waiting
+    job.cleanup.assert_called_once()
@@ -1,10 +1,12 @@
 """Integration tests for the song_loader module."""
 
 import copy
+import dataclasses
 import tempfile
 import unittest
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 from unittest import mock
 
 from tests.conftest import (
@@ -17,8 +19,12 @@ from usdb_syncer import download_options, utils
 from usdb_syncer.db import DownloadStatus
 from usdb_syncer.meta_tags import MetaTags
 from usdb_syncer.path_template import PathTemplate
-from usdb_syncer.resource_dl import ImageKind
-from usdb_syncer.song_loader import _SongLoader  # pylint: disable=protected-access
+from usdb_syncer.resource_dl import ImageKind, ProbeResult
+from usdb_syncer.settings import VideoCodec
+from usdb_syncer.song_loader import (  # pylint: disable=protected-access
+    SongLoader,
+    _ranked_resources,
+)
 from usdb_syncer.sync_meta import ResourceFile
 
 
@@ -53,6 +59,15 @@ def _download_video(
     return "mp4"
 
 
+# pylint: disable=unused-argument
+def _download_audio_and_video(
+    resource: Any, options: Any, path_stem: Path, logger: Any
+) -> tuple[str, str] | None:
+    path_stem.with_suffix(".mp3").touch()
+    path_stem.with_suffix(".mp4").touch()
+    return ("mp3", "mp4")
+
+
 def _options(
     song_dir: Path,
     path_template: str,
@@ -61,12 +76,17 @@ def _options(
     video: bool = False,
     cover: bool = False,
     background: bool = False,
+    audio_from_video: bool = False,
 ) -> download_options.Options:
     options_dict = download_options.download_options().__dict__
     options_dict["song_dir"] = song_dir
     options_dict["path_template"] = PathTemplate.parse(path_template)
     if not audio:
         options_dict["audio_options"] = None
+    elif options_dict["audio_options"]:
+        options_dict["audio_options"] = dataclasses.replace(
+            options_dict["audio_options"], from_video=audio_from_video
+        )
     if not video:
         options_dict["video_options"] = None
     if not cover:
@@ -76,14 +96,26 @@ def _options(
     return download_options.Options(**options_dict)
 
 
+def _submit_write(write: Callable[[], Any]) -> Future:
+    future: Future = Future()
+    future.set_result(write())
+    return future
+
+
 _db = mock.MagicMock()
+_db.submit_write.side_effect = _submit_write
+_db.get_dead_resource.return_value = None
 
 
 @mock.patch("usdb_syncer.song_loader.db", _db)
 @mock.patch("usdb_syncer.usdb_song.db", _db)
 @mock.patch("usdb_syncer.sync_meta.db", _db)
+@mock.patch("usdb_syncer.dead_resources.db", _db)
 @mock.patch("usdb_syncer.resource_dl.download_audio", side_effect=_download_audio)
 @mock.patch("usdb_syncer.resource_dl.download_video", _download_video)
+@mock.patch(
+    "usdb_syncer.resource_dl.download_audio_and_video", _download_audio_and_video
+)
 @mock.patch(
     "usdb_syncer.resource_dl.download_and_process_image", _download_and_process_image
 )
@@ -112,7 +144,7 @@ class SongLoaderTestCase(unittest.TestCase):
                 background=True,
             )
 
-            loader = _SongLoader(song, options)
+            loader = SongLoader(song, options)
             loader.run()
 
             out = loader.song
@@ -136,6 +168,76 @@ class SongLoaderTestCase(unittest.TestCase):
                         path_stem.with_name(meta.fname)
                     )
 
+    @mock.patch("usdb_syncer.usdb_scraper.get_usdb_details")
+    @mock.patch("usdb_syncer.usdb_scraper.get_notes")
+    def test_download_audio_from_video(
+        self, notes_mock: mock.Mock, details_mock: mock.Mock, audio_mock: mock.Mock
+    ) -> None:
+        song = example_usdb_song()
+        song.sync_meta = None
+        notes_mock.return_value = example_notes_str(example_meta_tags())
+        details_mock.return_value = details_from_song(song)
+
+        with tempfile.TemporaryDirectory() as song_dir_str:
+            song_dir = Path(song_dir_str)
+            options = _options(
+                song_dir,
+                ":title: / song",
+                audio=True,
+                video=True,
+                audio_from_video=True,
+            )
+
+            loader = SongLoader(song, options)
+            loader.run()
+
+            audio_mock.assert_not_called()
+            out = loader.song
+            assert out.status == DownloadStatus.NONE
+            assert out.sync_meta and out.sync_meta.audio and out.sync_meta.video
+            assert out.sync_meta.audio.resource == out.sync_meta.video.resource
+            assert (song_dir / out.title / "song.mp3").exists()
+            assert (song_dir / out.title / "song.mp4").exists()
+
+    @mock.patch("usdb_syncer.usdb_scraper.get_usdb_details")
+    @mock.patch("usdb_syncer.usdb_scraper.get_notes")
+    @mock.patch("usdb_syncer.resource_dl.transcode_video")
+    def test_download_and_transcode_video(
+        self,
+        transcode_mock: mock.Mock,
+        notes_mock: mock.Mock,
+        details_mock: mock.Mock,
+        _audio_mock: mock.Mock,
+    ) -> None:
+        song = example_usdb_song()
+        song.sync_meta = None
+        notes_mock.return_value = example_notes_str(example_meta_tags())
+        details_mock.return_value = details_from_song(song)
+        transcode_mock.side_effect = lambda path, *_: path.rename(
+            path.with_suffix(".webm")
+        )
+
+        with tempfile.TemporaryDirectory() as song_dir_str:
+            song_dir = Path(song_dir_str)
+            options = _options(song_dir, ":title: / song", video=True)
+            assert options.video_options
+            options = dataclasses.replace(
+                options,
+                video_options=dataclasses.replace(
+                    options.video_options, reencode_format=VideoCodec.LIBVPX
+                ),
+            )
+
+            loader = SongLoader(song, options)
+            loader.run()
+
+            transcode_mock.assert_called_once()
+            assert transcode_mock.call_args.args[1] == VideoCodec.LIBVPX
+            out = loader.song
+            assert out.sync_meta and out.sync_meta.video
+            assert out.sync_meta.video.fname == "song.webm"
+            assert (song_dir / out.title / "song.webm").exists()
+
     @mock.patch("usdb_syncer.usdb_scraper.get_usdb_details")
     @mock.patch("usdb_syncer.usdb_scraper.get_notes")
     def test_download_unchanged_resource(
@@ -155,7 +257,7 @@ class SongLoaderTestCase(unittest.TestCase):
             mp3_path = song.sync_meta.path.parent / "song.mp3"
             song.sync_meta.audio = _mock_resource_file(mp3_path, "audio.com")
 
-            loader = _SongLoader(copy.deepcopy(song), options)
+            loader = SongLoader(copy.deepcopy(song), options)
             loader.run()
 
             audio_mock.assert_not_called()
@@ -182,7 +284,7 @@ class SongLoaderTestCase(unittest.TestCase):
             mp3_path = song.sync_meta.path.parent / "_.mp3"
             song.sync_meta.audio = _mock_resource_file(mp3_path, "audio.com")
 
-            loader = _SongLoader(copy.deepcopy(song), options)
+            loader = SongLoader(copy.deepcopy(song), options)
             loader.run()
 
             assert loader.song.status == DownloadStatus.NONE
@@ -212,15 +314,91 @@ class SongLoaderTestCase(unittest.TestCase):
             # simulate changed file
             song.sync_meta.audio.mtime -= 1
 
-            loader = _SongLoader(copy.deepcopy(song), options)
+            loader = SongLoader(copy.deepcopy(song), options)
             loader.run()
 
             audio_mock.assert_called_once()
             assert loader.song.status == DownloadStatus.NONE
             assert utils.get_mtime(mp3_path) > song.sync_meta.audio.mtime
 
+    @mock.patch("usdb_syncer.usdb_scraper.get_usdb_details")
+    @mock.patch("usdb_syncer.usdb_scraper.get_notes")
+    def test_download_unchanged_song(
+        self, notes_mock: mock.Mock, details_mock: mock.Mock, audio_mock: mock.Mock
+    ) -> None:
+        song = example_usdb_song()
+        song.sync_meta = None
+        notes_mock.return_value = example_notes_str(MetaTags(audio="audio.com"))
+        details_mock.return_value = details_from_song(song)
+
+        with tempfile.TemporaryDirectory() as song_dir_str:
+            song_dir = Path(song_dir_str)
+            options = _options(song_dir, ":title: / song", audio=True)
+            loader = SongLoader(song, options)
+            loader.run()
+            out = loader.song
+            assert out.sync_meta and out.sync_meta.txt
+            sync_meta_id, fingerprint = _db.upsert_sync_fingerprint.call_args.args
+            assert sync_meta_id == out.sync_meta.sync_meta_id
+            _db.get_sync_fingerprint.return_value = fingerprint
+            txt_path = song_dir / out.title / out.sync_meta.txt.fname
+            txt_mtime = utils.get_mtime(txt_path)
+
+            try:
+                loader = SongLoader(copy.deepcopy(out), options)
+                loader.run()
+            finally:
+                _db.get_sync_fingerprint.return_value = None
+
+            assert loader.song.status == DownloadStatus.NONE
+            assert utils.get_mtime(txt_path) == txt_mtime
+            assert loader.song.sync_meta == out.sync_meta
+
 
 def _mock_resource_file(path: Path, resource: str | None = None) -> ResourceFile:
     path.parent.mkdir(exist_ok=True, parents=True)
     path.touch()
     return ResourceFile.new(path, resource or f"https://example.com/{path.name}")
+
+
+def test_ranked_resources() -> None:
+    ctx = mock.Mock()
+    ctx.txt.minimum_song_secs.return_value = 200
+    results = [
+        ProbeResult("dead", False, error="Video unavailable"),
+        ProbeResult("short", True, 150),
+        ProbeResult("unknown", None),
+        ProbeResult("long", True, 400),
+        ProbeResult("fitting", True, 225),
+        ProbeResult("also_fitting", True, 210),
+    ]
+    resources = [r.resource for r in results]
+
+    with mock.patch(
+        "usdb_syncer.resource_dl.probe_resources", return_value=results
+    ) as probe_mock:
+        ranked = _ranked_resources(ctx, iter(resources), "bestaudio", None)
+        unchanged = _ranked_resources(ctx, iter(resources), "bestaudio", "dead")
+
+    probe_mock.assert_called_once()
+    assert ranked == ["fitting", "also_fitting", "long", "unknown", "short"]
+    assert unchanged == resources
+
+
+def test_first_resource_is_kept_if_valid() -> None:
+    ctx = mock.Mock()
+    ctx.txt.minimum_song_secs.return_value = 200
+    results = [
+        ProbeResult("long", True, 400),
+        ProbeResult("fitting", True, 225),
+        ProbeResult("short", True, 150),
+    ]
+    resources = [r.resource for r in results]
+
+    with mock.patch("usdb_syncer.resource_dl.probe_resources", return_value=results):
+        ranked = _ranked_resources(ctx, iter(resources), "bestaudio", None)
+        results[0] = ProbeResult("long", True, 150)
+        too_short = _ranked_resources(ctx, iter(resources), "bestaudio", None)
+
+    assert ranked == ["long", "fitting", "short"]
+    assert too_short == ["fitting", "long", "short"]
@@ -0,0 +1,61 @@
+"""Tests for adaptive sizing of worker pools."""
+
+import time
+from unittest import mock
+
+from usdb_syncer.adaptive_pool import _WINDOW_TASKS, AdaptiveConcurrency
+
+
+class _Windows:
+    """Completes windows of tasks of a controller, advancing a fake clock."""
+
+    def __init__(self, minimum: int, maximum: int) -> None:
+        self.controller = AdaptiveConcurrency.new(minimum, maximum)
+        # the first window starts when the controller is created
+        self.now = time.monotonic()
+
+    def complete(self, secs: float, failures: int = 0, backlog: bool = True) -> int:
+        """Complete a window of tasks taking `secs` in total and return the limit
+        recorded tasks are run with afterwards.
+        """
+        self.now += secs
+        limit = self.controller.limit
+        with mock.patch("time.monotonic", return_value=self.now):
+            for i in range(_WINDOW_TASKS):
+                adjustment = self.controller.record(
+                    secs / _WINDOW_TASKS, i < failures, backlog
+                )
+                if adjustment:
+                    assert adjustment.old == limit
+                    limit = adjustment.new
+        return limit
+
+
+def test_backs_off_on_failures() -> None:
+    windows = _Windows(1, 8)
+
+    assert windows.complete(1.0, failures=4) == 4
+    assert windows.complete(1.0, failures=4) == 2
+    assert windows.complete(1.0, failures=4) == 1
+    assert windows.complete(1.0, failures=4) == 1
+
+
+def test_grows_while_throughput_improves() -> None:
+    windows = _Windows(1, 8)
+    windows.complete(1.0, failures=_WINDOW_TASKS)
+    for _ in range(4):
+        # holds after backing off
+        assert windows.complete(1.0) == 4
+
+    assert windows.complete(1.0) == 5
+    assert windows.complete(0.5) == 6
+    # no gain, so the increase is reverted
+    assert windows.complete(0.5) == 5
+    assert windows.complete(0.5, backlog=False) == 5
+
+
+def test_shrinks_if_latency_rises() -> None:
+    windows = _Windows(1, 4)
+    windows.complete(1.0, backlog=False)
+
+    assert windows.complete(2.0, backlog=False) == 3
@@ -0,0 +1,73 @@
+"""Tests for the global bandwidth limit."""
+
+import time
+from typing import Iterator
+from unittest import mock
+
+import pytest
+
+from usdb_syncer import bandwidth
+from usdb_syncer.bandwidth import BandwidthLimiter
+
+
+@pytest.fixture(autouse=True)
+def reset_limiter() -> Iterator[None]:
+    yield
+    BandwidthLimiter.configure(0, (0, 0))
+
+
+@pytest.mark.parametrize(
+    "hours,hour,expected",
+    [
+        ((0, 0), 12, True),
+        ((8, 18), 8, True),
+        ((8, 18), 17, True),
+        ((8, 18), 18, False),
+        ((8, 18), 3, False),
+        ((22, 6), 23, True),
+        ((22, 6), 5, True),
+        ((22, 6), 12, False),
+    ],
+)
+def test_limit_applies_within_hours(
+    hours: tuple[int, int], hour: int, expected: bool
+) -> None:
+    BandwidthLimiter.configure(10, hours)
+
+    with mock.patch.object(bandwidth, "datetime") as datetime_mock:
+        datetime_mock.datetime.now.return_value.hour = hour
+        rate = BandwidthLimiter.current_rate()
+
+    assert rate == (10 * 1024 if expected else None)
+
+
+def test_unlimited_by_default() -> None:
+    assert BandwidthLimiter.current_rate() is None
+    assert not BandwidthLimiter.ytdl_options()
+
+
+def test_consumed_bytes_are_throttled() -> None:
+    BandwidthLimiter.configure(10, (0, 0))
+    assert BandwidthLimiter.ytdl_options() == {"ratelimit": 10 * 1024}
+
+    start = time.monotonic()
+    # the first 10 KB are a free burst, the remaining 2 KB take 0.2s
+    for _ in range(3):
+        BandwidthLimiter.consume(4 * 1024)
+
+    assert time.monotonic() - start >= 0.19
+
+
+def test_ytdl_hook_consumes_received_bytes(monkeypatch: pytest.MonkeyPatch) -> None:
+    consumed: list[int] = []
+    monkeypatch.setattr(BandwidthLimiter, "consume", consumed.append)
+
+    for done in (100, 300):
+        BandwidthLimiter.ytdl_hook(
+            {"status": "downloading", "filename": "a.m4a", "downloaded_bytes": done}
+        )
+    BandwidthLimiter.ytdl_hook(
+        {"status": "finished", "filename": "a.m4a", "downloaded_bytes": 400}
+    )
+
+    assert consumed == [100, 200, 100]
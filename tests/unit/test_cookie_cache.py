@@ -0,0 +1,133 @@
+"""Tests for the browser cookie cache."""
+
+import os
+from http.cookiejar import Cookie, CookieJar
+from pathlib import Path
+from typing import Iterator
+from unittest import mock
+
+import pytest
+from yt_dlp.cookies import YoutubeDLCookieJar
+
+from usdb_syncer import cookie_cache
+from usdb_syncer.cookie_cache import CookieCache
+from usdb_syncer.settings import Browser
+
+
+def _cookie(domain: str, name: str) -> Cookie:
+    return Cookie(
+        version=0,
+        name=name,
+        value="value",
+        port=None,
+        port_specified=False,
+        domain=domain,
+        domain_specified=True,
+        domain_initial_dot=domain.startswith("."),
+        path="/",
+        path_specified=True,
+        secure=True,
+        expires=None,
+        discard=False,
+        comment=None,
+        comment_url=None,
+        rest={},
+    )
+
+
+@pytest.fixture(name="read_cookies")
+def fixture_read_cookies(tmp_path: Path) -> Iterator[mock.Mock]:
+    jar = CookieJar()
+    jar.set_cookie(_cookie(".youtube.com", "SID"))
+    jar.set_cookie(_cookie("usdb.animux.de", "PHPSESSID"))
+    jar.set_cookie(_cookie(".bank.example", "SESSION"))
+    with (
+        mock.patch.object(Browser, "cookies", return_value=jar) as cookies,
+        mock.patch("tempfile.tempdir", str(tmp_path)),
+    ):
+        yield cookies
+        CookieCache.clear()
+
+
+def test_cookies_are_read_once(read_cookies: mock.Mock) -> None:
+    cookies = CookieCache.cookies(Browser.FIREFOX)
+    path = CookieCache.cookie_file(Browser.FIREFOX)
+
+    assert CookieCache.cookies(Browser.FIREFOX) == cookies
+    assert CookieCache.cookie_file(Browser.FIREFOX) == path
+    read_cookies.assert_called_once_with(list(cookie_cache.DOMAINS))
+
+
+def test_only_needed_domains_are_kept(read_cookies: mock.Mock) -> None:
+    assert read_cookies.return_value
+    names = [c.name for c in CookieCache.cookies(Browser.FIREFOX)]
+    usdb = [c.name for c in CookieCache.cookies(Browser.FIREFOX, "usdb.animux.de")]
+
+    assert sorted(names) == ["PHPSESSID", "SID"]
+    assert usdb == ["PHPSESSID"]
+
+
+def test_cookies_are_read_again(read_cookies: mock.Mock) -> None:
+    path = CookieCache.cookie_file(Browser.FIREFOX)
+
+    CookieCache.invalidate()
+    new_path = CookieCache.cookie_file(Browser.FIREFOX)
+    CookieCache.cookies(Browser.CHROME)
+    with mock.patch.object(cookie_cache, "_TTL_SECS", 0):
+        CookieCache.cookies(Browser.CHROME)
+
+    assert read_cookies.call_count == 4
+    assert path and path != new_path
+
+
+def test_replaced_cookie_files_are_kept_until_stale(read_cookies: mock.Mock) -> None:
+    assert read_cookies.return_value
+    old = CookieCache.cookie_file(Browser.FIREFOX)
+    CookieCache.invalidate()
+    current = CookieCache.cookie_file(Browser.FIREFOX)
+    assert old and current and old.exists()
+
+    os.utime(old, (0, 0))
+    CookieCache.invalidate()
+    new = CookieCache.cookie_file(Browser.FIREFOX)
+    assert not old.exists()
+    assert current.exists()
+
+    CookieCache.clear()
+    assert new and not new.exists()
+    assert not current.exists()
+
+
+@pytest.mark.usefixtures("read_cookies")
+def test_cookie_file_is_readable_by_yt_dlp() -> None:
+    path = CookieCache.cookie_file(Browser.FIREFOX)
+    assert path
+
+    jar = YoutubeDLCookieJar(str(path))
+    jar.load()
+
+    assert sorted(cookie.name for cookie in jar) == ["PHPSESSID", "SID"]
+    CookieCache.clear()
+    assert not path.exists()
+
+
+@pytest.mark.usefixtures("read_cookies")
+def test_stale_cookie_files_are_removed(tmp_path: Path) -> None:
+    stale = tmp_path / "usdb_syncer_cookies_stale.txt"
+    recent = tmp_path / "usdb_syncer_cookies_recent.txt"
+    stale.touch()
+    recent.touch()
+    os.utime(stale, (0, 0))
+
+    CookieCache.cookie_file(Browser.FIREFOX)
+
+    assert not stale.exists()
+    assert recent.exists()
+
+
+def test_failure_is_cached() -> None:
+    with mock.patch.object(Browser, "cookies", return_value=None) as read_cookies:
+        assert CookieCache.cookie_file(Browser.FIREFOX) is None
+        assert not CookieCache.cookies(Browser.FIREFOX)
+    read_cookies.assert_called_once()
+    CookieCache.clear()
@@ -4,7 +4,7 @@ from pathlib import Path
 
 import attrs
 
-from usdb_syncer import db
+from usdb_syncer import SongId, db
 from usdb_syncer.usdb_song import UsdbSong
 
 
@@ -43,3 +43,104 @@ def test_persisting_saved_search() -> None:
         search.update(new_name="name")
         assert search.name == "name (1)"
         assert len(list(db.SavedSearch.load_saved_searches())) == 2
+
+
+def test_download_queue(song: UsdbSong) -> None:
+    other = attrs.evolve(song, song_id=SongId(456), sync_meta=None)
+    with db.managed_connection(":memory:"):
+        song.upsert()
+        other.upsert()
+        assert db.enqueue_downloads([song.song_id]) == [song.song_id]
+        assert db.enqueue_downloads([song.song_id, other.song_id], priority=1) == [
+            other.song_id
+        ]
+
+        assert db.claim_download() == (other.song_id, 1)
+        assert db.claim_download() == (song.song_id, 1)
+        assert db.claim_download() is None
+        assert not db.dequeue_unclaimed_downloads([song.song_id])
+
+        db.release_download(song.song_id, "error")
+        assert db.claim_download() == (song.song_id, 2)
+        db.dequeue_download(song.song_id)
+
+        assert db.reset_download_queue() == [other.song_id]
+        assert db.dequeue_unclaimed_downloads([other.song_id]) == [other.song_id]
+        assert db.claim_download() is None
+
+
+def test_sync_fingerprint(song: UsdbSong) -> None:
+    assert song.sync_meta
+    sync_meta_id = song.sync_meta.sync_meta_id
+    with db.managed_connection(":memory:"):
+        song.upsert()
+        assert db.get_sync_fingerprint(sync_meta_id) is None
+        db.upsert_sync_fingerprint(sync_meta_id, "a")
+        db.upsert_sync_fingerprint(sync_meta_id, "b")
+        assert db.get_sync_fingerprint(sync_meta_id) == "b"
+
+
+def test_loudness_stats() -> None:
+    with db.managed_connection(":memory:"):
+        assert db.get_loudness_stats("abc") is None
+        db.upsert_loudness_stats("abc", (-20.0, -1.0, 5.0, -30.0, 0.5))
+        db.upsert_loudness_stats("abc", (-18.0, -1.5, 6.0, -28.0, 0.25))
+        assert db.get_loudness_stats("abc") == (-18.0, -1.5, 6.0, -28.0, 0.25)
+
+
+def test_writer(song: UsdbSong, tmp_path: Path) -> None:
+    path = tmp_path / "db.sqlite"
+    songs = [attrs.evolve(song, song_id=SongId(i), sync_meta=None) for i in range(3)]
+    with db.managed_connection(path):
+        db.start_writer(path)
+        try:
+            futures = [db.submit_write(s.upsert) for s in songs]
+            claim = db.submit_write(
+                lambda: db.enqueue_downloads([songs[1].song_id]) and db.claim_download()
+            )
+            assert claim.result() == (songs[1].song_id, 1)
+            for future in futures:
+                assert future.result() is None
+        finally:
+            db.stop_writer()
+        assert db.usdb_song_count() == 3
+
+
+def test_failed_write_is_rolled_back(song: UsdbSong, tmp_path: Path) -> None:
+    path = tmp_path / "db.sqlite"
+    other = attrs.evolve(song, song_id=SongId(456), sync_meta=None)
+
+    def failing_write() -> None:
+        other.upsert()
+        raise ValueError("failed")
+
+    with db.managed_connection(path):
+        db.start_writer(path)
+        try:
+            failed = db.submit_write(failing_write)
+            succeeded = db.submit_write(song.upsert)
+            assert isinstance(failed.exception(), ValueError)
+            assert succeeded.result() is None
+        finally:
+            db.stop_writer()
+        assert db.usdb_song_count() == 1
+
+
+def test_ensure_connection(song: UsdbSong) -> None:
+    try:
+        db.ensure_connection(":memory:")
+        song.upsert()
+        # a new in-memory database would be empty
+        db.ensure_connection(":memory:")
+        assert db.usdb_song_count() == 1
+    finally:
+        db.close()
+
+
+def test_write_without_writer_joins_transaction(song: UsdbSong) -> None:
+    other = attrs.evolve(song, song_id=SongId(456), sync_meta=None)
+    with db.managed_connection(":memory:"):
+        with db.transaction():
+            assert db.submit_write(other.upsert).result() is None
+            assert db.submit_write(song.upsert).result() is None
+        assert db.usdb_song_count() == 2
@@ -0,0 +1,61 @@
+"""Tests for the negative cache of dead resources."""
+
+import time
+from typing import Iterator
+from unittest import mock
+
+import pytest
+from yt_dlp.utils import DownloadError, ExtractorError
+
+from usdb_syncer import db, dead_resources
+from usdb_syncer.dead_resources import DeadReason
+
+_URL = "https://www.youtube.com/watch?v=fake_YT-id0"
+
+
+@pytest.fixture(autouse=True)
+def connection() -> Iterator[None]:
+    with db.managed_connection(":memory:"):
+        yield
+
+
+def _error(message: str, expected: bool = True) -> DownloadError:
+    error = ExtractorError(message, expected=expected)
+    return DownloadError(str(error), (ExtractorError, error, None))
+
+
+@pytest.mark.parametrize(
+    "message,expected,reason",
+    [
+        (
+            "Private video. Sign in if you've been granted access",
+            True,
+            DeadReason.PRIVATE,
+        ),
+        ("Sign in to confirm you're not a bot", True, None),
+        ("This video is private", True, DeadReason.PRIVATE),
+        ("This video has been removed by the uploader", True, DeadReason.REMOVED),
+        (
+            "The uploader has not made this video available in your country",
+            True,
+            DeadReason.GEO_BLOCKED,
+        ),
+        ("Video unavailable", True, DeadReason.UNAVAILABLE),
+        ("Requested format is not available", True, None),
+        ("Sign in to confirm your age", True, None),
+        ("Unable to download webpage: timed out", False, None),
+    ],
+)
+def test_classify(message: str, expected: bool, reason: DeadReason | None) -> None:
+    assert dead_resources.classify(_error(message, expected)) == reason
+
+
+def test_record_lookup_and_purge() -> None:
+    dead_resources.record(_URL, DeadReason.PRIVATE, _error("This video is private"))
+    dead = dead_resources.lookup(_URL)
+
+    assert dead and dead.reason == "private"
+    with mock.patch("time.time", return_value=time.time() + 8 * 24 * 60 * 60):
+        assert dead_resources.lookup(_URL) is None
+        assert db.delete_dead_resources(expired_before=time.time()) == 1
+    assert not db.all_dead_resources()
@@ -0,0 +1,96 @@
+"""Tests for the per-host request limiter."""
+
+import time
+from unittest import mock
+
+import pytest
+import requests
+from yt_dlp.utils import DownloadError, ExtractorError
+
+from usdb_syncer.constants import Usdb
+from usdb_syncer.host_limiter import HostLimiter, HostLimits, is_transient
+
+
+@pytest.fixture(autouse=True)
+def reset_limiter() -> None:
+    HostLimiter.reset()
+
+
+@mock.patch("usdb_syncer.settings.get_host_limits", lambda: {})
+@pytest.mark.parametrize(
+    "url,key",
+    [
+        ("https://usdb.animux.de/index.php?link=detail", Usdb.DOMAIN),
+        ("https://www.youtube.com/watch?v=fake_YT-id0", "youtube.com"),
+        ("m.youtube.com/watch?v=fake_YT-id0", "youtube.com"),
+        ("https://assets.fanart.tv/fanart/music/cover.jpg", "fanart.tv"),
+        ("https://example.com/image.jpg", "example.com"),
+    ],
+)
+def test_host_key(url: str, key: str) -> None:
+    assert HostLimiter.host_key(url) == key
+
+
+@mock.patch("usdb_syncer.settings.get_host_limits", lambda: {"example.com": (10, 2, 1)})
+@mock.patch("usdb_syncer.host_limiter._LOG_WAIT_THRESHOLD_SECS", 0)
+def test_rate_limit_is_applied_after_burst() -> None:
+    start = time.monotonic()
+    for _ in range(4):
+        with HostLimiter.limit("https://example.com/image.jpg"):
+            pass
+    # two requests are free, the remaining two take 0.1s each
+    assert time.monotonic() - start >= 0.19
+    stats = HostLimiter.stats()["example.com"]
+    assert stats.requests == 4
+    assert stats.max_wait > 0
+
+
+@mock.patch("usdb_syncer.settings.get_host_limits", lambda: {"example.com": (1, 1, 3)})
+def test_custom_limits_are_used() -> None:
+    with mock.patch("usdb_syncer.host_limiter._Host") as host_mock:
+        HostLimiter._host("example.com")  # pylint: disable=protected-access
+    host_mock.assert_called_once_with("example.com", HostLimits(1, 1, 3))
+
+
+def _http_error(status_code: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(response=response)
+
+
+@pytest.mark.parametrize(
+    "error,transient",
+    [
+        (requests.Timeout(), True),
+        (requests.ConnectionError(), True),
+        (_http_error(429), True),
+        (_http_error(503), True),
+        (_http_error(404), False),
+        (requests.exceptions.SSLError(), False),
+        (DownloadError("timed out", (None, TimeoutError(), None)), True),
+        (ExtractorError("Unable to download webpage", cause=_http_error(502)), True),
+        (ExtractorError("Video unavailable", expected=True), False),
+        (
+            DownloadError("Private video", (None, ExtractorError("Private"), None)),
+            False,
+        ),
+    ],
+)
+def test_is_transient(error: Exception, transient: bool) -> None:
+    assert is_transient(error) == transient
+
+
+@mock.patch("usdb_syncer.settings.get_host_limits", lambda: {})
+def test_transient_failures_are_counted() -> None:
+    before = HostLimiter.transient_failures()
+    with pytest.raises(requests.Timeout):
+        with HostLimiter.limit("https://example.com/a.jpg"):
+            raise requests.Timeout()
+    with pytest.raises(requests.HTTPError):
+        with HostLimiter.limit("https://example.com/b.jpg"):
+            raise _http_error(404)
+    HostLimiter.record_status("https://example.com/c.jpg", 429)
+    HostLimiter.record_status("https://example.com/d.jpg", 200)
+
+    assert HostLimiter.transient_failures() == before + 2
+    assert HostLimiter.stats()["example.com"].transient_failures == 2
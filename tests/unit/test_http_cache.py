@@ -0,0 +1,108 @@
+"""Tests for the HTTP response cache."""
+
+from pathlib import Path
+from typing import Iterator
+from unittest import mock
+
+import pytest
+
+from usdb_syncer import db, errors, http_cache, utils
+from usdb_syncer.media_cache import MediaCache
+
+_URL = "https://assets.fanart.tv/fanart/cover.jpg"
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path: Path) -> Iterator[None]:
+    with (
+        mock.patch.object(utils.AppPaths, "media_cache", tmp_path / "cache"),
+        mock.patch("usdb_syncer.settings.get_media_cache_budget", lambda: 1),
+        db.managed_connection(":memory:"),
+    ):
+        yield
+
+
+def _reply(status_code: int, content: bytes = b"", **headers: str) -> mock.Mock:
+    reply = mock.MagicMock(
+        url=_URL, status_code=status_code, ok=status_code < 400, headers=headers
+    )
+    reply.__enter__.return_value = reply
+    reply.iter_content.return_value = iter(
+        [content[i : i + 100] for i in range(0, len(content), 100)]
+    )
+    return reply
+
+
+@pytest.fixture(name="session_get")
+def fixture_session_get() -> Iterator[mock.Mock]:
+    with mock.patch.object(http_cache.HttpSession, "session") as session_mock:
+        yield session_mock.return_value.get
+
+
+def test_revalidates_with_etag(session_get: mock.Mock) -> None:
+    session_get.return_value = _reply(200, b"image", ETag='"v1"')
+    response = http_cache.get(_URL, {}, timeout=1)
+    http_cache.store(_URL, response, "jpg")
+    session_get.return_value = _reply(304)
+    response = http_cache.get(_URL, {}, timeout=1)
+
+    assert session_get.call_args.kwargs["headers"] == {"If-None-Match": '"v1"'}
+    assert response.from_cache
+    assert response.content == b"image"
+    assert (validator := db.get_http_validator(_URL))
+    assert validator[:3] == ('"v1"', None, 0)
+
+
+def test_fresh_response_is_served_from_cache(session_get: mock.Mock) -> None:
+    session_get.return_value = _reply(200, b"image", **{"Cache-Control": "max-age=60"})
+    http_cache.store(_URL, http_cache.get(_URL, {}, timeout=1), "jpg")
+    response = http_cache.get(_URL, {}, timeout=1)
+
+    session_get.assert_called_once()
+    assert response.from_cache
+    assert response.content == b"image"
+
+
+def test_only_requests_are_limited(session_get: mock.Mock) -> None:
+    session_get.return_value = _reply(200, b"image", **{"Cache-Control": "max-age=60"})
+    with mock.patch.object(http_cache.HostLimiter, "limit") as limit:
+        http_cache.store(_URL, http_cache.get(_URL, {}, timeout=1), "jpg")
+        http_cache.get(_URL, {}, timeout=1)
+
+    limit.assert_called_once_with(_URL)
+
+
+def test_uncached_responses(session_get: mock.Mock) -> None:
+    session_get.return_value = _reply(
+        200, b"image", ETag='"v1"', **{"Cache-Control": "no-store"}
+    )
+    http_cache.store(_URL, http_cache.get(_URL, {}, timeout=1), "jpg")
+    session_get.return_value = _reply(200, b"image")
+    response = http_cache.get(_URL, {}, timeout=1)
+
+    assert "If-None-Match" not in session_get.call_args.kwargs["headers"]
+    assert not response.from_cache
+    assert not MediaCache.contains(MediaCache.key(_URL))
+
+
+@pytest.mark.parametrize(
+    "content,headers",
+    [
+        (b"<html>" + b"x" * 2000, {}),
+        (b"y" * 2000, {}),
+        (b"y" * 10, {"Content-Length": "2000"}),
+    ],
+    ids=["sniffed", "too_large", "too_large_by_header"],
+)
+def test_rejected_responses(
+    session_get: mock.Mock, content: bytes, headers: dict[str, str]
+) -> None:
+    reply = _reply(200, content, **headers)
+    session_get.return_value = reply
+
+    with pytest.raises(errors.DownloadRejectedError):
+        http_cache.get(
+            _URL, {}, timeout=1, max_bytes=1000, sniff=lambda data: b"html" not in data
+        )
+    # aborted before reading everything
+    assert len(content) <= 10 or next(reply.iter_content.return_value, None)
@@ -0,0 +1,38 @@
+"""Tests for loudness normalization."""
+
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+from usdb_syncer.loudness import LoudnessStats, normalize_audio
+
+_STATS = LoudnessStats(
+    input_i=-14.2, input_tp=-0.5, input_lra=9.0, input_thresh=-24.6, target_offset=0.3
+)
+
+
+def test_loudnorm_filter() -> None:
+    assert _STATS.loudnorm_filter() == (
+        "loudnorm=i=-23.0:lra=9.0:tp=-2.0:offset=0.3:measured_i=-14.2:"
+        "measured_lra=9.0:measured_tp=-0.5:measured_thresh=-24.6:linear=true"
+    )
+
+
+def test_known_stats_skip_measuring(tmp_path: Path) -> None:
+    path = tmp_path / "song.m4a"
+    path.write_bytes(b"original")
+
+    def ffmpeg(args: list[str], **_kwargs: Any) -> None:
+        assert _STATS.loudnorm_filter() in args
+        Path(args[-1]).write_bytes(b"normalized")
+
+    with (
+        mock.patch("subprocess.run", side_effect=ffmpeg) as run_mock,
+        mock.patch("usdb_syncer.loudness.FFmpegNormalize") as normalize_mock,
+    ):
+        assert normalize_audio(str(path), str(path), "aac", 128000, _STATS) is None
+
+    run_mock.assert_called_once()
+    normalize_mock.assert_not_called()
+    assert path.read_bytes() == b"normalized"
+    assert list(tmp_path.iterdir()) == [path]
@@ -0,0 +1,58 @@
+"""Tests for the media cache."""
+
+import os
+from pathlib import Path
+from typing import Iterator
+from unittest import mock
+
+import pytest
+
+from usdb_syncer import utils
+from usdb_syncer.media_cache import MediaCache
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path: Path) -> Iterator[Path]:
+    path = tmp_path / "cache"
+    with mock.patch.object(utils.AppPaths, "media_cache", path):
+        MediaCache.clear()
+        yield path
+
+
+@mock.patch("usdb_syncer.settings.get_media_cache_budget", lambda: 1)
+def test_put_and_get(tmp_path: Path) -> None:
+    source = tmp_path / "source.m4a"
+    source.write_bytes(b"audio")
+    key = MediaCache.key("fake_YT-id0", "m4a")
+    MediaCache.put(key, source)
+
+    assert MediaCache.get(MediaCache.key("fake_YT-id0", "mp3"), tmp_path / "a") is None
+    assert MediaCache.get(key, tmp_path / "song") == "m4a"
+    assert (tmp_path / "song.m4a").read_bytes() == b"audio"
+
+
+@mock.patch("usdb_syncer.settings.get_media_cache_budget", lambda: 1)
+def test_evict_least_recently_used() -> None:
+    data = b"x" * 400 * 1024
+    keys = [MediaCache.key(str(i)) for i in range(3)]
+    MediaCache.write(keys[0], data, "jpg")
+    MediaCache.write(keys[1], data, "jpg")
+    for age, key in enumerate(keys[:2]):
+        entry = next(utils.AppPaths.media_cache.glob(f"*/{key}.jpg"))
+        os.utime(entry, (0, age + 1))
+    # makes the first entry the most recently used one
+    assert MediaCache.read(keys[0]) == data
+    MediaCache.write(keys[2], data, "jpg")
+
+    assert MediaCache.read(keys[0]) == data
+    assert MediaCache.read(keys[1]) is None
+    assert MediaCache.read(keys[2]) == data
+
+
+@mock.patch("usdb_syncer.settings.get_media_cache_budget", lambda: 0)
+def test_disabled() -> None:
+    key = MediaCache.key("https://example.com/cover.jpg")
+    MediaCache.write(key, b"image", "jpg")
+
+    assert MediaCache.read(key) is None
+    assert not utils.AppPaths.media_cache.exists()
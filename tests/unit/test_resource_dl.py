@@ -0,0 +1,121 @@
+"""Tests for processing downloaded media."""
+
+import contextlib
+import io
+from typing import Any, Callable, Iterator
+from unittest import mock
+
+from PIL import Image
+from yt_dlp.utils import DownloadError, ExtractorError
+
+from usdb_syncer import db, resource_dl, ytdl_info
+from usdb_syncer.logger import logger
+from usdb_syncer.meta_tags import CropMetaTags, ImageMetaTags
+from usdb_syncer.resource_dl import process_image
+from usdb_syncer.settings import CoverMaxSize
+
+
+def _image(width: int, height: int, format_: str = "jpeg") -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(out, format_)
+    return out.getvalue()
+
+
+def _size(data: bytes) -> tuple[int, int]:
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.format == "JPEG"
+        return image.size
+
+
+def test_unprocessed_image_is_unchanged() -> None:
+    data = _image(800, 600, "png")
+
+    assert process_image(data, None, CoverMaxSize.PX_1000) is data
+    assert process_image(data, ImageMetaTags(source=""), None) is data
+
+
+def test_image_is_scaled_down() -> None:
+    assert _size(process_image(_image(2000, 1500), None, CoverMaxSize.PX_640)) == (
+        640,
+        480,
+    )
+    assert _size(
+        process_image(_image(3000, 1000, "png"), None, CoverMaxSize.PX_1000)
+    ) == (1000, 333)
+
+
+def test_image_is_scaled_down_after_processing() -> None:
+    tags = ImageMetaTags(source="", crop=CropMetaTags(0, 0, 1200, 1200))
+
+    assert _size(process_image(_image(2000, 1500), tags, CoverMaxSize.PX_1000)) == (
+        1000,
+        1000,
+    )
+    assert _size(process_image(_image(2000, 1500), tags, None)) == (1200, 1200)
+
+
+def _age_restricted_ydl(
+    attempts: list[bool], cookies_work: bool = True
+) -> Callable[[dict[str, Any], Any], contextlib.AbstractContextManager[mock.Mock]]:
+    """Replacement for `YtdlPool.get` whose instances record whether they were
+    given cookies and fail without working ones.
+    """
+
+    @contextlib.contextmanager
+    def get_ydl(options: dict[str, Any], _log: Any) -> Iterator[mock.Mock]:
+        def extract_info(_url: str, download: bool) -> dict[str, Any]:
+            assert not download
+            attempts.append("cookiefile" in options)
+            if "cookiefile" not in options or not cookies_work:
+                error = ExtractorError("Sign in to confirm your age", expected=True)
+                raise DownloadError(str(error), (ExtractorError, error, None))
+            return {"format_id": "140"}
+
+        yield mock.Mock(
+            extract_info=extract_info,
+            process_ie_result=lambda info, download: info,
+            prepare_filename=lambda _: "x.m4a",
+        )
+
+    return get_ydl
+
+
+_OPTIONS: resource_dl.YtdlOptions = {
+    "format": "bestaudio",
+    "outtmpl": "x.%(ext)s",
+    "cookiefile": "c.txt",
+}
+
+
+def test_age_gated_resource_is_downloaded_with_cookies_right_away() -> None:
+    attempts: list[bool] = []
+    before = ytdl_info.age_gate_stats()
+    with (
+        db.managed_connection(":memory:"),
+        mock.patch.object(resource_dl.YtdlPool, "get", _age_restricted_ydl(attempts)),
+    ):
+        for _ in range(2):
+            # pylint: disable-next=protected-access
+            assert resource_dl._download_resource(_OPTIONS, "fake_YT-id0", logger)
+
+    assert attempts == [False, True, True]
+    stats = ytdl_info.age_gate_stats()
+    assert (stats.failed - before.failed, stats.skipped - before.skipped) == (1, 1)
+
+
+def test_failed_age_restriction_is_retried_with_fresh_cookies() -> None:
+    attempts: list[bool] = []
+    with (
+        db.managed_connection(":memory:"),
+        mock.patch.object(resource_dl.CookieCache, "invalidate") as invalidate,
+        mock.patch.object(
+            resource_dl.YtdlPool, "get", _age_restricted_ydl(attempts, False)
+        ),
+    ):
+        for _ in range(2):
+            # pylint: disable-next=protected-access
+            assert not resource_dl._download_resource(_OPTIONS, "fake_YT-id0", logger)
+
+    # not skipped as failed recently, and straight to cookies the second time
+    assert attempts == [False, True, True]
+    assert invalidate.call_count == 2
@@ -0,0 +1,122 @@
+"""Tests for planning syncs."""
+
+import dataclasses
+from pathlib import Path
+from unittest import mock
+
+from usdb_syncer import download_options, settings, utils
+from usdb_syncer.db import ResourceFileKind
+from usdb_syncer.meta_tags import MetaTags
+from usdb_syncer.path_template import PathTemplate
+from usdb_syncer.sync_meta import ResourceFile, SyncMeta
+from usdb_syncer.sync_plan import Fallbacks, SyncReason, plan_song
+from usdb_syncer.usdb_song import UsdbSong
+
+from ..conftest import example_usdb_song
+
+
+def _options(song_dir: Path) -> download_options.Options:
+    return download_options.Options(
+        song_dir=song_dir,
+        path_template=PathTemplate.parse(":artist: - :title: / song"),
+        txt_options=None,
+        audio_options=download_options.AudioOptions(
+            format=settings.AudioFormat.M4A,
+            bitrate=settings.AudioBitrate.KBPS_128,
+            normalize=False,
+            embed_artwork=False,
+            from_video=False,
+        ),
+        browser=settings.Browser.NONE,
+        video_options=None,
+        cover=None,
+        background_options=None,
+    )
+
+
+def _local_song(folder: Path, resource: str = "audio") -> UsdbSong:
+    folder.mkdir(parents=True)
+    audio = folder / "song.m4a"
+    audio.write_bytes(b"")
+    song = example_usdb_song()
+    assert song.sync_meta
+    song.sync_meta = SyncMeta(
+        sync_meta_id=song.sync_meta.sync_meta_id,
+        song_id=song.song_id,
+        path=folder / song.sync_meta.sync_meta_id.to_filename(),
+        mtime=0,
+        meta_tags=MetaTags(audio="audio"),
+        audio=ResourceFile(audio.name, utils.get_mtime(audio), resource),
+    )
+    return song
+
+
+def test_new_song(tmp_path: Path) -> None:
+    song = example_usdb_song()
+    song.sync_meta = None
+    plan = plan_song(song, _options(tmp_path))
+
+    assert plan.reasons == {SyncReason.NEW}
+    assert plan.target == tmp_path / "Foo - Bar"
+    assert not plan.is_noop()
+
+
+def test_unchanged_song(tmp_path: Path) -> None:
+    song = _local_song(tmp_path / "Foo - Bar (1)")
+    plan = plan_song(song, _options(tmp_path))
+
+    assert plan.is_noop()
+    assert plan.reused == [ResourceFileKind.AUDIO]
+
+
+def test_pinned_song(tmp_path: Path) -> None:
+    song = _local_song(tmp_path / "Foo - Bar")
+    assert song.sync_meta
+    song.sync_meta.pinned = True
+    (tmp_path / "Foo - Bar" / "song.m4a").unlink()
+
+    assert plan_song(song, _options(tmp_path)).is_noop()
+
+
+def test_changed_song(tmp_path: Path) -> None:
+    song = _local_song(tmp_path / "Bar - Foo", resource="other")
+    plan = plan_song(song, _options(tmp_path))
+
+    assert plan.reasons == {SyncReason.PATH_CHANGED, SyncReason.RESOURCE_CHANGED}
+    assert plan.fetched == [ResourceFileKind.AUDIO]
+    assert not plan.cached
+
+
+def test_modified_file_in_media_cache(tmp_path: Path) -> None:
+    song = _local_song(tmp_path / "Foo - Bar")
+    (tmp_path / "Foo - Bar" / "song.m4a").write_bytes(b"modified")
+    assert song.sync_meta and song.sync_meta.audio
+    song.sync_meta.audio.mtime -= 1000
+    with mock.patch("usdb_syncer.resource_dl.audio_is_cached", return_value=True):
+        plan = plan_song(song, _options(tmp_path))
+
+    assert plan.reasons == {SyncReason.FILE_CHANGED}
+    assert plan.cached == [ResourceFileKind.AUDIO]
+
+
+def test_song_without_cover_and_video(tmp_path: Path) -> None:
+    song = _local_song(tmp_path / "Foo - Bar")
+    assert song.sync_meta
+    # audio was downloaded from a video in the comments
+    song.sync_meta.meta_tags = MetaTags()
+    options = dataclasses.replace(
+        _options(tmp_path),
+        video_options=download_options.VideoOptions(
+            format=settings.VideoContainer.MP4,
+            reencode_format=None,
+            max_resolution=settings.VideoResolution.P1080,
+            max_fps=settings.VideoFps.FPS_60,
+            embed_artwork=False,
+        ),
+        cover=download_options.CoverOptions(max_size=None),
+    )
+
+    assert plan_song(song, options).is_noop()
+    plan = plan_song(song, options, Fallbacks(comment_videos=True, usdb_cover=True))
+    assert plan.reasons == {SyncReason.FILE_MISSING}
+    assert plan.fetched == [ResourceFileKind.VIDEO, ResourceFileKind.COVER]
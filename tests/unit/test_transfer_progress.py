@@ -0,0 +1,74 @@
+"""Tests for aggregating the progress of media transfers."""
+
+from typing import Iterator
+from unittest import mock
+
+import pytest
+
+from usdb_syncer import SongId, events, transfer_progress
+from usdb_syncer.transfer_progress import TransferProgress
+
+_SONG = SongId(1)
+_OTHER_SONG = SongId(2)
+
+
+@pytest.fixture(name="received")
+def fixture_received() -> Iterator[list[events.DownloadProgress]]:
+    TransferProgress.reset()
+    received: list[events.DownloadProgress] = []
+    events.DownloadProgress.subscribe(received.append)
+    with mock.patch.object(
+        events.DownloadProgress, "post", events.DownloadProgress.process
+    ):
+        yield received
+    events.DownloadProgress.unsubscribe(received.append)
+    TransferProgress.reset()
+
+
+def test_progress_is_aggregated(received: list[events.DownloadProgress]) -> None:
+    with mock.patch.object(transfer_progress, "_INTERVAL_SECS", 0):
+        with TransferProgress.track(_SONG):
+            TransferProgress.update("audio", 100, 1000)
+            TransferProgress.ytdl_hook(
+                {
+                    "status": "downloading",
+                    "filename": "video.mp4",
+                    "downloaded_bytes": 500,
+                    "total_bytes_estimate": 2000.0,
+                }
+            )
+        with TransferProgress.track(_OTHER_SONG):
+            TransferProgress.update("cover", 50, None)
+        # not attributed to any song
+        TransferProgress.update("other", 50, 100)
+
+    assert len(received) == 3
+    progress = received[-1]
+    assert progress.songs == {_SONG: (600, 3000), _OTHER_SONG: (50, 50)}
+    assert (progress.done, progress.total) == (650, 3050)
+    assert not progress.stalled
+
+    TransferProgress.finish(_SONG)
+    assert received[-1].songs == {_OTHER_SONG: (50, 50)}
+
+
+def test_events_are_throttled(received: list[events.DownloadProgress]) -> None:
+    with TransferProgress.track(_SONG):
+        for done in range(0, 1000, 100):
+            TransferProgress.update("audio", done, 1000)
+
+    assert len(received) <= 1
+
+
+def test_throughput_and_eta(received: list[events.DownloadProgress]) -> None:
+    with (
+        mock.patch.object(transfer_progress, "_INTERVAL_SECS", 0),
+        mock.patch("time.monotonic", side_effect=[1000.0, 1002.0]),
+        TransferProgress.track(_SONG),
+    ):
+        TransferProgress.update("video", 1000, 10000)
+        TransferProgress.update("video", 3000, 10000)
+
+    progress = received[-1]
+    assert progress.bytes_per_sec == 1000
+    assert progress.eta_secs == 7
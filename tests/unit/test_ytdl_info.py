@@ -0,0 +1,67 @@
+"""Tests for caching yt-dlp extraction results."""
+
+import time
+from typing import Iterator
+from unittest import mock
+
+import pytest
+from yt_dlp.utils import DownloadError, ExtractorError
+
+from usdb_syncer import db, ytdl_info
+
+_URL = "https://www.youtube.com/watch?v=fake_YT-id0"
+_SPEC = "bestaudio[ext=m4a]"
+
+
+@pytest.fixture(autouse=True)
+def connection() -> Iterator[None]:
+    with db.managed_connection(":memory:"):
+        yield
+
+
+def _download_error(
+    expected: bool, message: str = "Requested format is not available"
+) -> DownloadError:
+    error = ExtractorError(message, expected=expected)
+    return DownloadError(str(error), (ExtractorError, error, None))
+
+
+def test_chosen_format_is_preferred() -> None:
+    info = {"formats": [{"format_id": "140"}, {"format_id": "251"}], "format_id": "140"}
+    ytdl_info.store_info(_URL, _SPEC, info, age_gated=False)
+    cached = ytdl_info.lookup(_URL, _SPEC)
+
+    assert cached and cached.formats == '["140", "251"]'
+    assert ytdl_info.format_with_fallback(cached, _SPEC) == f"140/{_SPEC}"
+    assert ytdl_info.lookup(_URL, "bestvideo") is None
+
+
+def test_only_permanent_errors_are_cached() -> None:
+    ytdl_info.store_error(_URL, _SPEC, _download_error(expected=False), False)
+    assert ytdl_info.lookup(_URL, _SPEC) is None
+
+    ytdl_info.store_error(_URL, _SPEC, _download_error(expected=True), False)
+    cached = ytdl_info.lookup(_URL, _SPEC)
+    assert cached and cached.error == "Requested format is not available"
+    assert ytdl_info.format_with_fallback(cached, _SPEC) == _SPEC
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "Sign in to confirm your age. This video may be inappropriate for some users.",
+        "Sign in to confirm you're not a bot",
+    ],
+)
+def test_session_dependent_errors_are_not_cached(message: str) -> None:
+    ytdl_info.store_error(_URL, _SPEC, _download_error(True, message), False)
+
+    assert ytdl_info.lookup(_URL, _SPEC) is None
+
+
+def test_errors_expire() -> None:
+    ytdl_info.store_error(_URL, _SPEC, _download_error(expected=True), False)
+    later = time.time() + 4 * 24 * 60 * 60
+
+    with mock.patch("time.time", return_value=later):
+        assert ytdl_info.lookup(_URL, _SPEC) is None
@@ -0,0 +1,43 @@
+"""Tests for reusing yt-dlp instances."""
+
+import threading
+from typing import Any
+
+import yt_dlp
+
+from usdb_syncer.logger import logger
+from usdb_syncer.ytdl_pool import YtdlPool
+
+
+def _get(outtmpl: str, **options: Any) -> yt_dlp.YoutubeDL:
+    with YtdlPool.get({"outtmpl": outtmpl, "quiet": True, **options}, logger) as ydl:
+        return ydl
+
+
+def test_instances_are_reused_per_thread_and_options() -> None:
+    first = _get("a.%(ext)s")
+    second = _get("b.%(ext)s", format="bestaudio")
+    other_options = _get("b.%(ext)s", overwrites=True)
+    other_thread: list[yt_dlp.YoutubeDL] = []
+    thread = threading.Thread(target=lambda: other_thread.append(_get("b.%(ext)s")))
+    thread.start()
+    thread.join()
+
+    assert first is second
+    assert second.prepare_filename({"id": "x", "ext": "m4a"}) == "b.m4a"
+    assert second.params["format"] == "bestaudio"
+    assert other_options is not first
+    assert other_thread[0] is not first
+
+
+def test_instance_is_not_reused_after_unexpected_error() -> None:
+    ydl = _get("a.%(ext)s", format="worst")
+    try:
+        with YtdlPool.get(
+            {"outtmpl": "a.%(ext)s", "quiet": True, "format": "worst"}, logger
+        ):
+            raise ValueError
+    except ValueError:
+        pass
+
+    assert _get("a.%(ext)s", format="worst") is not ydl